@@ -0,0 +1,346 @@
+"""
+Workspace API Benchmarks
+Runs workspace_app against the in-process fake Docker daemon and reports request latency
+percentiles and throughput as JSON; exits non-zero when a result regresses against a baseline
+
+    python benchmark.py --quick --output baseline.json
+    python benchmark.py --baseline baseline.json
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import docker
+
+from fake_docker import FakeDockerClient, parse_latency
+
+SERVICE = "bench"
+COMPOSE = f"""
+services:
+  {SERVICE}:
+    image: fake/{SERVICE}:1
+    environment:
+      - TZ=UTC
+    x-readiness:
+      type: log
+      pattern: workspace ready
+      initial_delay: 0.01
+      timeout: 10
+"""
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds (nearest-rank percentiles)"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(rank(50) * 1000, 3),
+        "p90_ms": round(rank(90) * 1000, 3),
+        "p99_ms": round(rank(99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def synthetic_workspaces(count, start_port=20000):
+    """The documents a workspaces.json with `count` workspaces would hold"""
+    now = datetime.now().isoformat()
+    return {
+        f"{SERVICE}-{i:05d}": {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "name": f"{SERVICE}-{i:05d}",
+            "service": SERVICE,
+            "case": f"case-{i % 50:02d}",
+            "status": "running",
+            "container_name": f"{SERVICE}-{i:05d}",
+            "image": f"fake/{SERVICE}:1",
+            "created": now,
+            "web_port": start_port + i,
+            "web_url": f"http://localhost:{start_port + i}",
+            "last_accessed": now,
+            "ready": True,
+        }
+        for i in range(count)
+    }
+
+
+class Bench:
+    """One app instance wired to one fake daemon"""
+
+    def __init__(self, app_module, fake, workdir):
+        self.w = app_module
+        self.fake = fake
+        self.workdir = workdir
+
+    def client(self):
+        return self.w.app.test_client()
+
+    def reset(self):
+        """Remove every workspace and container, and wait for the state cache to catch up"""
+        for container in self.fake.containers.list(all=True):
+            self.fake.remove(container)
+        self.w.workspace_store.delete_many(list(self.w.workspace_store.all()))
+        self.wait_for_cache(0)
+
+    def seed(self, count):
+        """Load a synthetic workspaces.json of `count` entries plus one running container each"""
+        path = self.workdir / f"workspaces-{count}.json"
+        workspaces = synthetic_workspaces(count)
+        path.write_text(json.dumps(workspaces))
+        self.w.workspace_store.put_many(json.loads(path.read_text()))
+        for name, data in workspaces.items():
+            container = self.fake.containers.add(
+                name, f"fake/{SERVICE}:1",
+                labels={"workspace": name, "service": SERVICE, "created_by": "workspace_app"},
+                ports={"3000/tcp": data["web_port"]}
+            )
+            self.fake.emit("start", container)
+        self.wait_for_cache(count)
+
+    def wait_for_cache(self, count, timeout=120):
+        deadline = time.monotonic() + timeout
+        while self.w.container_states.status()["containers"] != count:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"State cache did not reach {count} container(s)")
+            time.sleep(0.01)
+
+    def list_workspaces(self, sizes, requests):
+        """GET /api/workspaces latency against the number of workspaces"""
+        results = {}
+        client = self.client()
+        for size in sizes:
+            self.reset()
+            self.seed(size)
+            client.get("/api/workspaces")
+            samples = []
+            for _ in range(requests):
+                seconds, response = timed(client.get, "/api/workspaces")
+                if response.status_code != 200:
+                    raise RuntimeError(f"/api/workspaces returned {response.status_code}")
+                samples.append(seconds)
+            results[f"list_workspaces[n={size}]"] = percentiles(samples)
+            print(f"[INFO] list_workspaces n={size}: {results[f'list_workspaces[n={size}]']}", file=sys.stderr)
+        self.reset()
+        return results
+
+    def create_delete(self, count, concurrency):
+        """Blocking create and delete throughput with `concurrency` clients in parallel"""
+        self.reset()
+        names = [f"load-{i:05d}" for i in range(count)]
+
+        def create(name):
+            seconds, response = timed(self.client().post, "/api/workspace/create",
+                                      json={"service": SERVICE, "name": name, "async": False})
+            return seconds, response.status_code == 201 or response.get_json().get("error")
+
+        def delete(name):
+            seconds, response = timed(self.client().post, f"/api/workspace/{name}/delete")
+            return seconds, response.status_code == 200 or response.get_json().get("error")
+
+        results = {}
+        for op, fn in (("create", create), ("delete", delete)):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = list(pool.map(fn, names))
+            wall = time.perf_counter() - started
+            errors = [outcome for _, outcome in outcomes if outcome is not True]
+            if errors:
+                raise RuntimeError(f"{len(errors)} {op}(s) failed, first: {errors[0]}")
+            summary = percentiles([seconds for seconds, _ in outcomes])
+            summary["throughput_per_s"] = round(count / wall, 2)
+            results[f"{op}_workspace[c={concurrency}]"] = summary
+            print(f"[INFO] {op} x{count} c={concurrency}: {summary}", file=sys.stderr)
+        self.reset()
+        return results
+
+    def port_allocation(self, ports):
+        """PortAllocator.allocate() time as the range fills, by quarter"""
+        from port_allocator import PortAllocator
+        from workspace_store import WorkspaceStore
+
+        store = WorkspaceStore(self.workdir / "ports.db")
+        start = 45000
+        allocator = PortAllocator(store, start, start + ports - 1)
+        quarters = [[] for _ in range(4)]
+        for i in range(ports):
+            seconds, _ = timed(allocator.allocate, f"owner-{i}")
+            quarters[min(i * 4 // ports, 3)].append(seconds)
+        results = {}
+        for index, samples in enumerate(quarters):
+            results[f"port_allocate[fill={index * 25}-{index * 25 + 25}%]"] = percentiles(samples)
+        print(f"[INFO] port_allocate x{ports}: {results}", file=sys.stderr)
+        return results
+
+    def logs(self, requests, lines):
+        """Paged and grep-filtered log reads"""
+        self.reset()
+        self.fake.log_lines = [f"line {i} {'ERROR' if i % 10 == 0 else 'ok'}" for i in range(lines)] + ["workspace ready"]
+        self.seed(1)
+        name = next(iter(self.w.workspace_store.all()))
+        client = self.client()
+        results = {}
+        for key, query in (("logs_tail", "tail=100"), ("logs_grep", "tail=all&grep=ERROR")):
+            samples = []
+            for _ in range(requests):
+                seconds, response = timed(client.get, f"/api/workspace/{name}/logs?{query}")
+                if response.status_code != 200:
+                    raise RuntimeError(f"logs returned {response.status_code}")
+                samples.append(seconds)
+            results[f"{key}[lines={lines}]"] = percentiles(samples)
+        print(f"[INFO] logs: {results}", file=sys.stderr)
+        self.reset()
+        return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of results against a baseline run
+
+    A latency regresses when it is more than `tolerance` (relative) and `min_delta_ms`
+    (absolute) above the baseline; throughput when it drops by more than `tolerance`.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for field in ("p50_ms", "p99_ms"):
+            if field in current and field in previous:
+                if current[field] > previous[field] * (1 + tolerance) and current[field] - previous[field] > min_delta_ms:
+                    regressions.append({"benchmark": name, "field": field,
+                                        "baseline": previous[field], "current": current[field]})
+        if "throughput_per_s" in current and "throughput_per_s" in previous:
+            if current["throughput_per_s"] < previous["throughput_per_s"] / (1 + tolerance):
+                regressions.append({"benchmark": name, "field": "throughput_per_s",
+                                    "baseline": previous["throughput_per_s"], "current": current["throughput_per_s"]})
+    return regressions
+
+
+def load_app(fake, workdir):
+    """Import workspace_app with its state in `workdir` and Docker replaced by `fake`"""
+    os.environ.update({
+        "WORKSPACES_DB": str(workdir / "workspaces.db"),
+        "WORKSPACE_PORT_RANGE": "20000-29999",
+        "DOCKER_NODES": "",
+        "DOCKER_NODES_FILE": str(workdir / "nodes.yml"),
+        "METRICS_INTERVAL": "0",
+        "CAPACITY_WAIT": "0",
+    })
+    docker.from_env = lambda **kwargs: fake
+    import workspace_app
+    from service_catalog import ServiceCatalog
+
+    compose = workdir / "docker-compose.yml"
+    compose.write_text(COMPOSE)
+    workspace_app.service_catalog = ServiceCatalog(compose)
+    workspace_app.DATA_DIR = workdir / "data"
+    workspace_app.capacity.refresh_host()
+    workspace_app.container_states.start()
+    deadline = time.monotonic() + 10
+    while not workspace_app.container_states.synced:
+        if time.monotonic() > deadline:
+            raise RuntimeError("State cache never synced with the fake daemon")
+        time.sleep(0.01)
+    return workspace_app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the workspace API against a fake Docker daemon")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="workspace counts for the list benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="requests per latency measurement")
+    parser.add_argument("--creates", type=int, default=100, help="workspaces created (then deleted) for throughput")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel clients for create/delete")
+    parser.add_argument("--ports", type=int, default=1000, help="port range size for the allocation benchmark")
+    parser.add_argument("--log-lines", type=int, default=5000, help="lines in the fake container log")
+    parser.add_argument("--latency", default="", help="fake daemon latencies, e.g. run=0.05,get=0.002,list=0.005,logs=0.003")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative +/- jitter on every fake call")
+    parser.add_argument("--quick", action="store_true", help="small sizes and counts for a fast check")
+    parser.add_argument("--only", default="", help="comma-separated subset: list,create,ports,logs")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.requests, args.creates, args.ports, args.log_lines = "10,100,1000", 30, 30, 200, 1000
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    only = {name.strip() for name in args.only.split(",") if name.strip()} or {"list", "create", "ports", "logs"}
+
+    fake = FakeDockerClient(latency=parse_latency(args.latency), jitter=args.jitter, cpus=4096, seed=1)
+    out = sys.stdout
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="workspace-bench-") as tmp, contextlib.redirect_stdout(sys.stderr):
+        workdir = Path(tmp)
+        bench = Bench(load_app(fake, workdir), fake, workdir)
+        started = time.perf_counter()
+        if "list" in only:
+            results.update(bench.list_workspaces(sizes, args.requests))
+        if "create" in only:
+            results.update(bench.create_delete(args.creates, args.concurrency))
+        if "ports" in only:
+            results.update(bench.port_allocation(args.ports))
+        if "logs" in only:
+            results.update(bench.logs(args.requests, args.log_lines))
+        bench.w.container_states.stop()
+        elapsed = round(time.perf_counter() - started, 2)
+
+    report = {
+        "version": 1,
+        "meta": {
+            "time": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": fake.latency,
+            "jitter": args.jitter,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seconds": elapsed,
+            "docker_calls": fake.calls,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline.get("results", {}), args.tolerance, args.min_delta_ms)
+        report["baseline"] = {"file": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+        for regression in regressions:
+            print(f"[ERROR] Regression in {regression['benchmark']} {regression['field']}: "
+                  f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+        if not regressions:
+            print(f"[SUCCESS] No regressions against {args.baseline}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+        print(f"[SUCCESS] Benchmark report written to {args.output}", file=sys.stderr)
+    else:
+        print(text, file=out)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
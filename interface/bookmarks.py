@@ -0,0 +1,438 @@
+"""
+Bookmark Compiler
+Parses Chromium JSON and Netscape HTML bookmark files into one compact tree
+(URLs deduplicated, favicons interned) and writes either format incrementally
+"""
+
+import hashlib
+import html
+import json
+import os
+import threading
+import uuid
+from html.parser import HTMLParser
+from pathlib import Path
+
+# Chromium stores times as microseconds since 1601-01-01, Netscape files as Unix seconds
+WEBKIT_EPOCH_OFFSET = 11644473600
+
+ROOTS = ("bookmark_bar", "other", "synced")
+ROOT_NAMES = {"bookmark_bar": "Bookmarks bar", "other": "Other bookmarks", "synced": "Mobile bookmarks"}
+# Fixed GUIDs Chromium uses for its permanent folders
+ROOT_GUIDS = {
+    "bookmark_bar": "0bc5d13f-2cba-5d74-951f-3f233fe6c908",
+    "other": "82b081ec-3dd3-529c-8475-ab6c344590dd",
+    "synced": "4cf2e351-0e85-532b-bb37-df045d8f8d0f",
+}
+# Chromium numbers the permanent folders 1-3 and everything else after them
+FIRST_NODE_ID = 4
+
+READ_CHUNK = 64 * 1024
+
+NETSCAPE_HEADER = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<!-- This is an automatically generated file.
+     It will be read and overwritten.
+     DO NOT EDIT! -->
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<TITLE>Bookmarks</TITLE>
+<H1>Bookmarks</H1>
+"""
+
+
+def webkit_time(unix_seconds):
+    """Unix seconds to Chromium's microsecond timestamp"""
+    return (int(unix_seconds) + WEBKIT_EPOCH_OFFSET) * 1000000 if unix_seconds else 0
+
+
+def unix_time(webkit_microseconds):
+    """Chromium's microsecond timestamp to Unix seconds"""
+    return max(int(webkit_microseconds) // 1000000 - WEBKIT_EPOCH_OFFSET, 0) if webkit_microseconds else 0
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class Bookmark:
+    __slots__ = ("name", "url", "added", "icon", "guid")
+
+    def __init__(self, name, url, added=0, icon=None, guid=None):
+        self.name = name
+        self.url = url
+        self.added = added      # Chromium microseconds
+        self.icon = icon        # interned data: URI shared by every bookmark with the same favicon
+        self.guid = guid
+
+
+class Folder:
+    __slots__ = ("name", "added", "modified", "children", "guid")
+
+    def __init__(self, name, added=0, modified=0, guid=None):
+        self.name = name
+        self.added = added
+        self.modified = modified
+        self.children = []
+        self.guid = guid
+
+
+class BookmarkTree:
+    """Chromium's three permanent folders plus URL and favicon indexes"""
+
+    def __init__(self):
+        self.roots = {key: Folder(ROOT_NAMES[key], guid=ROOT_GUIDS[key]) for key in ROOTS}
+        self.icons = {}
+        self._urls = {}
+        self._guids = set(ROOT_GUIDS.values())
+        self.stats = {"bookmarks": 0, "folders": 0, "duplicates": 0}
+
+    def add_bookmark(self, folder, name, url, added=0, icon=None, guid=None):
+        """Append a bookmark to folder unless its URL is already in the tree; returns it or None"""
+        bookmark = self.new_bookmark(name, url, added, icon, guid)
+        if bookmark is not None:
+            folder.children.append(bookmark)
+        return bookmark
+
+    def new_bookmark(self, name, url, added=0, icon=None, guid=None):
+        """Create a detached bookmark, or None if the URL is a duplicate"""
+        if url in self._urls:
+            self.stats["duplicates"] += 1
+            existing = self._urls[url]
+            if icon and not existing.icon:
+                existing.icon = self.intern_icon(icon)
+            return None
+        bookmark = Bookmark(name, url, added, self.intern_icon(icon), self._unique_guid(guid, url))
+        self._urls[url] = bookmark
+        self.stats["bookmarks"] += 1
+        return bookmark
+
+    def add_folder(self, parent, name, added=0, modified=0, guid=None):
+        """Append a subfolder to parent, merging into an existing one of the same name"""
+        for child in parent.children:
+            if isinstance(child, Folder) and child.name == name:
+                return child
+        folder = self.new_folder(name, added, modified, guid, seed=f"{parent.guid}/{name}")
+        parent.children.append(folder)
+        return folder
+
+    def new_folder(self, name, added=0, modified=0, guid=None, seed=None):
+        folder = Folder(name, added, modified, self._unique_guid(guid, seed or name))
+        self.stats["folders"] += 1
+        return folder
+
+    def intern_icon(self, data):
+        """Keep one copy of each distinct favicon"""
+        if not data:
+            return None
+        digest = hashlib.sha1(data.encode()).digest()
+        return self.icons.setdefault(digest, data)
+
+    def adopt_icons(self, other):
+        """Fill in missing favicons from another tree (Chromium JSON carries none)"""
+        adopted = 0
+        for url, bookmark in self._urls.items():
+            source = other._urls.get(url)
+            if not bookmark.icon and source is not None and source.icon:
+                bookmark.icon = self.intern_icon(source.icon)
+                adopted += 1
+        return adopted
+
+    def find(self, url):
+        return self._urls.get(url)
+
+    def __len__(self):
+        return len(self._urls)
+
+    def chromium_checksum(self):
+        """MD5 Chromium verifies on load: ids, UTF-16 titles, types and URLs in file order"""
+        md5 = hashlib.md5()
+        for node_id, node in _numbered(self):
+            md5.update(str(node_id).encode())
+            md5.update(node.name.encode("utf-16-le"))
+            if isinstance(node, Bookmark):
+                md5.update(b"url")
+                md5.update(node.url.encode())
+            else:
+                md5.update(b"folder")
+        return md5.hexdigest()
+
+    def _unique_guid(self, guid, seed):
+        # Stable GUIDs keep repeated compiles byte-identical
+        if not guid or guid in self._guids:
+            guid = str(uuid.uuid5(uuid.NAMESPACE_URL, seed))
+            while guid in self._guids:
+                guid = str(uuid.uuid4())
+        self._guids.add(guid)
+        return guid
+
+
+def _numbered(tree):
+    """Yield (id, node) depth-first in the order Chromium writes and checksums them"""
+    next_id = FIRST_NODE_ID
+
+    def walk(folder):
+        nonlocal next_id
+        for child in folder.children:
+            node_id, next_id = next_id, next_id + 1
+            yield node_id, child
+            if isinstance(child, Folder):
+                yield from walk(child)
+
+    for root_id, key in enumerate(ROOTS, start=1):
+        yield root_id, tree.roots[key]
+        yield from walk(tree.roots[key])
+
+
+class _NetscapeParser(HTMLParser):
+    """Builds the tree from <DT><H3>/<DT><A> entries as the file is fed in chunks"""
+
+    def __init__(self, tree):
+        super().__init__(convert_charrefs=True)
+        self.tree = tree
+        self.stack = [tree.roots["other"]]
+        self.pending = None
+        self.tag = None
+        self.attrs = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("a", "h3"):
+            self.tag, self.attrs, self.text = tag, dict(attrs), []
+        elif tag == "dl":
+            # The document's outer <DL> has no heading; it stands for "Other bookmarks"
+            self.stack.append(self.pending or self.stack[-1])
+            self.pending = None
+
+    def handle_endtag(self, tag):
+        if tag == "dl":
+            if len(self.stack) > 1:
+                self.stack.pop()
+            return
+        if tag != self.tag:
+            return
+        name = "".join(self.text).strip()
+        attrs, self.tag = self.attrs, None
+        parent = self.stack[-1]
+
+        if tag == "a":
+            url = attrs.get("href")
+            # place: URIs are Firefox smart folders, meaningless anywhere else
+            if url and not url.startswith("place:"):
+                self.tree.add_bookmark(parent, name, url, webkit_time(_int(attrs.get("add_date"))), attrs.get("icon"))
+            return
+
+        top_level = parent is self.tree.roots["other"]
+        added, modified = webkit_time(_int(attrs.get("add_date"))), webkit_time(_int(attrs.get("last_modified")))
+        if top_level and attrs.get("personal_toolbar_folder") == "true":
+            self.pending = self.tree.roots["bookmark_bar"]
+            _adopt_dates(self.pending, added, modified)
+        elif top_level and attrs.get("unfiled_bookmarks_folder") == "true":
+            self.pending = self.tree.roots["other"]
+            _adopt_dates(self.pending, added, modified)
+        else:
+            self.pending = self.tree.add_folder(parent, name, added, modified)
+
+    def handle_data(self, data):
+        if self.tag:
+            self.text.append(data)
+
+
+def parse_netscape(fp, tree=None):
+    """Read a Netscape bookmark file (text stream) into tree"""
+    tree = tree if tree is not None else BookmarkTree()
+    parser = _NetscapeParser(tree)
+    for chunk in iter(lambda: fp.read(READ_CHUNK), ""):
+        parser.feed(chunk)
+    parser.close()
+    return tree
+
+
+def parse_chromium(fp, tree=None):
+    """Read a Chromium Bookmarks file (text stream) into tree
+
+    Nodes are converted as the decoder finishes each object, so the raw JSON
+    dictionaries never exist as a whole document.
+    """
+    tree = tree if tree is not None else BookmarkTree()
+
+    def node(obj):
+        node_type = obj.get("type")
+        if node_type == "url" and "url" in obj:
+            return tree.new_bookmark(obj.get("name", ""), obj["url"], _int(obj.get("date_added")), guid=obj.get("guid"))
+        if node_type == "folder" and "children" in obj:
+            folder = Folder(obj.get("name", ""), _int(obj.get("date_added")), _int(obj.get("date_modified")), obj.get("guid"))
+            # Duplicate URLs came back as None
+            folder.children = [child for child in obj["children"] if child is not None]
+            return folder
+        return obj
+
+    document = json.load(fp, object_hook=node)
+    for key, parsed in (document.get("roots") or {}).items():
+        if key in tree.roots and isinstance(parsed, Folder):
+            _adopt_dates(tree.roots[key], parsed.added, parsed.modified)
+            _merge_children(tree, tree.roots[key], parsed.children)
+    return tree
+
+
+def _adopt_dates(folder, added, modified):
+    # Permanent folders exist before any file is read; take the first dates seen for them
+    folder.added = folder.added or added
+    folder.modified = folder.modified or modified
+
+
+def _merge_children(tree, target, children):
+    # Folders from the JSON become tree folders (merging by name); bookmarks are already deduplicated
+    for child in children:
+        if isinstance(child, Folder):
+            folder = tree.add_folder(target, child.name, child.added, child.modified, child.guid)
+            _merge_children(tree, folder, child.children)
+        else:
+            target.children.append(child)
+
+
+def detect_format(path):
+    """"chromium" or "netscape", from the first non-blank character"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(512).lstrip("﻿ \t\r\n")
+    return "chromium" if head.startswith("{") else "netscape"
+
+
+def load(paths, tree=None):
+    """Parse one or more bookmark files (either format) into one deduplicated tree"""
+    tree = tree if tree is not None else BookmarkTree()
+    for path in [paths] if isinstance(paths, (str, Path)) else paths:
+        parse = parse_chromium if detect_format(path) == "chromium" else parse_netscape
+        with open(path, "r", encoding="utf-8") as f:
+            parse(f, tree)
+    return tree
+
+
+def write_netscape(tree, fp, icons=True):
+    """Write tree as a Netscape bookmark file, one line at a time"""
+    def attr_time(value):
+        return str(unix_time(value))
+
+    def write_folder(folder, depth, extra=""):
+        indent = "    " * depth
+        fp.write(f'{indent}<DT><H3 ADD_DATE="{attr_time(folder.added)}" LAST_MODIFIED="{attr_time(folder.modified)}"'
+                 f'{extra}>{html.escape(folder.name, quote=False)}</H3>\n')
+        fp.write(f"{indent}<DL><p>\n")
+        write_children(folder, depth + 1)
+        fp.write(f"{indent}</DL><p>\n")
+
+    def write_children(folder, depth):
+        indent = "    " * depth
+        for child in folder.children:
+            if isinstance(child, Folder):
+                write_folder(child, depth)
+                continue
+            icon = f' ICON="{html.escape(child.icon)}"' if icons and child.icon else ""
+            fp.write(f'{indent}<DT><A HREF="{html.escape(child.url)}" ADD_DATE="{attr_time(child.added)}"{icon}>'
+                     f'{html.escape(child.name, quote=False)}</A>\n')
+
+    fp.write(NETSCAPE_HEADER)
+    fp.write("<DL><p>\n")
+    write_folder(tree.roots["bookmark_bar"], 1, ' PERSONAL_TOOLBAR_FOLDER="true"')
+    write_children(tree.roots["other"], 1)
+    if tree.roots["synced"].children:
+        write_folder(tree.roots["synced"], 1)
+    fp.write("</DL><p>\n")
+
+
+def write_chromium(tree, fp):
+    """Write tree as a Chromium Bookmarks file with a valid checksum"""
+    numbered = _numbered(tree)
+    dump = json.dumps
+
+    def write_node(node_id, node, depth, lead=None):
+        indent = "   " * depth
+        inner = indent + "   "
+        fp.write(f"{indent if lead is None else lead}{{\n")
+        if isinstance(node, Folder):
+            fp.write(f'{inner}"children": [')
+            for i, child in enumerate(node.children):
+                fp.write(",\n" if i else "\n")
+                write_node(*next(numbered), depth + 2)
+            fp.write(f"\n{inner}],\n" if node.children else " ],\n")
+        fp.write(f'{inner}"date_added": "{node.added}",\n')
+        fp.write(f'{inner}"date_last_used": "0",\n')
+        if isinstance(node, Folder):
+            fp.write(f'{inner}"date_modified": "{node.modified}",\n')
+        fp.write(f'{inner}"guid": "{node.guid}",\n')
+        fp.write(f'{inner}"id": "{node_id}",\n')
+        fp.write(f'{inner}"name": {dump(node.name, ensure_ascii=False)},\n')
+        if isinstance(node, Folder):
+            fp.write(f'{inner}"type": "folder"\n')
+        else:
+            fp.write(f'{inner}"type": "url",\n')
+            fp.write(f'{inner}"url": {dump(node.url, ensure_ascii=False)}\n')
+        fp.write(f"{indent}}}")
+
+    fp.write("{\n")
+    fp.write(f'   "checksum": "{tree.chromium_checksum()}",\n')
+    fp.write('   "roots": {\n')
+    for i, key in enumerate(ROOTS):
+        root_id, root = next(numbered)
+        write_node(root_id, root, 2, lead=f'      "{key}": ')
+        fp.write(",\n" if i < len(ROOTS) - 1 else "\n")
+    fp.write("   },\n")
+    fp.write('   "version": 1\n')
+    fp.write("}\n")
+
+
+def write(tree, path, fmt, icons=True):
+    """Write tree to path atomically in "chromium" or "netscape" format"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if fmt == "chromium":
+            write_chromium(tree, f)
+        elif fmt == "netscape":
+            write_netscape(tree, f, icons)
+        else:
+            raise ValueError(f"Unknown bookmark format '{fmt}'")
+    os.replace(tmp_path, path)
+    return path
+
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+
+def load_cached(paths):
+    """load() memoized on the source files' (mtime, size); trees are shared, treat them as read-only"""
+    paths = [Path(p) for p in ([paths] if isinstance(paths, (str, Path)) else paths)]
+    signature = tuple((str(p), p.stat().st_mtime_ns, p.stat().st_size) for p in paths)
+    with _cache_lock:
+        tree = _cache.get(signature)
+        if tree is None:
+            tree = load(paths)
+            if len(_cache) >= 8:
+                _cache.clear()
+            _cache[signature] = tree
+        return tree
+
+
+def compile_bookmarks(sources, target, fmt, icons=True):
+    """Merge the source files and write them to target; returns stats for the compiled tree"""
+    tree = load_cached(sources)
+    write(tree, target, fmt, icons)
+    return {**tree.stats, "icons": len(tree.icons), "format": fmt}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert and merge bookmark files")
+    parser.add_argument("sources", nargs="+", help="Chromium JSON or Netscape HTML files")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("-f", "--format", choices=("chromium", "netscape"), required=True)
+    parser.add_argument("--no-icons", action="store_true", help="Leave ICON= out of Netscape output")
+    args = parser.parse_args()
+
+    stats = compile_bookmarks(args.sources, args.output, args.format, icons=not args.no_icons)
+    print(f"[SUCCESS] Wrote {stats['bookmarks']} bookmark(s) in {stats['folders']} folder(s), "
+          f"{stats['duplicates']} duplicate(s) dropped, {stats['icons']} unique icon(s) -> {args.output}")
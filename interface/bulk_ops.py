@@ -0,0 +1,92 @@
+"""
+Bulk Operations
+Runs one operation over many workspaces on a bounded worker pool, collects a result
+per item and hands the successful ones to a single metadata commit
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def no_progress(phase, message, **details):
+    pass
+
+
+class BulkRunner:
+    """Shared worker pool for batch create/delete/stop/restart"""
+
+    def __init__(self, max_workers=8, max_batch=100):
+        self.max_workers = max_workers
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk")
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "items": 0, "failed": 0, "commit_errors": 0}
+
+    def run(self, kind, items, fn, commit=None, target=lambda item: item, progress=no_progress):
+        """Apply fn(item) -> result dict to every item, then commit(successful results) once
+
+        Items run concurrently, up to max_workers across all batches. A failed item never
+        stops the others; the batch only succeeds if every item and the commit did.
+        """
+        if len(items) > self.max_batch:
+            return {"success": False, "error": f"Batch of {len(items)} exceeds the limit of {self.max_batch}"}
+
+        started = time.monotonic()
+        progress("running", f"{kind}: {len(items)} item(s)")
+        futures = {self._executor.submit(self._call, fn, item): target(item) for item in items}
+        results = {}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = futures[future]
+            result = {"target": name, **future.result()}
+            results[name] = result
+            progress(
+                "item", f"{name}: {'ok' if result['success'] else result.get('error', 'failed')}",
+                target=name, success=result["success"], done=done, total=len(items)
+            )
+
+        ordered = [results[target(item)] for item in items]
+        succeeded = [result for result in ordered if result["success"]]
+        commit_error = None
+        if commit and succeeded:
+            try:
+                commit(succeeded)
+            except Exception as e:
+                commit_error = str(e)
+                print(f"[ERROR] Bulk {kind} metadata commit failed: {e}")
+
+        failed = len(ordered) - len(succeeded)
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(ordered)
+            self.stats["failed"] += failed
+            if commit_error:
+                self.stats["commit_errors"] += 1
+        seconds = round(time.monotonic() - started, 2)
+        print(f"[INFO] Bulk {kind}: {len(succeeded)}/{len(ordered)} succeeded in {seconds}s")
+        summary = {
+            "success": not failed and commit_error is None,
+            "kind": kind,
+            "total": len(ordered),
+            "succeeded": len(succeeded),
+            "failed": failed,
+            "seconds": seconds,
+            "results": ordered,
+        }
+        if commit_error:
+            summary["error"] = f"Metadata commit failed: {commit_error}"
+        elif failed:
+            summary["error"] = f"{failed} of {len(ordered)} item(s) failed"
+        progress("done", f"{kind}: {len(succeeded)}/{len(ordered)} succeeded in {seconds}s")
+        return summary
+
+    def status(self):
+        with self._lock:
+            return {"max_workers": self.max_workers, "max_batch": self.max_batch, **self.stats}
+
+    @staticmethod
+    def _call(fn, item):
+        try:
+            return fn(item)
+        except Exception as e:
+            return {"success": False, "error": f"Unexpected error: {e}"}
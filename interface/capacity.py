@@ -0,0 +1,326 @@
+"""
+Host Capacity
+Live model of the CPU and memory committed to workspace containers, used to place
+new workspaces without overcommitting the host; the ledger is shared by every worker
+process through the workspace database
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS capacity_ledger (
+    node TEXT NOT NULL,
+    name TEXT NOT NULL,
+    container_id TEXT,
+    resources TEXT NOT NULL,
+    cpu REAL NOT NULL,
+    memory INTEGER NOT NULL,
+    cores TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    reserved_at TEXT NOT NULL,
+    PRIMARY KEY (node, name)
+);
+CREATE INDEX IF NOT EXISTS idx_capacity_ledger_id ON capacity_ledger(node, container_id);
+"""
+
+# What a container without an explicit limit is assumed to use
+UNLIMITED_CPU = 1.0
+UNLIMITED_MEMORY = 1 << 30
+
+ACTIVE_EVENTS = ("start", "restart", "unpause")
+INACTIVE_EVENTS = ("die", "stop")
+
+# How often a queued reservation re-reads the ledger; releases in other workers can't wake it
+RESERVE_POLL = 1.0
+
+
+class CapacityError(Exception):
+    """Raised when a workspace cannot be placed within host capacity"""
+
+
+def parse_cpuset(cpuset):
+    """ "0-3,6" to [0, 1, 2, 3, 6] """
+    cores = []
+    for part in (cpuset or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cores.extend(range(int(start), int(end or start) + 1))
+    return cores
+
+
+def demand(resources):
+    """(cpu cores, memory bytes) a container is expected to take from the host"""
+    if resources.get("nano_cpus"):
+        cpu = resources["nano_cpus"] / 1e9
+    elif resources.get("cpu_quota", 0) > 0:
+        cpu = resources["cpu_quota"] / (resources.get("cpu_period") or 100000)
+    elif resources.get("cpuset_cpus") and resources["cpuset_cpus"] != "auto":
+        cpu = float(len(parse_cpuset(resources["cpuset_cpus"])))
+    else:
+        cpu = UNLIMITED_CPU
+    # A reservation is what the workspace needs; the limit only caps a runaway
+    memory = resources.get("mem_reservation") or resources.get("mem_limit") or UNLIMITED_MEMORY
+    return cpu, int(memory)
+
+
+def resources_from_host_config(host_config):
+    """Recover containers.run() resource kwargs from an inspected container's HostConfig"""
+    resources = {
+        "nano_cpus": host_config.get("NanoCpus") or 0,
+        "cpu_quota": host_config.get("CpuQuota") or 0,
+        "cpu_period": host_config.get("CpuPeriod") or 0,
+        "cpuset_cpus": host_config.get("CpusetCpus") or "",
+        "mem_limit": host_config.get("Memory") or 0,
+        "mem_reservation": host_config.get("MemoryReservation") or 0,
+    }
+    return {key: value for key, value in resources.items() if value}
+
+
+class HostCapacity:
+    """Ledger of workspace resource commitments checked against the host's CPUs and memory"""
+
+    def __init__(self, client_factory, store, node="local", cpu_overcommit=4.0, mem_overcommit=1.0,
+                 reserved_memory=1 << 30, reservation_grace=0):
+        # store: the WorkspaceStore whose database holds the ledger; node: this daemon's ledger name
+        self._client_factory = client_factory
+        self._store = store
+        self.node = node
+        self.cpu_overcommit = cpu_overcommit
+        self.mem_overcommit = mem_overcommit
+        self.reserved_memory = reserved_memory
+        # Rebuilds keep reservations younger than this; their containers may not exist yet
+        self.reservation_grace = reservation_grace
+        self.cpus = os.cpu_count() or 1
+        self.memory = 0
+        self._cond = threading.Condition()
+        self.stats = {"placed": 0, "queued": 0, "refused": 0, "released": 0}
+
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def refresh_host(self):
+        """Read the daemon's CPU count and total memory"""
+        client = self._client_factory()
+        if not client:
+            return False
+        info = client.info()
+        with self._cond:
+            self.cpus = info.get("NCPU") or self.cpus
+            self.memory = info.get("MemTotal") or self.memory
+        return True
+
+    def rebuild(self, client, label="created_by=workspace_app"):
+        """Rebuild the ledger from existing app containers (inspects each once, at startup)
+
+        Reservations made in the last reservation_grace seconds are kept: they may belong to a
+        create in another worker whose container isn't running yet.
+        """
+        now = datetime.now()
+        cutoff = (now - timedelta(seconds=self.reservation_grace)).isoformat()
+        containers = client.containers.list(all=True, filters={"label": label})
+        with self._store.transaction() as conn:
+            conn.execute(
+                "DELETE FROM capacity_ledger WHERE node = ? AND reserved_at < ?", (self.node, cutoff)
+            )
+            for container in containers:
+                resources = resources_from_host_config(container.attrs.get("HostConfig") or {})
+                cpu, memory = demand(resources)
+                # A renamed container (a claimed pool container) replaces its old name's entry
+                conn.execute(
+                    "DELETE FROM capacity_ledger WHERE node = ? AND container_id = ? AND name != ?",
+                    (self.node, container.id[:12], container.name)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO capacity_ledger "
+                    "(node, name, container_id, resources, cpu, memory, cores, active, reserved_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.node, container.name, container.id[:12], json.dumps(resources), cpu, memory,
+                     resources.get("cpuset_cpus") or "", container.status in ("running", "paused", "restarting"),
+                     now.isoformat())
+                )
+            entries = self._entries(conn)
+        with self._cond:
+            self._cond.notify_all()
+        print(f"[INFO] Capacity ledger rebuilt: {len(entries)} container(s), "
+              f"{sum(1 for e in entries.values() if e['active'])} active")
+        return len(entries)
+
+    def reserve(self, name, resources, wait=0, progress=None):
+        """Commit resources for a new container, waiting up to `wait` seconds for room
+
+        Returns the resources to start it with (an "auto" cpuset resolved to real cores);
+        raises CapacityError if it does not fit in time.
+        """
+        cpu, memory = demand(resources)
+        deadline = time.monotonic() + wait
+        queued = False
+        while True:
+            # Checked and committed in one write transaction, so workers can't both take the last room
+            with self._store.transaction() as conn:
+                entries = self._entries(conn)
+                reason = self._refusal(entries, cpu, memory, exclude=name)
+                if reason is None:
+                    placed = dict(resources)
+                    if placed.get("cpuset_cpus") == "auto":
+                        placed["cpuset_cpus"] = self._pick_cores(entries, max(1, math.ceil(cpu)))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO capacity_ledger "
+                        "(node, name, container_id, resources, cpu, memory, cores, active, reserved_at) "
+                        "VALUES (?, ?, NULL, ?, ?, ?, ?, 1, ?)",
+                        (self.node, name, json.dumps(placed), cpu, memory, placed.get("cpuset_cpus") or "",
+                         datetime.now().isoformat())
+                    )
+            with self._cond:
+                if reason is None:
+                    self.stats["placed"] += 1
+                    return placed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["refused"] += 1
+                    raise CapacityError(reason)
+                if not queued:
+                    queued = True
+                    self.stats["queued"] += 1
+                    if progress:
+                        progress("queued", f"Waiting for host capacity ({reason})")
+                self._cond.wait(min(remaining, RESERVE_POLL))
+
+    def bind(self, name, container_id):
+        """Attach the started container's id so later renames can be followed"""
+        with self._store.transaction() as conn:
+            conn.execute(
+                "UPDATE capacity_ledger SET container_id = ? WHERE node = ? AND name = ?",
+                (container_id[:12], self.node, name)
+            )
+
+    def release(self, name):
+        """Forget a container's commitment (creation failed or it was removed)"""
+        with self._store.transaction() as conn:
+            released = conn.execute(
+                "DELETE FROM capacity_ledger WHERE node = ? AND name = ?", (self.node, name)
+            ).rowcount
+        if released:
+            with self._cond:
+                self.stats["released"] += 1
+                self._cond.notify_all()
+
+    def admit(self, name):
+        """Whether a stopped workspace can be started again without overcommitting"""
+        entries = self._entries(self._store.connection())
+        entry = entries.get(name)
+        if entry is None or entry["active"]:
+            return True
+        return self._refusal(entries, *entry["demand"], exclude=name) is None
+
+    def refusal(self, resources):
+        """Why a container with these resources would not fit right now; None if it would"""
+        return self._refusal(self._entries(self._store.connection()), *demand(resources))
+
+    def on_container_event(self, action, entry):
+        """Container state cache listener keeping the ledger in step with Docker
+
+        Every worker follows the same events; the updates are idempotent.
+        """
+        if action not in ("destroy", "rename", *ACTIVE_EVENTS, *INACTIVE_EVENTS):
+            return
+        name = entry.get("name")
+        container_id = (entry.get("id") or "")[:12]
+        with self._store.transaction() as conn:
+            row = conn.execute(
+                "SELECT name FROM capacity_ledger WHERE node = ? AND (name = ? OR (container_id IS NOT NULL AND container_id = ?)) "
+                "ORDER BY name = ? DESC LIMIT 1",
+                (self.node, name, container_id, name)
+            ).fetchone()
+            if row is None:
+                return
+            key = row[0]
+            if action == "destroy":
+                changed = conn.execute(
+                    "DELETE FROM capacity_ledger WHERE node = ? AND name = ?", (self.node, key)
+                ).rowcount
+                if changed:
+                    with self._cond:
+                        self.stats["released"] += 1
+            elif action == "rename":
+                if not name or key == name:
+                    return
+                # Warm pool claims rename the container; its commitment follows
+                conn.execute(
+                    "UPDATE OR REPLACE capacity_ledger SET name = ? WHERE node = ? AND name = ?", (name, self.node, key)
+                )
+            else:
+                conn.execute(
+                    "UPDATE capacity_ledger SET active = ? WHERE node = ? AND name = ?",
+                    (action in ACTIVE_EVENTS, self.node, key)
+                )
+        with self._cond:
+            self._cond.notify_all()
+
+    def status(self):
+        entries = self._entries(self._store.connection())
+        cpu_used, memory_used = self._committed(entries)
+        with self._cond:
+            cpu_total, memory_total = self._allocatable_locked()
+            return {
+                "cpus": self.cpus,
+                "memory": self.memory,
+                "cpu_allocatable": round(cpu_total, 2),
+                "cpu_committed": round(cpu_used, 2),
+                "memory_allocatable": int(memory_total) if math.isfinite(memory_total) else None,
+                "memory_committed": memory_used,
+                "containers": len(entries),
+                "active": sum(1 for e in entries.values() if e["active"]),
+                **self.stats,
+            }
+
+    def _entries(self, conn):
+        """This node's ledger keyed by container name"""
+        rows = conn.execute(
+            "SELECT name, container_id, cpu, memory, cores, active FROM capacity_ledger WHERE node = ?", (self.node,)
+        ).fetchall()
+        return {
+            name: {"id": container_id, "demand": (cpu, memory), "cores": parse_cpuset(cores), "active": bool(active)}
+            for name, container_id, cpu, memory, cores, active in rows
+        }
+
+    def _allocatable_locked(self):
+        memory = (self.memory * self.mem_overcommit - self.reserved_memory) if self.memory else float("inf")
+        return self.cpus * self.cpu_overcommit, memory
+
+    @staticmethod
+    def _committed(entries, exclude=None):
+        cpu = memory = 0
+        for name, entry in entries.items():
+            if entry["active"] and name != exclude:
+                cpu += entry["demand"][0]
+                memory += entry["demand"][1]
+        return cpu, memory
+
+    def _refusal(self, entries, cpu, memory, exclude=None):
+        cpu_used, memory_used = self._committed(entries, exclude)
+        with self._cond:
+            cpu_total, memory_total = self._allocatable_locked()
+        if cpu_used + cpu > cpu_total:
+            return f"needs {cpu:g} CPU, {max(cpu_total - cpu_used, 0):.2f} of {cpu_total:g} free"
+        if memory_used + memory > memory_total:
+            free = max(memory_total - memory_used, 0)
+            return f"needs {memory / (1 << 30):.2f} GiB, {free / (1 << 30):.2f} GiB free"
+        return None
+
+    def _pick_cores(self, entries, count):
+        # Least pinned cores first so pinned workspaces spread across the host
+        load = {core: 0 for core in range(self.cpus)}
+        for entry in entries.values():
+            if entry["active"]:
+                for core in entry["cores"]:
+                    if core in load:
+                        load[core] += 1
+        cores = sorted(load, key=lambda core: (load[core], core))[:min(count, self.cpus)]
+        return ",".join(str(core) for core in sorted(cores))
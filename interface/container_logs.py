@@ -0,0 +1,244 @@
+"""
+Container Logs
+Incremental reads of container logs: timestamp cursors for paging, server-side grep,
+and a follow mode delivered as server-sent events without buffering the whole log
+"""
+
+import calendar
+import json
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+# Longer lines are cut here so one runaway line can't grow the buffer without bound
+MAX_LINE_BYTES = 16384
+
+
+def parse_timestamp(value):
+    """Docker RFC3339Nano timestamp to (seconds, nanoseconds); None if it isn't one"""
+    try:
+        main, _, fraction = value.rstrip("Z").partition(".")
+        seconds = calendar.timegm(time.strptime(main, "%Y-%m-%dT%H:%M:%S"))
+    except (ValueError, OverflowError):
+        return None
+    if fraction and not fraction.isdigit():
+        return None
+    return seconds, int((fraction + "000000000")[:9])
+
+
+def format_cursor(stamp):
+    return f"{stamp[0]}.{stamp[1]:09d}"
+
+
+def parse_cursor(value):
+    """A cursor, unix timestamp or ISO-8601 time to (seconds, nanoseconds)
+
+    Raises ValueError for anything else.
+    """
+    value = str(value).strip()
+    seconds, dot, fraction = value.partition(".")
+    if seconds.isdigit() and (not dot or fraction.isdigit()):
+        return int(seconds), int((fraction + "000000000")[:9])
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()), moment.microsecond * 1000
+
+
+def compile_grep(pattern, ignore_case=False):
+    """Compile a grep filter; None when no pattern is given. Raises re.error if invalid."""
+    if not pattern:
+        return None
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+def iter_lines(chunks, max_line=MAX_LINE_BYTES):
+    """Reassemble raw log chunks into lines (frames don't always end on a newline)"""
+    pending = bytearray()
+    for chunk in chunks:
+        pending.extend(chunk)
+        start = 0
+        while True:
+            end = pending.find(b"\n", start)
+            if end < 0:
+                break
+            yield bytes(pending[start:end][:max_line])
+            start = end + 1
+        del pending[:start]
+        if len(pending) > max_line:
+            yield bytes(pending[:max_line])
+            pending.clear()
+    if pending:
+        yield bytes(pending)
+
+
+def parse_line(raw):
+    """Split a timestamped log line into {"cursor", "time", "line"}"""
+    text = raw.decode("utf-8", errors="replace").rstrip("\r")
+    stamp_text, _, line = text.partition(" ")
+    stamp = parse_timestamp(stamp_text)
+    if stamp is None:
+        return {"cursor": None, "time": None, "line": text, "_stamp": None}
+    moment = datetime.fromtimestamp(stamp[0], timezone.utc).replace(microsecond=stamp[1] // 1000)
+    return {"cursor": format_cursor(stamp), "time": moment.isoformat(), "line": line, "_stamp": stamp}
+
+
+def _public(entry):
+    return {key: value for key, value in entry.items() if not key.startswith("_")}
+
+
+def read_page(container, after=None, before=None, tail=100, limit=1000, grep=None):
+    """One page of log lines
+
+    after/before are exclusive (seconds, nanoseconds) bounds. Without `after` the page
+    is the newest `limit` of the last `tail` lines (before `before` if given), and `more`
+    means older lines exist before first_cursor; with it, lines are read forward, reading
+    stops as soon as `limit` matching lines are found, and `more` means newer lines follow.
+    """
+    kwargs = {"stream": True, "timestamps": True}
+    if after is not None:
+        # Docker's since is whole-second inclusive; the exact cut happens below
+        kwargs["since"] = max(after[0], 1)
+        kwargs["tail"] = "all"
+    else:
+        kwargs["tail"] = tail
+    if before is not None:
+        kwargs["until"] = before[0] + 1
+    stream = container.logs(**kwargs)
+
+    # Tailing keeps the newest matches, so older ones fall off the front of the window
+    lines = [] if after is not None else deque(maxlen=max(limit, 0))
+    more = False
+    received = 0
+    try:
+        for raw in iter_lines(stream):
+            received += 1
+            entry = parse_line(raw)
+            stamp = entry["_stamp"]
+            if stamp is not None:
+                if after is not None and stamp <= after:
+                    continue
+                if before is not None and stamp >= before:
+                    continue
+            if grep is not None and not grep.search(entry["line"]):
+                continue
+            if len(lines) >= limit:
+                more = True
+                if after is not None:
+                    break
+            lines.append(entry)
+    finally:
+        stream.close()
+
+    lines = list(lines)
+    if after is None and tail != "all" and received >= int(tail):
+        # Docker stopped at `tail` lines, so older ones may exist before this page
+        more = True
+
+    return {
+        "logs": "\n".join(entry["line"] for entry in lines),
+        "lines": len(lines),
+        "first_cursor": lines[0]["cursor"] if lines else None,
+        "cursor": lines[-1]["cursor"] if lines else (format_cursor(after) if after else None),
+        "more": more,
+    }
+
+
+class LogFollow:
+    """Server-sent event chunks from follow(); close() stops the reader thread and the
+    Docker stream even if iteration never started"""
+
+    def __init__(self, chunks, close):
+        self._chunks = chunks
+        self._close = close
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        self._close()
+        try:
+            self._chunks.close()
+        except ValueError:
+            # Still running on the streaming thread, which closes it on its way out
+            pass
+
+
+def follow(container, after=None, tail=100, grep=None, keepalive=15, queue_size=1000):
+    """Server-sent event chunks (a LogFollow) for new log lines until the container stops
+
+    A reader thread feeds a bounded queue, so a slow client stalls the Docker stream
+    instead of growing memory. Each event id is the line's cursor, which an
+    EventSource sends back as Last-Event-ID when it reconnects.
+    """
+    kwargs = {"stream": True, "follow": True, "timestamps": True}
+    if after is not None:
+        kwargs["since"] = max(after[0], 1)
+        kwargs["tail"] = "all"
+    else:
+        kwargs["tail"] = tail
+    # Opened here so a missing container fails the request before the stream starts
+    stream = container.logs(**kwargs)
+    lines = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+    closing = threading.Lock()
+    end = object()
+
+    def close():
+        with closing:
+            if stopped.is_set():
+                return
+            stopped.set()
+        stream.close()
+
+    def read():
+        try:
+            for raw in iter_lines(stream):
+                while not stopped.is_set():
+                    try:
+                        lines.put(raw, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stopped.is_set():
+                    return
+        except Exception as e:
+            if not stopped.is_set():
+                print(f"[WARNING] Log stream for '{container.name}' ended: {e}")
+        finally:
+            while not stopped.is_set():
+                try:
+                    lines.put(end, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+    threading.Thread(target=read, name=f"logs-{container.name}", daemon=True).start()
+
+    def generate():
+        cursor = format_cursor(after) if after else None
+        try:
+            while True:
+                try:
+                    raw = lines.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if raw is end:
+                    yield f"event: end\ndata: {json.dumps({'cursor': cursor})}\n\n"
+                    return
+                entry = parse_line(raw)
+                if after is not None and entry["_stamp"] is not None and entry["_stamp"] <= after:
+                    continue
+                cursor = entry["cursor"] or cursor
+                if grep is not None and not grep.search(entry["line"]):
+                    continue
+                event_id = f"id: {entry['cursor']}\n" if entry["cursor"] else ""
+                yield f"{event_id}event: log\ndata: {json.dumps(_public(entry))}\n\n"
+        finally:
+            close()
+
+    return LogFollow(generate(), close)
@@ -0,0 +1,188 @@
+"""
+Container State Cache
+In-memory table of workspace container states kept current by the Docker events stream,
+so status reads don't have to hit the daemon
+"""
+
+import threading
+import time
+
+# Event action -> resulting container status. "kill" (any signal) and "oom" don't mean the
+# container stopped; the "die" that follows if it does carries the status change.
+EVENT_STATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+}
+
+
+class ContainerStateCache:
+    """Mirrors the state of labelled containers from a list snapshot plus docker events"""
+
+    def __init__(self, client_factory, label="created_by=workspace_app", retry_delay=5):
+        self._client_factory = client_factory
+        self._label = label
+        self._retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._names = {}
+        self._synced = False
+        self._stream = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.stats = {"resyncs": 0, "events": 0, "reads": 0, "stream_errors": 0}
+
+    @property
+    def synced(self):
+        return self._synced
+
+    def start(self):
+        """Start the background events subscriber"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="container-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the subscriber and close the events stream"""
+        self._stopped.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def add_listener(self, callback):
+        """Call callback(action, entry) for every container event after the table is updated"""
+        self._listeners.append(callback)
+
+    def get(self, name):
+        """Status dict for a container name; None if unknown. Only valid while synced."""
+        with self._lock:
+            self.stats["reads"] += 1
+            entry = self._by_id.get(self._names.get(name))
+            return dict(entry) if entry else None
+
+    def snapshot(self):
+        """All known containers keyed by name"""
+        with self._lock:
+            self.stats["reads"] += 1
+            return {entry["name"]: dict(entry) for entry in self._by_id.values()}
+
+    def status(self):
+        """Cache counters for monitoring"""
+        with self._lock:
+            return {**self.stats, "synced": self._synced, "containers": len(self._by_id)}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                client = self._client_factory()
+                if not client:
+                    raise RuntimeError("Docker not available")
+
+                # Subscribe before listing so nothing that happens in between is missed
+                self._stream = client.events(
+                    decode=True,
+                    filters={"type": "container", "label": self._label}
+                )
+                self._resync(client)
+
+                for event in self._stream:
+                    applied = self._apply(event)
+                    if applied:
+                        self._notify(*applied)
+                    if self._stopped.is_set():
+                        break
+            except Exception as e:
+                if not self._stopped.is_set():
+                    print(f"[WARNING] Container events stream lost: {e}")
+                with self._lock:
+                    self.stats["stream_errors"] += 1
+            finally:
+                # Anything after this point is unknown until the next full resync
+                self._synced = False
+                self._stream = None
+            self._stopped.wait(self._retry_delay)
+
+    def _resync(self, client):
+        """Replace the table with one sparse list call"""
+        containers = client.containers.list(all=True, sparse=True, filters={"label": self._label})
+        table = {}
+        for container in containers:
+            state = container.attrs.get("State")
+            status = state.get("Status") if isinstance(state, dict) else state
+            names = container.attrs.get("Names") or [container.attrs.get("Name") or ""]
+            table[container.id] = self._entry(container.id, names[0].lstrip("/"), status)
+        with self._lock:
+            self._by_id = table
+            self._names = {entry["name"]: container_id for container_id, entry in table.items()}
+            self.stats["resyncs"] += 1
+            self._synced = True
+        print(f"[INFO] Container state cache synced ({len(table)} container(s))")
+
+    def _apply(self, event):
+        if event.get("Type", "container") != "container":
+            return None
+        action = (event.get("Action") or event.get("status") or "").split(":")[0]
+        actor = event.get("Actor") or {}
+        container_id = actor.get("ID") or event.get("id")
+        attributes = actor.get("Attributes") or {}
+        if not container_id:
+            return None
+
+        with self._lock:
+            self.stats["events"] += 1
+            entry = self._by_id.get(container_id)
+
+            if action == "destroy":
+                if entry:
+                    self._names.pop(entry["name"], None)
+                self._by_id.pop(container_id, None)
+                name = attributes.get("name", "").lstrip("/") or (entry or {}).get("name", "")
+                return action, {**(entry or {}), "name": name, "status": "removed", "running": False}
+
+            name = attributes.get("name", "").lstrip("/") or (entry or {}).get("name", "")
+            if entry is None or entry["name"] != name:
+                if entry:
+                    self._names.pop(entry["name"], None)
+                entry = self._entry(container_id, name, (entry or {}).get("status", "created"))
+                self._by_id[container_id] = entry
+                self._names[name] = container_id
+
+            if action == "oom":
+                # A process hit the memory limit; flagged until the container starts again
+                entry["oom"] = True
+                entry["updated"] = event.get("time", time.time())
+            elif action in ("start", "restart"):
+                entry.pop("oom", None)
+            status = EVENT_STATUS.get(action)
+            if status:
+                entry["status"] = status
+                entry["running"] = status == "running"
+                entry["updated"] = event.get("time", time.time())
+            return action, dict(entry)
+
+    def _notify(self, action, entry):
+        for callback in self._listeners:
+            try:
+                callback(action, entry)
+            except Exception as e:
+                print(f"[WARNING] Container event listener failed on '{action}': {e}")
+
+    @staticmethod
+    def _entry(container_id, name, status):
+        return {
+            "status": status,
+            "running": status == "running",
+            "id": container_id[:12],
+            "name": name,
+            "updated": time.time(),
+        }
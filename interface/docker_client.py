@@ -0,0 +1,173 @@
+"""
+Docker Client Manager
+One shared Docker SDK client per process, with a sized connection pool,
+periodic health checks and automatic reconnect after a daemon restart
+"""
+
+import threading
+import time
+
+import docker
+import requests
+
+
+class DockerClientManager:
+    """Hands out a cached DockerClient and replaces it when the daemon goes away"""
+
+    def __init__(self, factory=None, max_pool_size=32, timeout=60, health_interval=15, retry_delay=5):
+        self._factory = factory or (lambda: docker.from_env(max_pool_size=max_pool_size, timeout=timeout))
+        self._health_interval = health_interval
+        self._retry_delay = retry_delay
+        # Guards the fields below only; never held across a Docker call
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._client = None
+        self._last_ok = 0.0
+        self._last_failure = 0.0
+        self.last_error = None
+        self.stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "connect_failures": 0,
+            "health_checks": 0,
+            "health_failures": 0,
+            "reported_errors": 0,
+            "requests_served": 0,
+        }
+
+    def connect(self):
+        """Create (or recreate) the shared client and ping it; raises on failure"""
+        return self._connect()
+
+    def get(self):
+        """Return the shared client, or None when the daemon is unreachable
+
+        Pings and reconnects run outside the lock in one thread at a time; while one
+        is in flight, other callers get the current client (or None) instead of waiting.
+        """
+        with self._lock:
+            self.stats["requests_served"] += 1
+            client = self._client
+            if client is not None and time.monotonic() - self._last_ok < self._health_interval:
+                return client
+            if self._refreshing:
+                return client
+            # Don't hammer a daemon that is down; callers get None until retry_delay passes
+            if client is None and time.monotonic() - self._last_failure < self._retry_delay:
+                return None
+            self._refreshing = True
+
+        try:
+            if client is not None and self._ping(client):
+                return client
+            with self._lock:
+                if time.monotonic() - self._last_failure < self._retry_delay:
+                    return None
+            try:
+                return self._connect()
+            except Exception as e:
+                print(f"Error connecting to Docker: {e}")
+                return None
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def check(self):
+        """Force a health check now; returns True when the daemon answers"""
+        client = self.get()
+        return client is not None and self._ping(client)
+
+    def report_error(self, error):
+        """Mark the client suspect after a transport-level failure so the next get() re-pings"""
+        if isinstance(error, (requests.exceptions.ConnectionError, docker.errors.DockerException)) \
+                and not isinstance(error, (docker.errors.NotFound, docker.errors.ImageNotFound)):
+            with self._lock:
+                self.stats["reported_errors"] += 1
+                self._last_ok = 0.0
+
+    def close(self):
+        """Close the shared client and its pooled connections"""
+        with self._lock:
+            client, self._client = self._client, None
+        _close(client)
+
+    def metrics(self):
+        """Reconnect counters plus connection pool usage"""
+        with self._lock:
+            return {
+                **self.stats,
+                "connected": self._client is not None,
+                "seconds_since_healthy": round(time.monotonic() - self._last_ok, 1) if self._last_ok else None,
+                "last_error": self.last_error,
+                "pools": self._pool_stats_locked(),
+            }
+
+    def _connect(self):
+        try:
+            client = self._factory()
+            client.ping()
+        except Exception as e:
+            with self._lock:
+                self._last_failure = time.monotonic()
+                self.stats["connect_failures"] += 1
+                self.last_error = str(e)
+            raise
+
+        with self._lock:
+            had_client = self._client is not None or self.stats["connects"] > 0
+            previous, self._client = self._client, client
+            self._last_ok = time.monotonic()
+            self.stats["connects"] += 1
+            if had_client:
+                self.stats["reconnects"] += 1
+        _close(previous)
+        if had_client:
+            print("[INFO] Reconnected to Docker daemon")
+        return client
+
+    def _ping(self, client):
+        with self._lock:
+            self.stats["health_checks"] += 1
+        try:
+            client.ping()
+        except Exception as e:
+            with self._lock:
+                self.stats["health_failures"] += 1
+                self.last_error = str(e)
+            print(f"[WARNING] Docker health check failed: {e}")
+            return False
+        with self._lock:
+            self._last_ok = time.monotonic()
+        return True
+
+    def _pool_stats_locked(self):
+        """Connection counts from the urllib3 pools behind the SDK's HTTP adapters"""
+        pools = []
+        api = getattr(self._client, "api", None)
+        for prefix, adapter in (getattr(api, "adapters", None) or {}).items():
+            containers = getattr(adapter, "pools", None)
+            if containers is None and hasattr(adapter, "poolmanager"):
+                containers = adapter.poolmanager.pools
+            if containers is None:
+                continue
+            for key in list(containers.keys()):
+                pool = containers.get(key)
+                if pool is None:
+                    continue
+                idle = pool.pool.qsize() if getattr(pool, "pool", None) is not None else 0
+                pools.append({
+                    "adapter": prefix,
+                    "maxsize": pool.pool.maxsize if getattr(pool, "pool", None) is not None else None,
+                    "idle": idle,
+                    "connections_opened": getattr(pool, "num_connections", None),
+                    "requests": getattr(pool, "num_requests", None),
+                })
+        return pools
+
+
+def _close(client):
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
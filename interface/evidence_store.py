@@ -0,0 +1,555 @@
+"""
+Evidence Store
+Content-addressed, deduplicated storage for files saved under the per-workspace data
+directories, with a SQLite index of which workspace and case captured what, kept
+current by inotify (or periodic scans where inotify isn't available)
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import hashlib
+import os
+import select
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    first_workspace TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    workspace TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    case_id TEXT,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    ingested TEXT NOT NULL,
+    removed TEXT,
+    PRIMARY KEY (workspace, path)
+);
+CREATE INDEX IF NOT EXISTS idx_files_hash ON files(hash);
+CREATE INDEX IF NOT EXISTS idx_files_case ON files(case_id);
+CREATE INDEX IF NOT EXISTS idx_files_name ON files(name);
+CREATE INDEX IF NOT EXISTS idx_files_ingested ON files(ingested);
+"""
+
+DEDUP_MODES = ("auto", "reflink", "none")
+
+# Files still being written by browsers and download managers
+PARTIAL_SUFFIXES = (".part", ".crdownload", ".download", ".partial", ".tmp", ".swp")
+
+HASH_CHUNK = 1 << 20
+
+# ioctl(dest_fd, FICLONE, src_fd) shares extents copy-on-write (btrfs, xfs, bcachefs)
+FICLONE = 0x40049409
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def sha256_file(path):
+    """Stream a file through SHA-256; returns (hex digest, bytes read)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            # Lets a gevent worker serve requests while a large file is hashed
+            time.sleep(0)
+    return digest.hexdigest(), size
+
+
+def reflink(source, target):
+    """Clone source to target copy-on-write; False if the filesystem can't"""
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
+        return False
+
+
+class Inotify:
+    """Minimal inotify(7) binding over libc"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), str(path))
+        return wd
+
+    def read(self, timeout):
+        """Events as (wd, mask, name) tuples; empty if none arrive within timeout"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class EvidenceStore:
+    """Ingests files under root/<workspace>/ into content-addressed blobs and indexes them"""
+
+    def __init__(self, root, db_path=None, case_for=None, dedup="auto", ignore=("bookmarks",),
+                 settle=2.0, scan_interval=300):
+        if dedup not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{dedup}' (expected one of {', '.join(DEDUP_MODES)})")
+        self.root = Path(root)
+        # Blobs live under the data directory so reflinks stay on one filesystem
+        self.store_dir = self.root / ".evidence"
+        self.blob_dir = self.store_dir / "blobs"
+        self.db_path = Path(db_path) if db_path else self.store_dir / "evidence.db"
+        self.dedup = dedup
+        self.ignore = set(ignore)
+        self.settle = settle
+        self.scan_interval = scan_interval
+        self._case_for = case_for or (lambda workspace: None)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._watches = {}
+        self._pending = {}
+        self.watching = False
+        self.last_scan = None
+        self.stats = {"ingested": 0, "deduplicated": 0, "unchanged": 0, "removed": 0, "errors": 0, "bytes_saved": 0}
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    # --- ingest -------------------------------------------------------------
+
+    def locate(self, path):
+        """(workspace, path inside it) for a file this store should index, else None"""
+        try:
+            relative = Path(path).relative_to(self.root)
+        except ValueError:
+            return None
+        parts = relative.parts
+        if len(parts) < 2 or any(part.startswith(".") for part in parts):
+            return None
+        if parts[1] in self.ignore or relative.name.endswith(PARTIAL_SUFFIXES):
+            return None
+        return parts[0], Path(*parts[1:]).as_posix()
+
+    def blob_path(self, digest):
+        return self.blob_dir / digest[:2] / digest
+
+    def ingest(self, path):
+        """Hash one file into the store; returns its index row, or None if skipped or unchanged"""
+        path = Path(path)
+        located = self.locate(path)
+        if located is None:
+            return None
+        workspace, relative = located
+        try:
+            before = os.lstat(path)
+        except FileNotFoundError:
+            self.forget(path)
+            return None
+        if not os.path.isfile(path) or os.path.islink(path):
+            return None
+
+        conn = self.connection()
+        row = conn.execute(
+            "SELECT size, mtime_ns, inode, removed FROM files WHERE workspace = ? AND path = ?",
+            (workspace, relative)
+        ).fetchone()
+        if row and row[:3] == (before.st_size, before.st_mtime_ns, before.st_ino) and row[3] is None:
+            self._count("unchanged")
+            return None
+
+        try:
+            digest, size = sha256_file(path)
+            after = os.lstat(path)
+        except OSError as e:
+            self._count("errors")
+            print(f"[WARNING] Could not hash evidence file {path}: {e}")
+            return None
+        if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns) or size != after.st_size:
+            # Still being written; the close event brings it back
+            return None
+
+        stored, saved, after = self._store_blob(path, digest, after)
+        now = datetime.now().isoformat()
+        case_id = self._case_for(workspace)
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, size, stored, first_seen, first_workspace) VALUES (?, ?, ?, ?, ?)",
+                (digest, size, stored, now, workspace)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO files (workspace, path, name, case_id, hash, size, mtime_ns, inode, ingested, removed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                (workspace, relative, path.name, case_id, digest, size, after.st_mtime_ns, after.st_ino, now)
+            )
+        with self._lock:
+            self.stats["ingested"] += 1
+            if saved:
+                self.stats["deduplicated"] += 1
+                self.stats["bytes_saved"] += saved
+        return {"workspace": workspace, "path": relative, "case": case_id, "hash": digest, "size": size, "ingested": now}
+
+    def forget(self, path):
+        """Mark an indexed file as removed from its workspace (its blob is kept)"""
+        located = self.locate(path)
+        if located is None:
+            return False
+        with self.transaction() as conn:
+            removed = conn.execute(
+                "UPDATE files SET removed = ? WHERE workspace = ? AND path = ? AND removed IS NULL",
+                (datetime.now().isoformat(), *located)
+            ).rowcount
+        if removed:
+            self._count("removed")
+        return bool(removed)
+
+    def _store_blob(self, path, digest, st):
+        """Make path and its blob share storage; returns (method, bytes saved, new stat)
+
+        Only copy-on-write clones are shared: a workspace file is never linked to a blob inode,
+        so editing it can't change stored evidence. Without reflink support files are only indexed.
+        """
+        blob = self.blob_path(digest)
+        if self.dedup == "none":
+            return "none", 0, st
+        blob.parent.mkdir(parents=True, exist_ok=True)
+
+        if not blob.exists():
+            # First copy: the blob is a clone of the workspace file with an inode of its own
+            tmp = blob.with_name(f".{digest}.{os.getpid()}.tmp")
+            if not reflink(path, tmp):
+                if self.dedup == "reflink":
+                    print(f"[WARNING] Could not reflink {path} into the evidence store")
+                return "none", 0, st
+            try:
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, blob)
+            finally:
+                if os.path.lexists(tmp):
+                    os.unlink(tmp)
+            return "reflink", 0, st
+
+        # Duplicate: swap the workspace copy for a clone that shares the blob's extents
+        tmp = path.with_name(f".{path.name}.evidence.tmp")
+        if not reflink(blob, tmp):
+            return "none", 0, st
+        try:
+            os.chmod(tmp, st.st_mode & 0o777)
+            current = os.lstat(path)
+            if (current.st_size, current.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise OSError(errno.EAGAIN, "file changed while deduplicating")
+            os.replace(tmp, path)
+        except OSError:
+            os.unlink(tmp)
+            return "none", 0, st
+        return "reflink", st.st_size, os.lstat(path)
+
+    # --- scanning and watching ----------------------------------------------
+
+    def scan(self, workspace=None, progress=None):
+        """Walk the data directories, ingesting new or changed files and marking missing ones removed"""
+        started = time.monotonic()
+        base = self.root / workspace if workspace else self.root
+        seen = set()
+        ingested = 0
+        if progress:
+            progress("scan", f"Scanning {base}")
+        for directory, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                path = Path(directory) / filename
+                located = self.locate(path)
+                if located is None:
+                    continue
+                seen.add(located)
+                if self.ingest(path):
+                    ingested += 1
+
+        clauses, params = ["removed IS NULL"], []
+        if workspace:
+            clauses.append("workspace = ?")
+            params.append(workspace)
+        indexed = self.connection().execute(
+            f"SELECT workspace, path FROM files WHERE {' AND '.join(clauses)}", params
+        ).fetchall()
+        missing = [key for key in indexed if tuple(key) not in seen]
+        if missing:
+            now = datetime.now().isoformat()
+            with self.transaction() as conn:
+                conn.executemany(
+                    "UPDATE files SET removed = ? WHERE workspace = ? AND path = ?",
+                    [(now, ws, rel) for ws, rel in missing]
+                )
+            with self._lock:
+                self.stats["removed"] += len(missing)
+
+        result = {"success": True, "files": len(seen), "ingested": ingested, "removed": len(missing),
+                  "seconds": round(time.monotonic() - started, 3)}
+        with self._lock:
+            self.last_scan = {"time": datetime.now().isoformat(), **result}
+        if progress:
+            progress("done", f"Indexed {len(seen)} file(s), {ingested} new or changed")
+        return result
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="evidence-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch_loop(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            inotify = Inotify()
+        except OSError as e:
+            inotify = None
+            print(f"[WARNING] inotify unavailable ({e}), indexing evidence every {self.scan_interval}s instead")
+        if inotify:
+            self._watch_tree(inotify, self.root)
+            self.watching = True
+
+        self._scan_quietly()
+        next_scan = time.monotonic() + self.scan_interval
+        try:
+            while not self._stopped.is_set():
+                if inotify:
+                    self._handle_events(inotify, inotify.read(0.5))
+                else:
+                    self._stopped.wait(0.5)
+                self._ingest_settled()
+                if self.scan_interval > 0 and time.monotonic() >= next_scan:
+                    # Catches anything missed while events overflowed or the app was down
+                    self._scan_quietly()
+                    next_scan = time.monotonic() + self.scan_interval
+        finally:
+            self.watching = False
+            if inotify:
+                inotify.close()
+
+    def _watch_tree(self, inotify, top):
+        for directory, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            try:
+                self._watches[inotify.add_watch(directory)] = Path(directory)
+            except OSError as e:
+                print(f"[WARNING] Could not watch {directory}: {e}")
+
+    def _handle_events(self, inotify, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                print("[WARNING] Evidence watch queue overflowed, rescanning")
+                self._scan_quietly()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name or name.startswith("."):
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(inotify, path)
+                    # Files can land before the new directory's watch exists
+                    for sub, dirnames, filenames in os.walk(path):
+                        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                        for filename in filenames:
+                            self._pending[Path(sub) / filename] = time.monotonic() + self.settle
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(path, None)
+                self._safely(self.forget, path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._pending[path] = time.monotonic() + self.settle
+
+    def _ingest_settled(self):
+        now = time.monotonic()
+        for path in [p for p, due in self._pending.items() if due <= now]:
+            del self._pending[path]
+            self._safely(self.ingest, path)
+
+    def _scan_quietly(self):
+        try:
+            self.scan()
+        except Exception as e:
+            self._count("errors")
+            print(f"[WARNING] Evidence scan failed: {e}")
+
+    def _safely(self, fn, path):
+        try:
+            fn(path)
+        except Exception as e:
+            self._count("errors")
+            print(f"[WARNING] Evidence indexing failed for {path}: {e}")
+
+    # --- queries ------------------------------------------------------------
+
+    def search(self, digest=None, workspace=None, case=None, name=None, since=None, until=None,
+               include_removed=False, limit=100, offset=0):
+        """Indexed lookup of captured files, newest first"""
+        clauses, params = [], []
+        if digest:
+            clauses.append("hash = ?")
+            params.append(digest.lower())
+        if workspace:
+            clauses.append("workspace = ?")
+            params.append(workspace)
+        if case:
+            clauses.append("case_id = ?")
+            params.append(case)
+        if name:
+            # Shell-style wildcards; a plain word matches anywhere in the file name
+            clauses.append("name GLOB ?")
+            params.append(name if any(c in name for c in "*?[") else f"*{name}*")
+        if since:
+            clauses.append("ingested >= ?")
+            params.append(since)
+        if until:
+            clauses.append("ingested < ?")
+            params.append(until)
+        if not include_removed:
+            clauses.append("removed IS NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self.connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+        rows = conn.execute(
+            "SELECT workspace, path, name, case_id, hash, size, ingested, removed FROM files "
+            f"{where} ORDER BY ingested DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset]
+        ).fetchall()
+        return {"total": total, "files": [self._file_dict(row) for row in rows]}
+
+    def blob(self, digest):
+        """A blob and every file (current or removed) that had its content; None if unknown"""
+        conn = self.connection()
+        row = conn.execute(
+            "SELECT hash, size, stored, first_seen, first_workspace FROM blobs WHERE hash = ?", (digest.lower(),)
+        ).fetchone()
+        if row is None:
+            return None
+        files = conn.execute(
+            "SELECT workspace, path, name, case_id, hash, size, ingested, removed FROM files "
+            "WHERE hash = ? ORDER BY ingested", (row[0],)
+        ).fetchall()
+        return {
+            "hash": row[0],
+            "size": row[1],
+            "stored": row[2],
+            "first_seen": row[3],
+            "first_workspace": row[4],
+            "available": self.blob_path(row[0]).exists(),
+            "files": [self._file_dict(f) for f in files],
+        }
+
+    def status(self):
+        conn = self.connection()
+        files, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files WHERE removed IS NULL").fetchone()
+        blobs, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        with self._lock:
+            return {
+                "root": str(self.root),
+                "dedup": self.dedup,
+                "watching": self.watching,
+                "files": files,
+                "blobs": blobs,
+                "logical_bytes": logical,
+                "stored_bytes": stored,
+                "pending": len(self._pending),
+                "last_scan": self.last_scan,
+                **self.stats,
+            }
+
+    @staticmethod
+    def _file_dict(row):
+        workspace, path, name, case_id, digest, size, ingested, removed = row
+        return {"workspace": workspace, "path": path, "name": name, "case": case_id,
+                "hash": digest, "size": size, "ingested": ingested, "removed": removed}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    # --- sqlite -------------------------------------------------------------
+
+    def connection(self):
+        """This thread's SQLite connection (autocommit; use transaction() for writes)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
@@ -0,0 +1,344 @@
+"""
+Fake Docker
+In-process stand-in for a Docker daemon with configurable per-call latency, for
+benchmarking the workspace API without Docker or network access
+"""
+
+import itertools
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import docker
+
+# Mean seconds each call takes when no latency is given (roughly a local daemon)
+DEFAULT_LATENCY = {
+    "run": 0.05,
+    "get": 0.002,
+    "list": 0.005,
+    "logs": 0.003,
+    "stop": 0.01,
+    "remove": 0.005,
+    "stats": 0.002,
+}
+
+
+def parse_latency(text):
+    """ "run=0.05,get=0.002" to {"run": 0.05, "get": 0.002}; raises ValueError on bad input"""
+    latency = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        op, _, seconds = item.partition("=")
+        latency[op.strip()] = float(seconds)
+    return latency
+
+
+def _now_rfc3339():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class FakeContainer:
+    """A container the fake daemon 'runs'; state changes are instant apart from the modelled latency"""
+
+    def __init__(self, daemon, name, image, labels=None, ports=None, environment=None, log_lines=None):
+        self._daemon = daemon
+        self.id = uuid.uuid4().hex + uuid.uuid4().hex
+        self.name = name
+        self.image = image
+        self.labels = dict(labels or {})
+        self.environment = dict(environment or {})
+        self.ports = {}
+        for key, host_port in (ports or {}).items():
+            # None publishes on a port the daemon picks, as dockerd does
+            self.ports[key] = host_port if host_port else daemon.next_port()
+        self.status = "running"
+        self.log_lines = list(log_lines or [])
+
+    @property
+    def attrs(self):
+        bindings = {key: [{"HostIp": "0.0.0.0", "HostPort": str(port)}] for key, port in self.ports.items()}
+        return {
+            "Id": self.id,
+            "Name": f"/{self.name}",
+            "Image": _FakeImage(self.image).id,
+            "Names": [f"/{self.name}"],
+            "State": {"Status": self.status, "Running": self.status == "running", "Pid": 0},
+            "Config": {"Image": self.image, "Labels": self.labels,
+                       "Env": [f"{k}={v}" for k, v in self.environment.items()]},
+            "HostConfig": {},
+            "NetworkSettings": {"Ports": bindings, "Networks": {}},
+        }
+
+    def reload(self):
+        self._daemon.delay("get")
+        self._check()
+
+    def start(self):
+        self._set("running", "start")
+
+    def stop(self, timeout=10):
+        self._daemon.delay("stop")
+        self._set("exited", "stop")
+
+    def restart(self, timeout=10):
+        self._daemon.delay("stop")
+        self._set("running", "restart")
+
+    def kill(self, signal=None):
+        self._set("exited", "kill")
+
+    def pause(self):
+        self._set("paused", "pause")
+
+    def unpause(self):
+        self._set("running", "unpause")
+
+    def rename(self, name):
+        self._daemon.rename(self, name)
+
+    def remove(self, force=False, v=False):
+        self._daemon.delay("remove")
+        if self.status == "running" and not force:
+            raise docker.errors.APIError(f"cannot remove running container {self.name}")
+        self._daemon.remove(self)
+
+    def logs(self, stream=False, timestamps=False, tail="all", follow=False, **kwargs):
+        self._daemon.delay("logs")
+        lines = self.log_lines if tail == "all" else self.log_lines[-int(tail):] if int(tail) else []
+        stamp = _now_rfc3339()
+        data = [(f"{stamp} {line}\n" if timestamps else f"{line}\n").encode() for line in lines]
+        if stream:
+            return (chunk for chunk in data)
+        return b"".join(data)
+
+    def _set(self, status, action):
+        self._check()
+        self.status = status
+        self._daemon.emit(action, self)
+
+    def _check(self):
+        if self._daemon.containers.lookup(self.id) is None:
+            raise docker.errors.NotFound(f"No such container: {self.name}")
+
+
+class FakeContainers:
+    """client.containers"""
+
+    def __init__(self, daemon):
+        self._daemon = daemon
+        self._lock = threading.Lock()
+        self._by_id = {}
+
+    def run(self, image, name=None, detach=True, labels=None, ports=None, environment=None, **kwargs):
+        self._daemon.delay("run")
+        name = name or f"fake-{uuid.uuid4().hex[:8]}"
+        container = FakeContainer(self._daemon, name, image, labels, ports, environment, self._daemon.log_lines)
+        with self._lock:
+            if any(c.name == name for c in self._by_id.values()):
+                raise docker.errors.APIError(f"Conflict. The container name \"/{name}\" is already in use")
+            self._by_id[container.id] = container
+        self._daemon.emit("create", container)
+        self._daemon.emit("start", container)
+        return container
+
+    def add(self, name, image="fake:latest", labels=None, ports=None, status="running"):
+        """Seed a container without latency or events (synthetic fleets)"""
+        container = FakeContainer(self._daemon, name, image, labels, ports, log_lines=self._daemon.log_lines)
+        container.status = status
+        with self._lock:
+            self._by_id[container.id] = container
+        return container
+
+    def get(self, container_id):
+        self._daemon.delay("get")
+        container = self.lookup(container_id)
+        if container is None:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        return container
+
+    def lookup(self, key):
+        with self._lock:
+            if key in self._by_id:
+                return self._by_id[key]
+            return next((c for c in self._by_id.values() if c.name == key or c.id.startswith(key)), None)
+
+    def list(self, all=False, filters=None, sparse=False, **kwargs):
+        self._daemon.delay("list")
+        with self._lock:
+            containers = list(self._by_id.values())
+        if not all:
+            containers = [c for c in containers if c.status == "running"]
+        return [c for c in containers if _matches(c, filters)]
+
+    def discard(self, container):
+        with self._lock:
+            self._by_id.pop(container.id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+
+class FakeImages:
+    """client.images; every image is present"""
+
+    def __init__(self, daemon):
+        self._daemon = daemon
+
+    def get(self, name):
+        return _FakeImage(name)
+
+    def pull(self, repository, tag=None, **kwargs):
+        return _FakeImage(f"{repository}:{tag}" if tag else repository)
+
+    def build(self, tag=None, **kwargs):
+        return _FakeImage(tag), iter(())
+
+
+class _FakeImage:
+    def __init__(self, name):
+        self.id = "sha256:" + uuid.uuid5(uuid.NAMESPACE_URL, str(name)).hex
+        self.tags = [name]
+        self.attrs = {"Size": 0, "RepoTags": [name]}
+
+
+class _FakeAPI:
+    """client.api, for the low-level calls the app makes"""
+
+    def __init__(self, daemon):
+        self._daemon = daemon
+        self._cpu = itertools.count(0, 10_000_000)
+
+    def stats(self, container, stream=False, one_shot=False, **kwargs):
+        self._daemon.delay("stats")
+        return {
+            "cpu_stats": {"cpu_usage": {"total_usage": next(self._cpu)}, "system_cpu_usage": time.monotonic_ns(),
+                          "online_cpus": 1},
+            "memory_stats": {"usage": 256 << 20, "limit": 4 << 30, "stats": {"inactive_file": 0}},
+            "networks": {"eth0": {"rx_bytes": 0, "tx_bytes": 0}},
+            "pids_stats": {"current": 12},
+        }
+
+
+class _EventStream:
+    """Blocking iterator over daemon events until closed"""
+
+    def __init__(self, daemon, filters):
+        self._daemon = daemon
+        self._filters = filters
+        self._queue = queue.Queue()
+        self._closed = False
+
+    def put(self, event, container):
+        if _matches(container, self._filters):
+            self._queue.put(event)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._daemon.unsubscribe(self)
+
+    def __iter__(self):
+        while not self._closed:
+            event = self._queue.get()
+            if event is None:
+                return
+            yield event
+
+
+class FakeDockerClient:
+    """Drop-in for docker.DockerClient backed by in-memory containers
+
+    latency maps a call ("run", "get", "list", "logs", "stop", "remove", "stats")
+    to its mean duration in seconds; each call sleeps that long +/- jitter.
+    """
+
+    def __init__(self, latency=None, jitter=0.2, cpus=64, memory=256 << 30, port_base=40000, log_lines=None, seed=None):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.jitter = jitter
+        self.cpus = cpus
+        self.memory = memory
+        self.log_lines = log_lines if log_lines is not None else ["[ls.io-init] done.", "workspace ready"]
+        self.containers = FakeContainers(self)
+        self.images = FakeImages(self)
+        self.api = _FakeAPI(self)
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._ports = itertools.count(port_base)
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def delay(self, op):
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            mean = self.latency.get(op, 0)
+            seconds = mean * (1 + self._random.uniform(-self.jitter, self.jitter)) if mean else 0
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def next_port(self):
+        with self._lock:
+            return next(self._ports)
+
+    def ping(self):
+        return True
+
+    def info(self):
+        return {"NCPU": self.cpus, "MemTotal": self.memory, "Name": "fake-docker"}
+
+    def version(self):
+        return {"Version": "fake", "ApiVersion": "1.44"}
+
+    def close(self):
+        pass
+
+    def events(self, decode=True, filters=None, **kwargs):
+        stream = _EventStream(self, filters)
+        with self._lock:
+            self._subscribers.append(stream)
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._lock:
+            if stream in self._subscribers:
+                self._subscribers.remove(stream)
+
+    def emit(self, action, container):
+        event = {
+            "Type": "container",
+            "Action": action,
+            "Actor": {"ID": container.id, "Attributes": {"name": container.name, **container.labels}},
+            "time": int(time.time()),
+        }
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for stream in subscribers:
+            stream.put(event, container)
+
+    def rename(self, container, name):
+        if self.containers.lookup(name) is not None:
+            raise docker.errors.APIError(f"Conflict. The container name \"/{name}\" is already in use")
+        container.name = name
+        self.emit("rename", container)
+
+    def remove(self, container):
+        self.containers.discard(container)
+        self.emit("destroy", container)
+
+
+def _matches(container, filters):
+    """Apply the label/name filters the app uses"""
+    filters = filters or {}
+    labels = filters.get("label") or []
+    for label in [labels] if isinstance(labels, str) else labels:
+        key, _, value = label.partition("=")
+        if key not in container.labels or (value and container.labels[key] != value):
+            return False
+    name = filters.get("name")
+    if name and container.name != name.strip("^$"):
+        return False
+    return True
@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for the workspaces application
+Run from the interface directory: gunicorn -c gunicorn.conf.py
+"""
+
+import importlib.util
+import os
+
+wsgi_app = "workspace_app:app"
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+# Listen address (put SWAG or another TLS proxy in front of it)
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+
+# Cooperative (gevent) workers: Docker SDK calls and open event streams wait on sockets, so a
+# following log or job stream holds no thread and can't starve the dashboard. Without gevent,
+# threaded workers are used and every open stream holds a thread (see STREAM_MAX_CONNECTIONS).
+# Workers share workspaces, jobs, port leases, capacity, the warm pool and metrics through the database.
+workers = int(os.environ.get("WEB_WORKERS", "1"))
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gevent" if importlib.util.find_spec("gevent") else "gthread")
+threads = int(os.environ.get("WEB_THREADS", "128"))
+worker_connections = int(os.environ.get("WEB_CONNECTIONS", "1000"))
+
+# Workspace creation waits on image pulls and capacity in background jobs, not in requests
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", "5"))
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+capture_output = True
+
+
+def post_worker_init(worker):
+    """Connect the worker to Docker and start (or wait to take over) the background services"""
+    import workspace_app
+    workspace_app.start_worker()
@@ -0,0 +1,318 @@
+"""
+Idle Reaper
+Parks workspaces nobody is connected to (pause or stop) and brings them back
+transparently on the next open
+"""
+
+import threading
+import time
+from datetime import datetime
+
+ACTIONS = ("pause", "stop")
+
+# /proc/net/tcp state code for an established connection
+TCP_ESTABLISHED = "01"
+
+
+def idle_policy(config, default_after, default_action):
+    """Normalize an x-idle block into {"after", "action"}, or None if reaping is disabled"""
+    if config is False:
+        return None
+    if isinstance(config, (int, float)) and not isinstance(config, bool):
+        config = {"after": config}
+    policy = {"after": default_after, "action": default_action}
+    policy.update(config if isinstance(config, dict) else {})
+    policy["after"] = int(policy["after"])
+    if policy["action"] not in ACTIONS:
+        raise ValueError(f"Unknown idle action '{policy['action']}' (expected one of {', '.join(ACTIONS)})")
+    return policy if policy["after"] > 0 else None
+
+
+def established_sessions(port, pid=None):
+    """Count established TCP connections on a local port; None if /proc is not readable
+
+    With a container pid this looks inside the container's network namespace, which
+    also sees connections that bypass docker-proxy.
+    """
+    base = f"/proc/{pid}/net" if pid else "/proc/net"
+    count = 0
+    readable = False
+    for table in ("tcp", "tcp6"):
+        try:
+            with open(f"{base}/{table}", "r") as f:
+                count += count_established(f, port)
+            readable = True
+        except OSError:
+            continue
+    return count if readable else None
+
+
+def exec_sessions(container, port):
+    """Count established connections on a port by reading /proc/net/tcp inside the container
+    (for containers on other Docker nodes); None if it can't be read"""
+    try:
+        result = container.exec_run(["cat", "/proc/net/tcp", "/proc/net/tcp6"])
+    except Exception:
+        return None
+    # cat exits 1 when only tcp6 is missing; the tcp table is still there
+    if result.exit_code not in (0, 1) or not result.output:
+        return None
+    return count_established(result.output.decode(errors="replace").splitlines(), port)
+
+
+def count_established(lines, port):
+    """Established connections on a local port in /proc/net/tcp-format lines (header lines are skipped)"""
+    local_port = f"{port:04X}"
+    count = 0
+    for line in lines:
+        fields = line.split()
+        if len(fields) > 3 and fields[3] == TCP_ESTABLISHED and fields[1].rsplit(":", 1)[-1] == local_port:
+            count += 1
+    return count
+
+
+def memory_available():
+    """Fraction of host memory available (MemAvailable / MemTotal), or None off Linux"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            info = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(info["MemAvailable"].split()[0]) / int(info["MemTotal"].split()[0])
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+class IdleReaper:
+    """Periodically suspends idle workspaces according to per-service policies"""
+
+    def __init__(self, client_factory, store, statuses, default_after=7200, default_action="stop",
+                 interval=60, memory_threshold=0.0, pressure_after=600, container_port=3000, admit=None, local=None):
+        # client_factory(name) -> Docker client of the node the workspace runs on
+        # statuses() -> {name: {"status": ...}} for app containers, or None if Docker is down
+        # admit(name) -> whether a stopped workspace may be started again (host capacity)
+        # local(name) -> whether the workspace runs on this host, where its sockets can be read
+        self._client_factory = client_factory
+        self._local = local
+        self._store = store
+        self._statuses = statuses
+        self._admit = admit
+        self._container_port = container_port
+        self.default_policy = idle_policy(None, default_after, default_action)
+        self.interval = interval
+        self.memory_threshold = memory_threshold
+        self.pressure_after = pressure_after
+        self._policies = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_sweep = None
+        self.stats = {"sweeps": 0, "paused": 0, "stopped": 0, "resumed": 0, "busy": 0, "errors": 0}
+
+    def configure(self, policies):
+        """Set per-service policies: {service: {"after", "action"} or None to never reap}"""
+        with self._lock:
+            self._policies = dict(policies)
+
+    def policy_for(self, service_name):
+        with self._lock:
+            return self._policies.get(service_name, self.default_policy)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sweep_loop, name="idle-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def sweep(self):
+        """Suspend every workspace that has been idle past its policy; returns the names suspended"""
+        statuses = self._statuses()
+        if statuses is None:
+            return []
+
+        available = memory_available()
+        pressure = bool(self.memory_threshold and available is not None and available < self.memory_threshold)
+        now = time.time()
+
+        candidates = []
+        for name, data in self._store.all().items():
+            status = statuses.get(name, {}).get("status")
+            policy = self.policy_for(data.get("service"))
+            if policy is None or status not in ("running", "paused"):
+                continue
+            # Paused containers still hold their memory, so only pressure escalates them to a stop
+            if status == "paused" and not pressure:
+                continue
+            after = min(policy["after"], self.pressure_after) if pressure else policy["after"]
+            idle = now - self._last_activity(data)
+            if idle >= after:
+                candidates.append((idle, name, "stop" if pressure else policy["action"], after))
+
+        suspended = []
+        # Longest-idle first, so memory pressure parks the most forgotten workspaces
+        for idle, name, action, after in sorted(candidates, reverse=True):
+            if pressure and suspended:
+                available = memory_available()
+                if available is not None and available >= self.memory_threshold:
+                    break
+            reason = "memory pressure" if pressure else f"idle {int(idle)}s"
+            result = self.suspend(name, action, reason=reason, idle_after=after)
+            if result.get("suspended"):
+                suspended.append(name)
+
+        with self._lock:
+            self.stats["sweeps"] += 1
+            self.last_sweep = {
+                "time": datetime.now().isoformat(),
+                "candidates": len(candidates),
+                "suspended": suspended,
+                "memory_available": round(available, 3) if available is not None else None,
+                "memory_pressure": pressure,
+            }
+        if suspended:
+            print(f"[INFO] Idle reaper suspended {len(suspended)} workspace(s): {', '.join(suspended)}")
+        return suspended
+
+    def suspend(self, name, action="stop", reason="manual", idle_after=None):
+        """Pause or stop one workspace unless someone is connected to it"""
+        if action not in ACTIONS:
+            return {"success": False, "error": f"Unknown action '{action}'"}
+        with self._workspace_lock(name):
+            data = self._store.get(name)
+            if data is None:
+                return {"success": False, "error": "Workspace not found"}
+            # An open between the sweep's snapshot and now wins over the reaper
+            if idle_after is not None and time.time() - self._last_activity(data) < idle_after:
+                return {"success": True, "suspended": False, "message": "Recently accessed"}
+
+            client = self._client_factory(name)
+            if not client:
+                return {"success": False, "error": "Cannot connect to Docker daemon"}
+            try:
+                container = client.containers.get(name)
+                status = container.status
+
+                if idle_after is not None and status == "running":
+                    sessions = self._sessions(container, data)
+                    if sessions is None:
+                        return {"success": True, "suspended": False, "message": "Session count unavailable"}
+                    if sessions:
+                        # Connected but not using the dashboard; count it as activity
+                        self._store.touch(name)
+                        with self._lock:
+                            self.stats["busy"] += 1
+                        return {"success": True, "suspended": False, "message": f"{sessions} active session(s)"}
+
+                if action == "pause":
+                    if status != "running":
+                        return {"success": True, "suspended": False, "message": f"Container is {status}"}
+                    container.pause()
+                    state = "paused"
+                else:
+                    if status not in ("running", "paused"):
+                        return {"success": True, "suspended": False, "message": f"Container is {status}"}
+                    if status == "paused":
+                        container.unpause()
+                    container.stop(timeout=10)
+                    state = "stopped"
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"[WARNING] Could not {action} workspace '{name}': {e}")
+                return {"success": False, "error": str(e)}
+
+            self._store.update(name, suspended=state, suspended_at=datetime.now().isoformat(), suspend_reason=reason)
+            with self._lock:
+                self.stats[state] += 1
+        print(f"[INFO] Workspace '{name}' {state} ({reason})")
+        return {"success": True, "suspended": True, "state": state, "message": f"Workspace '{name}' {state}"}
+
+    def resume(self, name):
+        """Unpause or restart a parked workspace; a no-op for running ones"""
+        with self._workspace_lock(name):
+            data = self._store.get(name)
+            if data is None:
+                return {"success": False, "error": "Workspace not found"}
+            client = self._client_factory(name)
+            if not client:
+                return {"success": False, "error": "Cannot connect to Docker daemon"}
+            try:
+                container = client.containers.get(name)
+                status = container.status
+                if status == "running":
+                    if data.get("suspended"):
+                        self._store.update(name, suspended=None)
+                    return {"success": True, "resumed": False, "status": status}
+                if status == "paused":
+                    container.unpause()
+                elif self._admit and not self._admit(name):
+                    return {"success": False, "error": "Not enough host capacity to resume, try again later"}
+                else:
+                    container.start()
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"[WARNING] Could not resume workspace '{name}': {e}")
+                return {"success": False, "error": str(e)}
+
+            now = datetime.now().isoformat()
+            fields = {"suspended": None, "resumed_at": now, "last_accessed": now}
+            if status != "paused":
+                # A restarted desktop needs its readiness probe again
+                fields["ready"] = False
+            self._store.update(name, **fields)
+            with self._lock:
+                self.stats["resumed"] += 1
+        print(f"[INFO] Workspace '{name}' resumed from {status}")
+        return {"success": True, "resumed": True, "status": "running", "was": status,
+                "message": f"Workspace '{name}' resumed"}
+
+    def status(self):
+        with self._lock:
+            return {
+                "default_policy": self.default_policy,
+                "policies": dict(self._policies),
+                "interval": self.interval,
+                "memory_threshold": self.memory_threshold,
+                "pressure_after": self.pressure_after,
+                "last_sweep": self.last_sweep,
+                **self.stats,
+            }
+
+    def _sessions(self, container, data):
+        """Open sessions on a workspace; None if they can't be counted (it is then left alone)"""
+        if self._local and not self._local(container.name):
+            # /proc here says nothing about another host's containers; ask inside the container
+            return exec_sessions(container, self._container_port)
+        pid = (container.attrs.get("State") or {}).get("Pid")
+        sessions = established_sessions(self._container_port, pid) if pid else None
+        if sessions is None and data.get("web_port"):
+            sessions = established_sessions(data["web_port"])
+        if sessions is None:
+            # Host /proc isn't readable (e.g. the manager runs in its own container)
+            sessions = exec_sessions(container, self._container_port)
+        return sessions
+
+    def _last_activity(self, data):
+        for field in ("last_accessed", "resumed_at", "created"):
+            try:
+                return datetime.fromisoformat(data[field]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+        return time.time()
+
+    def _workspace_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _sweep_loop(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"[WARNING] Idle reaper sweep failed: {e}")
@@ -0,0 +1,336 @@
+"""
+Image Cache
+Pre-pulls every service image on each Docker node so launches never wait for a pull,
+records the digest each tag resolved to, and prunes workspace images nobody uses
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import docker
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_cache (
+    node TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    digest TEXT,
+    pulled_at TEXT,
+    last_used REAL,
+    PRIMARY KEY (node, image_id)
+);
+"""
+
+
+def repository(reference):
+    """ "lscr.io/linuxserver/chromium:latest" or "repo@sha256:..." to its repository"""
+    return docker.utils.parse_repository_tag(reference)[0]
+
+
+def repo_digest(image, reference):
+    """The repo@sha256 digest an image was pulled as, preferring the reference's repository"""
+    digests = image.attrs.get("RepoDigests") or []
+    wanted = repository(reference)
+    return next((d for d in digests if repository(d) == wanted), digests[0] if digests else None)
+
+
+class ImageCache:
+    """Per-node image prefetcher with digest pinning and LRU/size-bounded pruning"""
+
+    def __init__(self, store, clients, references, pull, refresh_interval=21600, max_parallel=2,
+                 max_unused=604800, max_size=0):
+        # clients() -> {node name: Docker client} for the nodes images should be kept on
+        # references() -> image references the service catalog launches
+        # pull(client, reference, progress) pulls an image, raising on failure
+        self._store = store
+        self._clients = clients
+        self._references = references
+        self._pull = pull
+        self.refresh_interval = refresh_interval
+        self.max_parallel = max(1, max_parallel)
+        self.max_unused = max_unused
+        self.max_size = max_size
+        self._current = {}
+        self._pulling = {}
+        self._disk = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_refresh = None
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "prefetched": 0, "updated": 0,
+                      "pull_failures": 0, "pruned": 0, "reclaimed_bytes": 0}
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="image-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def wake(self):
+        """Run a prefetch and prune cycle now (in a one-off thread where no refresher runs)"""
+        if self._thread and self._thread.is_alive():
+            self._wakeup.set()
+        else:
+            threading.Thread(target=self.refresh, name="image-refresh", daemon=True).start()
+
+    def ensure(self, node, client, reference, progress=None):
+        """The local image for reference on a node, pulling it only if the prefetcher has not
+
+        A launch that arrives while the same image is being pulled waits for that pull
+        instead of starting another. Raises whatever the pull raises.
+        """
+        try:
+            image = client.images.get(reference)
+            self._count("hits")
+        except docker.errors.ImageNotFound:
+            with self._pull_lock(node, reference) as waited:
+                try:
+                    image = client.images.get(reference)
+                    self._count("coalesced" if waited else "hits")
+                except docker.errors.ImageNotFound:
+                    self._count("misses")
+                    print(f"[WARNING] Image '{reference}' not prefetched on node '{node}', pulling at launch")
+                    if progress:
+                        progress("pull", f"Pulling image {reference}")
+                    self._pull(client, reference, progress)
+                    image = client.images.get(reference)
+        self._record(node, reference, image, used=True)
+        return image
+
+    def used(self, node, image, reference, digest=None):
+        """Mark an image a workspace was just started from (derived images record their base's digest)"""
+        self._record(node, reference, image, used=True, digest=digest)
+
+    def pin(self, node, image_id):
+        """{"image_id", "image_digest"} for a container's image, for workspace metadata"""
+        row = self._store.connection().execute(
+            "SELECT digest FROM image_cache WHERE node = ? AND image_id = ?", (node, image_id)
+        ).fetchone()
+        return {"image_id": image_id, "image_digest": row[0] if row else None}
+
+    def refresh(self):
+        """Pull every catalog image on every node (limited concurrency), then prune; returns a summary"""
+        references = sorted(set(self._references()))
+        clients = {name: client for name, client in self._clients().items() if client}
+        work = [(node, client, reference) for node, client in clients.items() for reference in references]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="image-pull") as pool:
+            results = list(pool.map(lambda item: self._prefetch(*item), work))
+        pruned = {}
+        for node, client in clients.items():
+            try:
+                pruned[node] = self.prune(node, client)
+            except Exception as e:
+                print(f"[WARNING] Could not prune images on node '{node}': {e}")
+        summary = {
+            "time": datetime.now().isoformat(),
+            "seconds": round(time.monotonic() - started, 1),
+            "images": len(references),
+            "nodes": sorted(clients),
+            "pulled": sum(1 for result in results if result == "pulled"),
+            "updated": sum(1 for result in results if result == "updated"),
+            "failed": sum(1 for result in results if result == "failed"),
+            "pruned": {node: len(removed) for node, removed in pruned.items()},
+        }
+        with self._lock:
+            self.last_refresh = summary
+        print(f"[INFO] Image cache refreshed {summary['images']} image(s) on {len(clients)} node(s) "
+              f"in {summary['seconds']}s ({summary['updated']} updated, {summary['failed']} failed)")
+        return summary
+
+    def prune(self, node, client, dry_run=False):
+        """Remove workspace images on a node that no container uses and no current tag points to
+
+        Images unused for max_unused seconds go first; then, while the node's images take
+        more than max_size bytes, the least recently used of the rest. Returns what was removed.
+        """
+        usage = client.df()
+        images = usage.get("Images") or []
+        references = set(self._references())
+        repositories = {repository(reference) for reference in references}
+        # What the catalog's tags point to now is never pruned, used or not
+        current = set()
+        for reference in references:
+            try:
+                current.add(client.images.get(reference).id)
+            except docker.errors.ImageNotFound:
+                continue
+        last_used = dict(self._store.connection().execute(
+            "SELECT image_id, MAX(last_used) FROM image_cache WHERE node = ? GROUP BY image_id", (node,)
+        ).fetchall())
+
+        now = time.time()
+        candidates = []
+        for image in images:
+            tags = [t for t in image.get("RepoTags") or [] if t != "<none>:<none>"]
+            names = tags + (image.get("RepoDigests") or [])
+            managed = (image.get("Labels") or {}).get("created_by") == "workspace_app" or any(
+                repository(name) in repositories for name in names
+            )
+            if not managed or image["Id"] in current or image.get("Containers", 0) > 0:
+                continue
+            used = last_used.get(image["Id"]) or image.get("Created") or 0
+            unique = image.get("Size", 0) - max(image.get("SharedSize", 0), 0)
+            candidates.append((used, image["Id"], tags, unique))
+
+        total = usage.get("LayersSize") or sum(image.get("Size", 0) for image in images)
+        removed = []
+        for used, image_id, tags, unique in sorted(candidates):
+            stale = self.max_unused and now - used >= self.max_unused
+            if not stale and not (self.max_size and total > self.max_size):
+                continue
+            if not dry_run:
+                try:
+                    # Untag one by one; removing the last tag deletes the image
+                    for ref in tags or [image_id]:
+                        client.images.remove(ref)
+                except docker.errors.APIError as e:
+                    print(f"[WARNING] Could not remove image {image_id[:19]} on node '{node}': {e}")
+                    continue
+                with self._store.transaction() as conn:
+                    conn.execute("DELETE FROM image_cache WHERE node = ? AND image_id = ?", (node, image_id))
+            total -= unique
+            removed.append({"id": image_id, "tags": tags, "bytes": unique, "stale": bool(stale)})
+
+        if removed and not dry_run:
+            reclaimed = sum(entry["bytes"] for entry in removed)
+            with self._lock:
+                self.stats["pruned"] += len(removed)
+                self.stats["reclaimed_bytes"] += reclaimed
+            print(f"[INFO] Pruned {len(removed)} image(s) on node '{node}', {reclaimed / (1 << 30):.2f} GiB reclaimed")
+        self._snapshot(node, images, current, last_used, total)
+        return removed
+
+    def status(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "refresh_interval": self.refresh_interval,
+                "max_parallel": self.max_parallel,
+                "max_unused": self.max_unused,
+                "max_size": self.max_size or None,
+                "pulling": [{"node": node, "image": reference} for node, reference in self._pulling],
+                "last_refresh": self.last_refresh,
+                "nodes": dict(self._disk),
+            }
+
+    def _prefetch(self, node, client, reference):
+        with self._pull_lock(node, reference):
+            with self._lock:
+                previous = self._current.get((node, reference))
+            try:
+                self._pull(client, reference, None)
+                image = client.images.get(reference)
+            except Exception as e:
+                self._count("pull_failures")
+                print(f"[WARNING] Could not prefetch '{reference}' on node '{node}': {e}")
+                return "failed"
+            self._record(node, reference, image, pulled=True)
+        self._count("prefetched")
+        if previous and previous != image.id:
+            # A moving tag (":latest") now points elsewhere; running workspaces keep their image
+            self._count("updated")
+            print(f"[INFO] Image '{reference}' on node '{node}' updated: {previous[:19]} -> {image.id[:19]}")
+            return "updated"
+        return "pulled"
+
+    def _record(self, node, reference, image, used=False, pulled=False, digest=None):
+        digest = digest or repo_digest(image, reference)
+        with self._lock:
+            if pulled or (node, reference) not in self._current:
+                self._current[(node, reference)] = image.id
+        with self._store.transaction() as conn:
+            conn.execute(
+                "INSERT INTO image_cache (node, image_id, reference, digest, pulled_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (node, image_id) DO UPDATE SET "
+                "reference = excluded.reference, digest = COALESCE(excluded.digest, digest), "
+                "pulled_at = COALESCE(excluded.pulled_at, pulled_at), "
+                "last_used = COALESCE(excluded.last_used, last_used)",
+                (node, image.id, reference, digest, datetime.now().isoformat() if pulled else None,
+                 time.time() if used else None)
+            )
+
+    def _snapshot(self, node, images, current, last_used, total):
+        """Per-image disk use on a node, as last seen by prune"""
+        entries = []
+        for image in images:
+            shared = max(image.get("SharedSize", 0), 0)
+            entries.append({
+                "id": image["Id"],
+                "tags": [t for t in image.get("RepoTags") or [] if t != "<none>:<none>"],
+                "digests": image.get("RepoDigests") or [],
+                "size": image.get("Size", 0),
+                "shared": shared,
+                "unique": image.get("Size", 0) - shared,
+                "containers": image.get("Containers", 0),
+                "current": image["Id"] in current,
+                "last_used": datetime.fromtimestamp(last_used[image["Id"]]).isoformat()
+                if last_used.get(image["Id"]) else None,
+            })
+        with self._lock:
+            self._disk[node] = {
+                "time": datetime.now().isoformat(),
+                "bytes": total,
+                "images": sorted(entries, key=lambda entry: -entry["size"]),
+            }
+
+    def _pull_lock(self, node, reference):
+        return _PullLock(self, (node, reference))
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _refresh_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARNING] Image cache refresh failed: {e}")
+            if self.refresh_interval <= 0:
+                # Prefetch once at startup; later cycles only on wake()
+                self._wakeup.wait()
+            else:
+                self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+
+class _PullLock:
+    """One pull at a time per (node, image); entering yields whether another pull was waited for"""
+
+    def __init__(self, cache, key):
+        self._cache = cache
+        self._key = key
+
+    def __enter__(self):
+        cache = self._cache
+        with cache._lock:
+            lock, waiters = cache._pulling.get(self._key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            cache._pulling[self._key] = (lock, waiters + 1)
+            self._lock = lock
+        waited = self._lock.locked()
+        self._lock.acquire()
+        return waited
+
+    def __exit__(self, *exc):
+        cache = self._cache
+        self._lock.release()
+        with cache._lock:
+            lock, waiters = cache._pulling[self._key]
+            if waiters <= 1:
+                del cache._pulling[self._key]
+            else:
+                cache._pulling[self._key] = (lock, waiters - 1)
+        return False
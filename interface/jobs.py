@@ -0,0 +1,289 @@
+"""
+Job Manager
+Runs long workspace operations on a bounded thread pool and records their progress
+so clients can follow along (polling or server-sent events), from any worker process
+when the jobs are kept in the shared SQLite store
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+FINISHED = ("succeeded", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    target TEXT,
+    status TEXT NOT NULL,
+    created TEXT NOT NULL,
+    finished TEXT,
+    finished_at REAL,
+    result TEXT,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker"""
+
+
+def worker_id():
+    """host:pid of this process, so other workers can tell when a job's runner has died"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Job:
+    """One background operation and its progress events"""
+
+    def __init__(self, kind, target=None, store=None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.target = target
+        self.status = "queued"
+        self.result = None
+        self.created = datetime.now().isoformat()
+        self.finished = None
+        self.events = []
+        self._finished_at = None
+        self._store = store
+        self._cond = threading.Condition()
+        if store is not None:
+            with store.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, target, status, created, worker) VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.id, kind, target, self.status, self.created, worker_id())
+                )
+
+    def progress(self, phase, message, **details):
+        """Append a progress event and wake anyone streaming this job"""
+        with self._cond:
+            event = {
+                "seq": len(self.events) + 1,
+                "phase": phase,
+                "message": message,
+                "time": datetime.now().isoformat(),
+                **details
+            }
+            self.events.append(event)
+            if self._store is not None:
+                self._store.connection().execute(
+                    "INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)",
+                    (self.id, event["seq"], json.dumps(event, default=str))
+                )
+            self._cond.notify_all()
+
+    def start(self):
+        self._set_status("running")
+
+    def finish(self, status, result):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.finished = datetime.now().isoformat()
+            self._finished_at = time.monotonic()
+            if self._store is not None:
+                self._store.connection().execute(
+                    "UPDATE jobs SET status = ?, result = ?, finished = ?, finished_at = ? WHERE id = ?",
+                    (status, json.dumps(result, default=str), self.finished, time.time(), self.id)
+                )
+            self._cond.notify_all()
+
+    def wait_events(self, after_seq, timeout):
+        """Block until there are events past after_seq or the job finishes; returns (events, done)"""
+        with self._cond:
+            if len(self.events) <= after_seq and self.status not in FINISHED:
+                self._cond.wait(timeout)
+            return self.events[after_seq:], self.status in FINISHED
+
+    def to_dict(self, include_events=True):
+        with self._cond:
+            data = {
+                "id": self.id,
+                "kind": self.kind,
+                "target": self.target,
+                "status": self.status,
+                "created": self.created,
+                "finished": self.finished,
+                "result": self.result,
+            }
+            if include_events:
+                data["events"] = list(self.events)
+            return data
+
+    def _set_status(self, status):
+        with self._cond:
+            self.status = status
+            if self._store is not None:
+                self._store.connection().execute("UPDATE jobs SET status = ? WHERE id = ?", (status, self.id))
+            self._cond.notify_all()
+
+
+class StoredJob:
+    """Read-only view of a job another worker process is running (or ran)"""
+
+    def __init__(self, store, row, poll_interval=0.5):
+        self._store = store
+        self._poll_interval = poll_interval
+        self.id = row[0]
+        self._row = row
+
+    def wait_events(self, after_seq, timeout):
+        """Poll the store until there are events past after_seq or the job finishes"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._events(after_seq)
+            done = self._refresh()["status"] in FINISHED
+            if events or done or time.monotonic() >= deadline:
+                return events, done
+            time.sleep(min(self._poll_interval, max(deadline - time.monotonic(), 0)))
+
+    def to_dict(self, include_events=True):
+        data = dict(self._refresh())
+        if include_events:
+            data["events"] = self._events(0)
+        return data
+
+    def _refresh(self):
+        row = self._store.connection().execute(
+            "SELECT id, kind, target, status, created, finished, result, worker FROM jobs WHERE id = ?", (self.id,)
+        ).fetchone() or self._row
+        self._row = row
+        return job_from_row(row)
+
+    def _events(self, after_seq):
+        rows = self._store.connection().execute(
+            "SELECT data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq", (self.id, after_seq)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+
+def worker_alive(worker):
+    """Whether the host:pid that ran a job still exists (unknown hosts are assumed alive)"""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def job_from_row(row):
+    job_id, kind, target, status, created, finished, result, worker = row
+    data = {
+        "id": job_id,
+        "kind": kind,
+        "target": target,
+        "status": status,
+        "created": created,
+        "finished": finished,
+        "result": json.loads(result) if result else None,
+    }
+    if status not in FINISHED and not worker_alive(worker):
+        # The process running it exited before the job finished
+        data["status"] = "failed"
+        data["result"] = {"success": False, "error": "The worker running this job exited"}
+    return data
+
+
+class JobManager:
+    """Bounded executor plus a table of recent jobs (in memory, or shared through a store)"""
+
+    def __init__(self, max_workers=4, max_pending=32, retention=3600, store=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._max_pending = max_pending
+        self._retention = retention
+        self._store = store
+        self._lock = threading.Lock()
+        self._jobs = {}
+        if store is not None:
+            with store.connection() as conn:
+                conn.executescript(SCHEMA)
+
+    def submit(self, kind, fn, *args, target=None, **kwargs):
+        """Queue fn(*args, progress=job.progress, **kwargs); fn returns a result dict with "success" """
+        with self._lock:
+            self._prune_locked()
+            pending = sum(1 for job in self._jobs.values() if job.status in ("queued", "running"))
+            if pending >= self._max_pending:
+                raise JobQueueFull(f"{pending} jobs already pending")
+            job = Job(kind, target, self._store)
+            self._jobs[job.id] = job
+
+        job.progress("queued", f"{kind} queued")
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self._store is None:
+            return job
+        row = self._store.connection().execute(
+            "SELECT id, kind, target, status, created, finished, result, worker FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return StoredJob(self._store, row) if row else None
+
+    def list(self):
+        if self._store is not None:
+            rows = self._store.connection().execute(
+                "SELECT id, kind, target, status, created, finished, result, worker FROM jobs ORDER BY created"
+            ).fetchall()
+            return [job_from_row(row) for row in rows]
+        with self._lock:
+            return [job.to_dict(include_events=False) for job in self._jobs.values()]
+
+    def stream(self, job, after_seq=0, keepalive=15):
+        """Yield server-sent event chunks for a job until it finishes"""
+        seq = after_seq
+        while True:
+            events, done = job.wait_events(seq, keepalive)
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {seq}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            if done and not events:
+                yield f"event: done\ndata: {json.dumps(job.to_dict(include_events=False))}\n\n"
+                return
+            if not events:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+    def _run(self, job, fn, args, kwargs):
+        job.start()
+        try:
+            result = fn(*args, progress=job.progress, **kwargs)
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} ({job.kind}) crashed: {e}")
+            result = {"success": False, "error": f"Unexpected error: {str(e)}"}
+        status = "succeeded" if result.get("success") else "failed"
+        job.progress(status, result.get("message") or result.get("error") or status)
+        job.finish(status, result)
+
+    def _prune_locked(self):
+        cutoff = time.monotonic() - self._retention
+        for job_id in [j.id for j in self._jobs.values() if j._finished_at and j._finished_at < cutoff]:
+            del self._jobs[job_id]
+        if self._store is not None:
+            with self._store.transaction() as conn:
+                expired = "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?"
+                cutoff = time.time() - self._retention
+                conn.execute(f"DELETE FROM job_events WHERE job_id IN ({expired})", (cutoff,))
+                conn.execute(f"DELETE FROM jobs WHERE id IN ({expired})", (cutoff,))
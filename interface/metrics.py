@@ -0,0 +1,337 @@
+"""
+Metrics
+Bounded CPU, memory, network and block-IO series for running workspaces, sampled on one
+background thread into the workspace database (so every worker can serve them), plus
+request latency histograms, exported in Prometheus text format
+"""
+
+import json
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_samples (
+    container_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    name TEXT NOT NULL,
+    node TEXT,
+    sample TEXT NOT NULL,
+    PRIMARY KEY (container_id, time)
+);
+CREATE INDEX IF NOT EXISTS idx_metric_samples_name ON metric_samples(name, time);
+"""
+
+# Request latency buckets in seconds (SSE responses are timed up to their first byte)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (metric name, sample field, type, help) for the per-workspace series
+WORKSPACE_METRICS = (
+    ("workspace_cpu_percent", "cpu_percent", "gauge", "CPU usage as a percentage of one core"),
+    ("workspace_memory_usage_bytes", "memory_usage", "gauge", "Memory in use, excluding page cache"),
+    ("workspace_memory_limit_bytes", "memory_limit", "gauge", "Memory limit of the container"),
+    ("workspace_network_receive_bytes_total", "rx_bytes", "counter", "Bytes received on all interfaces"),
+    ("workspace_network_transmit_bytes_total", "tx_bytes", "counter", "Bytes sent on all interfaces"),
+    ("workspace_block_read_bytes_total", "read_bytes", "counter", "Bytes read from block devices"),
+    ("workspace_block_write_bytes_total", "write_bytes", "counter", "Bytes written to block devices"),
+    ("workspace_pids", "pids", "gauge", "Processes and threads in the container"),
+)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def sample_from_stats(stats, previous=None):
+    """Reduce one Docker stats document to a flat sample
+
+    CPU is computed against the previous sample's counters, so one-shot stats
+    (which leave precpu_stats empty) still give a rate.
+    """
+    cpu_stats = stats.get("cpu_stats") or {}
+    cpu_total = (cpu_stats.get("cpu_usage") or {}).get("total_usage") or 0
+    system_total = cpu_stats.get("system_cpu_usage") or 0
+    online_cpus = cpu_stats.get("online_cpus") or len((cpu_stats.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+
+    cpu_percent = 0.0
+    if previous and system_total > previous["_system_total"] and cpu_total >= previous["_cpu_total"]:
+        cpu_delta = cpu_total - previous["_cpu_total"]
+        system_delta = system_total - previous["_system_total"]
+        cpu_percent = round(cpu_delta / system_delta * online_cpus * 100.0, 2)
+
+    memory_stats = stats.get("memory_stats") or {}
+    memory_detail = memory_stats.get("stats") or {}
+    # Same as `docker stats`: page cache can be reclaimed, so it doesn't count as usage
+    cache = memory_detail.get("inactive_file", memory_detail.get("total_inactive_file", memory_detail.get("cache", 0)))
+    memory_usage = max((memory_stats.get("usage") or 0) - (cache or 0), 0)
+
+    rx_bytes = tx_bytes = 0
+    for interface in (stats.get("networks") or {}).values():
+        rx_bytes += interface.get("rx_bytes") or 0
+        tx_bytes += interface.get("tx_bytes") or 0
+
+    read_bytes = write_bytes = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = (entry.get("op") or "").lower()
+        if op == "read":
+            read_bytes += entry.get("value") or 0
+        elif op == "write":
+            write_bytes += entry.get("value") or 0
+
+    return {
+        "time": time.time(),
+        "cpu_percent": cpu_percent,
+        "memory_usage": memory_usage,
+        "memory_limit": memory_stats.get("limit") or 0,
+        "rx_bytes": rx_bytes,
+        "tx_bytes": tx_bytes,
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+        "pids": (stats.get("pids_stats") or {}).get("current") or 0,
+        "_cpu_total": cpu_total,
+        "_system_total": system_total,
+    }
+
+
+def public_sample(sample):
+    return {key: value for key, value in sample.items() if not key.startswith("_")}
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram per (route, method), plus request counts per status"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = {}
+
+    def observe(self, route, method, status, seconds):
+        with self._lock:
+            series = self._series.get((route, method))
+            if series is None:
+                series = self._series[(route, method)] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += seconds
+            series["count"] += 1
+            key = (route, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def render(self, name="http_request_duration_seconds"):
+        with self._lock:
+            series = {key: {**value, "counts": list(value["counts"])} for key, value in self._series.items()}
+            requests = dict(self._requests)
+
+        lines = [
+            f"# HELP {name} Request latency by route",
+            f"# TYPE {name} histogram",
+        ]
+        for (route, method), value in sorted(series.items()):
+            labels = {"route": route, "method": method}
+            cumulative = 0
+            for bound, count in zip(self.buckets, value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {value['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(round(value['sum'], 6))}")
+            lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+
+        lines.append("# HELP http_requests_total Requests by route, method and status")
+        lines.append("# TYPE http_requests_total counter")
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f"http_requests_total{format_labels({'route': route, 'method': method, 'status': status})} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class WorkspaceMetrics:
+    """Samples every running workspace container in turn and keeps a bounded history of each"""
+
+    def __init__(self, client_factory, statuses, store, interval=10, history=360):
+        # statuses() -> {name: {"status", "id", "node", ...}} for app containers, or None if Docker is down
+        # client_factory(node) -> Docker client of the node a status entry names
+        # store: the WorkspaceStore whose database holds the samples
+        self._client_factory = client_factory
+        self._statuses = statuses
+        self._store = store
+        self.interval = interval
+        self.history = history
+        self._lock = threading.Lock()
+        # Last raw sample of each container, for CPU rates (reloaded from the database after a takeover)
+        self._previous = {}
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_cycle = None
+        self.stats = {"cycles": 0, "samples": 0, "errors": 0}
+
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="workspace-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def on_container_event(self, action, entry):
+        """Container state cache listener; drops series of removed containers, follows renames"""
+        container_id = entry.get("id")
+        if not container_id or action not in ("destroy", "rename"):
+            return
+        with self._store.transaction() as conn:
+            if action == "destroy":
+                conn.execute("DELETE FROM metric_samples WHERE container_id = ?", (container_id,))
+            elif entry.get("name"):
+                conn.execute("UPDATE metric_samples SET name = ? WHERE container_id = ?", (entry["name"], container_id))
+        if action == "destroy":
+            with self._lock:
+                self._previous.pop(container_id, None)
+
+    def collect(self):
+        """Take one sample of every running workspace; returns how many were sampled"""
+        statuses = self._statuses()
+        if not statuses:
+            return 0
+
+        started = time.monotonic()
+        samples = []
+        clients = {}
+        running = {entry["id"]: (name, entry.get("node")) for name, entry in statuses.items()
+                   if entry.get("status") == "running" and entry.get("id")}
+        for container_id, (name, node) in running.items():
+            if self._stopped.is_set():
+                break
+            if node not in clients:
+                clients[node] = self._client_factory(node)
+            client = clients[node]
+            if not client:
+                continue
+            try:
+                # one_shot skips the daemon's second read for precpu_stats; the rate comes from our history
+                stats = client.api.stats(container_id, stream=False, one_shot=True)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"[WARNING] Could not sample metrics for '{name}': {e}")
+                continue
+            sample = sample_from_stats(stats, self._previous_sample(container_id))
+            with self._lock:
+                self._previous[container_id] = sample
+                self.stats["samples"] += 1
+            samples.append((container_id, name, node, sample))
+
+        # Keep history across stop/start but not for containers that are gone
+        known = {entry.get("id") for entry in statuses.values()}
+        with self._store.transaction() as conn:
+            for container_id, name, node, sample in samples:
+                conn.execute(
+                    "INSERT OR REPLACE INTO metric_samples (container_id, time, name, node, sample) VALUES (?, ?, ?, ?, ?)",
+                    (container_id, sample["time"], name, node, json.dumps(sample))
+                )
+                conn.execute(
+                    "DELETE FROM metric_samples WHERE container_id = ? AND time <= ("
+                    "SELECT time FROM metric_samples WHERE container_id = ? ORDER BY time DESC LIMIT 1 OFFSET ?)",
+                    (container_id, container_id, self.history)
+                )
+            stored = [row[0] for row in conn.execute("SELECT DISTINCT container_id FROM metric_samples")]
+            for container_id in stored:
+                if container_id not in known:
+                    conn.execute("DELETE FROM metric_samples WHERE container_id = ?", (container_id,))
+        with self._lock:
+            for container_id in [c for c in self._previous if c not in known]:
+                self._previous.pop(container_id, None)
+            self.stats["cycles"] += 1
+            self.last_cycle = {"sampled": len(samples), "seconds": round(time.monotonic() - started, 3)}
+        return len(samples)
+
+    def series(self, name, limit=None):
+        """Samples for one workspace, oldest first"""
+        conn = self._store.connection()
+        row = conn.execute(
+            "SELECT container_id FROM metric_samples WHERE name = ? ORDER BY time DESC LIMIT 1", (name,)
+        ).fetchone()
+        if row is None:
+            return []
+        rows = conn.execute(
+            "SELECT sample FROM metric_samples WHERE container_id = ? ORDER BY time DESC LIMIT ?",
+            (row[0], limit or self.history)
+        ).fetchall()
+        return [public_sample(json.loads(sample)) for sample, in reversed(rows)]
+
+    def latest(self):
+        """Most recent sample of every workspace, keyed by name"""
+        # SQLite takes the bare columns from the row holding MAX(time)
+        rows = self._store.connection().execute(
+            "SELECT name, node, sample, MAX(time) FROM metric_samples GROUP BY container_id"
+        ).fetchall()
+        return {name: {**public_sample(json.loads(sample)), "node": node} for name, node, sample, _ in rows}
+
+    def render(self):
+        latest = self.latest()
+        lines = []
+        for metric, field, kind, help_text in WORKSPACE_METRICS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, sample in sorted(latest.items()):
+                labels = {"workspace": name, "node": sample["node"]} if sample["node"] else {"workspace": name}
+                lines.append(f"{metric}{format_labels(labels)} {format_value(sample[field])}")
+        with self._lock:
+            counters = dict(self.stats)
+        lines.append("# HELP workspace_metrics_samples_total Container stats samples taken")
+        lines.append("# TYPE workspace_metrics_samples_total counter")
+        lines.append(f"workspace_metrics_samples_total {counters['samples']}")
+        lines.append("# HELP workspace_metrics_errors_total Container stats reads that failed")
+        lines.append("# TYPE workspace_metrics_errors_total counter")
+        lines.append(f"workspace_metrics_errors_total {counters['errors']}")
+        return "\n".join(lines) + "\n"
+
+    def status(self):
+        workspaces = self._store.connection().execute(
+            "SELECT COUNT(DISTINCT container_id) FROM metric_samples"
+        ).fetchone()[0]
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "history": self.history,
+                "workspaces": workspaces,
+                "last_cycle": self.last_cycle,
+                **self.stats,
+            }
+
+    def _previous_sample(self, container_id):
+        with self._lock:
+            previous = self._previous.get(container_id)
+        if previous is None:
+            row = self._store.connection().execute(
+                "SELECT sample FROM metric_samples WHERE container_id = ? ORDER BY time DESC LIMIT 1", (container_id,)
+            ).fetchone()
+            previous = json.loads(row[0]) if row else None
+        return previous
+
+    def _sample_loop(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.collect()
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"[WARNING] Metrics collection failed: {e}")
+            self._stopped.wait(max(self.interval - (time.monotonic() - started), 1))
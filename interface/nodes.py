@@ -0,0 +1,246 @@
+"""
+Docker Nodes
+Registry of the Docker daemons workspaces run on, each with its own client, state cache
+and capacity ledger, and a scheduler that places new workspaces on the least loaded one
+"""
+
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+import docker
+import yaml
+from docker.context import ContextAPI
+
+from capacity import HostCapacity
+from container_state import ContainerStateCache
+from docker_client import DockerClientManager
+
+NODE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+def _memory_load(status):
+    # Nodes that haven't reported their memory yet sort after the ones that have
+    if not status["memory_allocatable"]:
+        return (1, status["memory_committed"])
+    return (0, status["memory_committed"] / status["memory_allocatable"])
+
+
+def _cpu_load(status):
+    return (0, status["cpu_committed"] / status["cpu_allocatable"]) if status["cpu_allocatable"] else (1, 0)
+
+
+# Scheduling strategy -> sort key over a node's capacity status (lowest wins)
+STRATEGIES = {
+    "least-memory": _memory_load,
+    "least-cpu": _cpu_load,
+    "fewest-workspaces": lambda status: (0, status["active"]),
+}
+
+
+def parse_nodes(inline="", path=None):
+    """Node configs from DOCKER_NODES ("name=url,...") and a DOCKER_NODES_FILE YAML list
+
+    Entries that can't be used are reported and skipped; returns (configs, problems).
+    """
+    entries = []
+    for item in (inline or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, url = item.partition("=")
+        entries.append({"name": name.strip(), "url": url.strip()})
+    if path and Path(path).exists():
+        loaded = yaml.safe_load(Path(path).read_text()) or {}
+        file_entries = loaded.get("nodes", []) if isinstance(loaded, dict) else loaded
+        if not isinstance(file_entries, list):
+            return [], [f"{path}: expected a list of nodes"]
+        entries.extend(file_entries)
+
+    configs, problems, seen = [], [], set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            problems.append(f"node {index}: expected a mapping")
+            continue
+        name = str(entry.get("name") or "")
+        if not NODE_NAME_PATTERN.match(name):
+            problems.append(f"node {index}: invalid name '{name}'")
+        elif name in seen:
+            problems.append(f"node '{name}': defined twice")
+        elif not entry.get("url") and not entry.get("context"):
+            problems.append(f"node '{name}': needs a 'url' or a Docker 'context'")
+        else:
+            seen.add(name)
+            configs.append(dict(entry, name=name))
+    return configs, problems
+
+
+def tls_config(config):
+    """docker TLSConfig from a node's {"ca", "cert", "key", "verify"} block"""
+    if not config:
+        return None
+    if config is True:
+        return docker.tls.TLSConfig(verify=True)
+    client_cert = (config["cert"], config["key"]) if config.get("cert") else None
+    return docker.tls.TLSConfig(client_cert=client_cert, ca_cert=config.get("ca"), verify=config.get("verify", True))
+
+
+def endpoint(config):
+    """(base_url, tls) for a node: its own url/tls, or those of a named Docker context"""
+    if config.get("context"):
+        context = ContextAPI.get_context(config["context"])
+        if context is None:
+            raise ValueError(f"Unknown Docker context '{config['context']}'")
+        return context.Host, context.TLSConfig or None
+    return config["url"], tls_config(config.get("tls"))
+
+
+def endpoint_host(base_url):
+    """Address published ports are reached on: the daemon's host, or loopback for a local socket"""
+    parsed = urlparse(base_url)
+    if parsed.scheme in ("unix", "npipe", "") or not parsed.hostname:
+        return "127.0.0.1"
+    return parsed.hostname
+
+
+class Node:
+    """One Docker daemon workspaces can be placed on"""
+
+    def __init__(self, name, clients, states, capacity, host="127.0.0.1", url=None, local=False, draining=False):
+        self.name = name
+        self.clients = clients
+        self.states = states
+        self.capacity = capacity
+        # Where published workspace ports are reached (probes and web URLs)
+        self.host = host
+        self.url = url
+        self.local = local
+        self.draining = draining
+
+    def client(self):
+        """The node's Docker client, or None while its daemon is unreachable"""
+        return self.clients.get()
+
+    def start(self):
+        """Measure the host, rebuild its capacity ledger and follow its events"""
+        self.states.start()
+        client = self.client()
+        if not client:
+            print(f"[WARNING] Docker node '{self.name}' is not reachable ({self.clients.last_error})")
+            return False
+        self.capacity.refresh_host()
+        self.capacity.rebuild(client)
+        return True
+
+    def status(self):
+        return {
+            "name": self.name,
+            "url": self.url,
+            "host": self.host,
+            "local": self.local,
+            "draining": self.draining,
+            "healthy": self.client() is not None,
+            "capacity": self.capacity.status(),
+            "state_cache": self.states.status(),
+            "docker_client": self.clients.metrics(),
+        }
+
+
+def remote_node(config, max_pool_size=32, timeout=60, health_interval=15, **capacity_settings):
+    """Build a Node with its own client manager, state cache and capacity ledger"""
+    base_url, tls = endpoint(config)
+
+    def factory():
+        # ssh:// endpoints go through the ssh binary, so ~/.ssh/config and agents apply
+        return docker.DockerClient(
+            base_url=base_url, tls=tls, timeout=timeout, max_pool_size=max_pool_size,
+            use_ssh_client=base_url.startswith("ssh://")
+        )
+
+    clients = DockerClientManager(factory=factory, health_interval=health_interval)
+    states = ContainerStateCache(client_factory=clients.get)
+    capacity = HostCapacity(client_factory=clients.get, node=config["name"], **capacity_settings)
+    states.add_listener(capacity.on_container_event)
+    return Node(
+        config["name"], clients, states, capacity,
+        host=config.get("host") or endpoint_host(base_url),
+        url=base_url,
+        draining=bool(config.get("drain"))
+    )
+
+
+class NodeRegistry:
+    """Known Docker nodes, the first being this host; places workspaces by load"""
+
+    def __init__(self, nodes, strategy="least-memory"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown scheduling strategy '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self._nodes = {node.name: node for node in nodes}
+        self._lock = threading.Lock()
+        self.stats = {"placed": 0, "overflow": 0, "unplaced": 0}
+        self._placements = {name: 0 for name in self._nodes}
+
+    @property
+    def default(self):
+        """The node workspaces without a recorded node belong to"""
+        return next(iter(self._nodes.values()))
+
+    def get(self, name):
+        return self._nodes.get(name)
+
+    def nodes(self):
+        return list(self._nodes.values())
+
+    def owner(self, data):
+        """The node a workspace's metadata says it runs on (the default node for older records)"""
+        return self._nodes.get((data or {}).get("node")) or self.default
+
+    def drain(self, name, draining=True):
+        """Stop (or resume) placing new workspaces on a node; its running ones are untouched"""
+        node = self._nodes.get(name)
+        if node is None:
+            return False
+        node.draining = draining
+        print(f"[INFO] Docker node '{name}' {'draining' if draining else 'accepting workspaces'}")
+        return True
+
+    def schedule(self, resources, allowed=None):
+        """The healthy node with the lowest load that fits `resources`
+
+        If none has room, the least loaded healthy node is returned anyway so the launch
+        queues on its capacity ledger. None when no node is reachable.
+        """
+        candidates = []
+        for node in self._nodes.values():
+            if node.draining or (allowed is not None and node.name not in allowed):
+                continue
+            if node.client() is None:
+                continue
+            status = node.capacity.status()
+            fits = node.capacity.refusal(resources) is None
+            candidates.append((not fits, STRATEGIES[self.strategy](status), node.name, node))
+
+        with self._lock:
+            if not candidates:
+                self.stats["unplaced"] += 1
+                return None
+            overflow, _, _, node = min(candidates, key=lambda candidate: candidate[:3])
+            self.stats["placed"] += 1
+            if overflow:
+                self.stats["overflow"] += 1
+            self._placements[node.name] += 1
+        return node
+
+    def status(self):
+        nodes = [node.status() for node in self._nodes.values()]
+        with self._lock:
+            for entry in nodes:
+                entry["placements"] = self._placements.get(entry["name"], 0)
+            return {
+                "strategy": self.strategy,
+                "nodes": nodes,
+                "healthy": sum(1 for entry in nodes if entry["healthy"]),
+                **self.stats,
+            }
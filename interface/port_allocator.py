@@ -0,0 +1,242 @@
+"""
+Port Allocator
+Constant-time host port leases for workspace web interfaces, backed by a free list
+and a persisted lease table
+"""
+
+import socket
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS port_leases (
+    port INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL,
+    leased_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_port_leases_owner ON port_leases(owner);
+"""
+
+
+def port_is_free(port, host="0.0.0.0"):
+    """Check that nothing outside Docker's knowledge already holds a port"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((host, port))
+            return True
+    except OSError:
+        return False
+
+
+def published_ports(container, container_port=None):
+    """Host ports a container publishes (works for sparse and inspected containers)"""
+    ports = []
+    raw = container.attrs.get("Ports")
+    if isinstance(raw, list):
+        for binding in raw:
+            if binding.get("PublicPort") and (container_port is None or binding.get("PrivatePort") == container_port):
+                ports.append(int(binding["PublicPort"]))
+        return ports
+
+    bindings = (container.attrs.get("NetworkSettings", {}).get("Ports") or raw or {})
+    for key, entries in bindings.items():
+        if container_port is not None and key != f"{container_port}/tcp":
+            continue
+        for entry in entries or []:
+            if entry.get("HostPort"):
+                ports.append(int(entry["HostPort"]))
+    return ports
+
+
+class PortAllocator:
+    """Leases ports from [start, end] to named owners (workspace / container names)"""
+
+    def __init__(self, store, start=3000, end=3999, verify_bind=True):
+        self._store = store
+        self.start = start
+        self.end = end
+        self._verify_bind = verify_bind
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._owners = {}
+        self._external = set()
+
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+        for port, owner in store.connection().execute("SELECT port, owner FROM port_leases"):
+            if start <= port <= end:
+                self._leases[port] = owner
+                self._owners[owner] = port
+        self._free = deque(p for p in range(start, end + 1) if p not in self._leases)
+        self._free_set = set(self._free)
+
+    def allocate(self, owner):
+        """Lease a free port to owner (returns the existing lease if it already has one)"""
+        with self._lock:
+            if owner in self._owners:
+                return self._owners[owner]
+            while self._free or self._resync_locked():
+                port = self._free.popleft()
+                self._free_set.discard(port)
+                if self._verify_bind and not port_is_free(port):
+                    # Held by something we don't manage; keep it out until the next reconcile
+                    self._external.add(port)
+                    continue
+                if not self._lease_locked(port, owner, exclusive=True):
+                    continue
+                return port
+        raise RuntimeError(f"No available ports in range {self.start}-{self.end}")
+
+    def release(self, owner):
+        """Return owner's port to the free list; returns the port or None"""
+        with self._lock:
+            port = self._owners.pop(owner, None)
+            if port is None:
+                # It may hold a lease another worker process made
+                with self._store.transaction() as conn:
+                    conn.execute("DELETE FROM port_leases WHERE owner = ?", (owner,))
+                return None
+            self._leases.pop(port, None)
+            with self._store.transaction() as conn:
+                conn.execute("DELETE FROM port_leases WHERE port = ?", (port,))
+            self._free_locked(port)
+            return port
+
+    def reassign(self, port, owner):
+        """Move an existing lease to a new owner (e.g. a warm pool container claimed by a workspace)"""
+        with self._lock:
+            previous = self._leases.get(port)
+            if previous is not None:
+                self._owners.pop(previous, None)
+            elif port in self._free_set:
+                self._free.remove(port)
+                self._free_set.discard(port)
+            self._lease_locked(port, owner)
+
+    def lease_of(self, owner):
+        with self._lock:
+            return self._owners.get(owner)
+
+    def reconcile(self, client, managed_label="created_by=workspace_app", container_port=3000, grace=0):
+        """Sync leases with what Docker actually publishes
+
+        Leases whose owner container is gone are reclaimed, app containers publishing an
+        unleased port get a lease, and ports held by unrelated containers are fenced off.
+        Leases younger than `grace` seconds are kept: their create may still be pulling or
+        waiting for capacity (in this or another worker process) before its container exists.
+        """
+        all_containers = client.containers.list(all=True, sparse=True)
+        managed_key, _, managed_value = managed_label.partition("=")
+        live = {}
+        managed_names = set()
+        external = set()
+        for container in all_containers:
+            names = [n.lstrip("/") for n in container.attrs.get("Names") or []]
+            labels = container.attrs.get("Labels") or {}
+            managed = labels.get(managed_key) == managed_value
+            if managed:
+                managed_names.update(names)
+            for port in published_ports(container, container_port if managed else None):
+                if not self.start <= port <= self.end:
+                    continue
+                if managed and names:
+                    live[port] = names[0]
+                else:
+                    external.add(port)
+
+        with self._lock:
+            # Other worker processes may have leased ports since this one last looked
+            self._resync_locked()
+            cutoff = datetime.now() - timedelta(seconds=grace)
+            recent = {
+                port for port, leased_at in self._store.connection().execute("SELECT port, leased_at FROM port_leases")
+                if datetime.fromisoformat(leased_at) > cutoff
+            }
+            # Stopped containers publish nothing, so a lease survives as long as its owner exists
+            reclaimed = [
+                port for port, owner in self._leases.items()
+                if (owner not in managed_names and port not in recent) or live.get(port, owner) != owner
+            ]
+            for port in reclaimed:
+                self._owners.pop(self._leases.pop(port), None)
+            with self._store.transaction() as conn:
+                conn.executemany("DELETE FROM port_leases WHERE port = ?", [(p,) for p in reclaimed])
+            for port in reclaimed:
+                self._free_locked(port)
+
+            adopted = 0
+            for port, owner in live.items():
+                if self._leases.get(port) != owner:
+                    if port in self._free_set:
+                        self._free.remove(port)
+                        self._free_set.discard(port)
+                    self._lease_locked(port, owner)
+                    adopted += 1
+
+            # Ports fenced off on an earlier allocate get another chance unless still held
+            for port in self._external - external:
+                if port not in self._leases:
+                    self._free_locked(port)
+            self._external = external
+            for port in external:
+                if port in self._free_set:
+                    self._free.remove(port)
+                    self._free_set.discard(port)
+
+        print(f"[INFO] Port leases reconciled: {len(live)} live, {len(reclaimed)} reclaimed, "
+              f"{adopted} adopted, {len(external)} external")
+        return {"live": len(live), "reclaimed": len(reclaimed), "adopted": adopted, "external": len(external)}
+
+    def status(self):
+        with self._lock:
+            return {
+                "range": [self.start, self.end],
+                "leased": len(self._leases),
+                "free": len(self._free),
+                "external": sorted(self._external),
+            }
+
+    def _lease_locked(self, port, owner, exclusive=False):
+        """Record a lease; with exclusive=True, returns False if another process already leased the port"""
+        # An owner holds at most one port; drop any older lease it had
+        stale = self._owners.get(owner)
+        with self._store.transaction() as conn:
+            if exclusive:
+                row = conn.execute("SELECT owner FROM port_leases WHERE port = ?", (port,)).fetchone()
+                if row and row[0] != owner:
+                    self._leases[port] = row[0]
+                    self._owners[row[0]] = port
+                    return False
+            if stale is not None and stale != port:
+                conn.execute("DELETE FROM port_leases WHERE port = ?", (stale,))
+            conn.execute(
+                "INSERT OR REPLACE INTO port_leases (port, owner, leased_at) VALUES (?, ?, ?)",
+                (port, owner, datetime.now().isoformat())
+            )
+        if stale is not None and stale != port:
+            self._leases.pop(stale, None)
+        self._leases[port] = owner
+        self._owners[owner] = port
+        if stale is not None and stale != port:
+            self._free_locked(stale)
+        return True
+
+    def _resync_locked(self):
+        """Reload the lease table (other worker processes share it); returns whether any port is free"""
+        leases = {
+            port: owner for port, owner in self._store.connection().execute("SELECT port, owner FROM port_leases")
+            if self.start <= port <= self.end
+        }
+        self._leases = leases
+        self._owners = {owner: port for port, owner in leases.items()}
+        self._free = deque(p for p in range(self.start, self.end + 1) if p not in leases and p not in self._external)
+        self._free_set = set(self._free)
+        return bool(self._free)
+
+    def _free_locked(self, port):
+        if port not in self._free_set and port not in self._leases:
+            # Recently released ports go to the back so a dying container can finish unbinding
+            self._free.append(port)
+            self._free_set.add(port)
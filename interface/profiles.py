@@ -0,0 +1,320 @@
+"""
+Environment Profiles
+Case locale/timezone profiles compiled once from enviroment.csv, the language and
+timezones tables and .env.<case> files, with indexed lookups and validation
+"""
+
+import csv
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    from zoneinfo import available_timezones
+except ImportError:  # Python < 3.9
+    available_timezones = None
+
+LOCALE_PATTERN = re.compile(r"^[a-z]{2,3}_[A-Z]{2}$")
+
+
+@dataclass
+class Profile:
+    """A named set of compose variables (TZ, lang, ...) applied when a workspace is launched"""
+    id: str
+    description: str = ""
+    timezone: str = None
+    locale: str = None
+    language: str = None
+    keyboard: str = None
+    variables: dict = field(default_factory=dict)
+    source: str = ""
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "description": self.description,
+            "timezone": self.timezone,
+            "locale": self.locale,
+            "language": self.language,
+            "keyboard": self.keyboard,
+            "source": self.source,
+        }
+
+
+@lru_cache(maxsize=1)
+def iana_timezones():
+    """Zone names known to the system tz database (empty if it can't be read)"""
+    return available_timezones() if available_timezones else set()
+
+
+def slugify(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def bare_locale(value):
+    """ "ru_RU.UTF-8" to "ru_RU" """
+    return (value or "").split(".", 1)[0].split("@", 1)[0] or None
+
+
+def read_env_file(path):
+    """KEY=VALUE lines as docker compose --env-file reads them"""
+    variables = {}
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        if key.startswith("export "):
+            key = key[len("export "):].strip()
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        variables[key] = value
+    return variables
+
+
+class ProfileCatalog:
+    """Profiles and lookup tables, re-read only when one of the source files changes"""
+
+    def __init__(self, base_dir, environments="enviroment.csv", languages="language", timezones="timezones",
+                 env_pattern=".env.*", check_interval=1.0):
+        self.base_dir = Path(base_dir)
+        self._environments = self.base_dir / environments
+        self._languages = self.base_dir / languages
+        self._timezones = self.base_dir / timezones
+        self._env_pattern = env_pattern
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._tables = None
+        self.loaded_at = None
+        self.stats = {"loads": 0, "reads": 0, "errors": 0}
+
+    def profiles(self):
+        """All profiles keyed by id"""
+        return self._current()["profiles"]
+
+    def get(self, profile_id):
+        return self.profiles().get(profile_id)
+
+    def languages(self):
+        """Locale code -> language name"""
+        return self._current()["languages"]
+
+    def timezones(self):
+        return self._current()["timezones"]
+
+    def locales_for_timezone(self, timezone):
+        """Locales profiles pair with a timezone (the timezone -> locale lookup)"""
+        return list(self._current()["by_timezone"].get(timezone, ()))
+
+    def keyboard_for_locale(self, locale):
+        return self._current()["keyboards"].get(bare_locale(locale))
+
+    def problems(self):
+        """Validation problems found in the source files at the last load"""
+        return list(self._current()["problems"])
+
+    def resolve(self, profile_id=None, timezone=None, locale=None):
+        """A profile by id, optionally with its timezone/locale overridden
+
+        Raises ValueError for unknown ids and invalid timezones or locales.
+        """
+        if profile_id:
+            profile = self.get(profile_id)
+            if profile is None:
+                raise ValueError(f"Unknown profile '{profile_id}'")
+        elif timezone or locale:
+            profile = Profile(id="custom", description="Custom", source="request")
+        else:
+            return None
+        if not timezone and not locale:
+            return profile
+
+        tables = self._current()
+        if timezone and not self._valid_timezone(timezone, tables):
+            raise ValueError(f"Unknown timezone '{timezone}'")
+        if locale and bare_locale(locale) not in tables["languages"]:
+            raise ValueError(f"Unknown locale '{locale}'")
+        timezone = timezone or profile.timezone
+        locale = locale or profile.locale
+        variables = dict(profile.variables)
+        if timezone:
+            variables["TZ"] = timezone
+        if locale:
+            variables["lang"] = locale
+        return Profile(
+            id=profile.id if profile.id == "custom" else f"{profile.id}+custom",
+            description=profile.description,
+            timezone=timezone,
+            locale=bare_locale(locale),
+            language=tables["languages"].get(bare_locale(locale)),
+            keyboard=tables["keyboards"].get(bare_locale(locale), bare_locale(locale)),
+            variables=variables,
+            source=profile.source,
+        )
+
+    def status(self):
+        tables = self._current()
+        return {
+            "profiles": len(tables["profiles"]),
+            "languages": len(tables["languages"]),
+            "timezones": len(tables["timezones"]),
+            "problems": len(tables["problems"]),
+            "loaded_at": self.loaded_at,
+            **self.stats,
+        }
+
+    def _current(self):
+        with self._lock:
+            self.stats["reads"] += 1
+            now = time.monotonic()
+            if self._tables is not None and now - self._checked_at < self._check_interval:
+                return self._tables
+            self._checked_at = now
+            signature = self._signature_now()
+            if signature != self._signature or self._tables is None:
+                try:
+                    self._tables = self._load()
+                    self._signature = signature
+                except (OSError, ValueError, csv.Error) as e:
+                    # Keep the last good tables rather than failing every launch
+                    self.stats["errors"] += 1
+                    print(f"[WARNING] Could not load environment profiles: {e}")
+                    if self._tables is None:
+                        self._tables = {"profiles": {}, "languages": {}, "timezones": [], "by_timezone": {},
+                                        "keyboards": {}, "problems": [str(e)]}
+            return self._tables
+
+    def _sources(self):
+        return [self._environments, self._languages, self._timezones, *sorted(self.base_dir.glob(self._env_pattern))]
+
+    def _signature_now(self):
+        signature = []
+        for path in self._sources():
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
+
+    def _load(self):
+        problems = []
+
+        timezones = []
+        if self._timezones.exists():
+            for number, line in enumerate(self._timezones.read_text().splitlines(), 1):
+                line = line.strip()
+                # "Australia:" style lines are group headings
+                if not line or line.startswith("#") or line.endswith(":"):
+                    continue
+                if "/" not in line and line != "UTC":
+                    problems.append(f"{self._timezones.name}:{number}: '{line}' is not a timezone")
+                    continue
+                timezones.append(line)
+
+        languages = {}
+        if self._languages.exists():
+            with open(self._languages, newline="") as f:
+                for number, row in enumerate(csv.reader(f), 1):
+                    if not row or not row[0].strip():
+                        continue
+                    code = row[0].strip()
+                    if not LOCALE_PATTERN.match(code):
+                        problems.append(f"{self._languages.name}:{number}: '{code}' is not a locale code")
+                        continue
+                    languages[code] = row[1].strip() if len(row) > 1 else code
+
+        tables = {"timezones": timezones, "languages": languages}
+        profiles = {}
+        by_timezone = {}
+        keyboards = {}
+
+        def add(profile):
+            if profile.timezone and not self._valid_timezone(profile.timezone, tables):
+                problems.append(f"{profile.source}: unknown timezone '{profile.timezone}'")
+                return
+            if profile.locale and profile.locale not in languages:
+                problems.append(f"{profile.source}: unknown locale '{profile.locale}'")
+                return
+            if profile.timezone and timezones and profile.timezone not in timezones:
+                problems.append(f"{profile.source}: timezone '{profile.timezone}' is not listed in {self._timezones.name}")
+            if profile.id in profiles:
+                problems.append(f"{profile.source}: duplicate profile id '{profile.id}'")
+                return
+            profiles[profile.id] = profile
+            if profile.timezone and profile.locale:
+                by_timezone.setdefault(profile.timezone, [])
+                if profile.locale not in by_timezone[profile.timezone]:
+                    by_timezone[profile.timezone].append(profile.locale)
+            if profile.locale and profile.keyboard:
+                keyboards.setdefault(profile.locale, profile.keyboard)
+
+        if self._environments.exists():
+            with open(self._environments, newline="") as f:
+                reader = csv.DictReader(f)
+                for number, row in enumerate(reader, 2):
+                    row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+                    timezone = row.get("timezone")
+                    # The column is spelled "keyboar" in the shipped file
+                    keyboard = row.get("keyboard") or row.get("keyboar")
+                    description = row.get("description") or f"{keyboard} {timezone}"
+                    if not timezone or not keyboard:
+                        problems.append(f"{self._environments.name}:{number}: needs a timezone and keyboard")
+                        continue
+                    locale = bare_locale(keyboard)
+                    add(Profile(
+                        id=slugify(description),
+                        description=description,
+                        timezone=timezone,
+                        locale=locale,
+                        language=languages.get(locale),
+                        keyboard=keyboard,
+                        variables={"TZ": timezone, "lang": locale},
+                        source=f"{self._environments.name}:{number}",
+                    ))
+
+        for path in sorted(self.base_dir.glob(self._env_pattern)):
+            case = path.name[len(".env."):]
+            if not case or path.suffix in (".example", ".sample", ".template"):
+                continue
+            variables = read_env_file(path)
+            locale = bare_locale(variables.get("lang") or variables.get("LC_ALL") or variables.get("LANG"))
+            add(Profile(
+                id=case,
+                description=f"Case {case}",
+                timezone=variables.get("TZ"),
+                locale=locale,
+                language=languages.get(locale),
+                keyboard=variables.get("keyboard") or locale,
+                variables=variables,
+                source=path.name,
+            ))
+
+        for problem in problems:
+            print(f"[WARNING] Environment profiles: {problem}")
+        self.loaded_at = time.time()
+        self.stats["loads"] += 1
+        print(f"[INFO] Environment profiles loaded: {len(profiles)} profile(s), "
+              f"{len(languages)} locale(s), {len(timezones)} timezone(s)")
+        return {
+            "profiles": profiles,
+            "languages": languages,
+            "timezones": timezones,
+            "by_timezone": by_timezone,
+            "keyboards": keyboards,
+            "problems": problems,
+        }
+
+    @staticmethod
+    def _valid_timezone(timezone, tables):
+        if timezone in tables["timezones"]:
+            return True
+        known = iana_timezones()
+        return timezone in known if known else "/" in timezone
@@ -0,0 +1,133 @@
+"""
+Readiness Probes
+Decide when a freshly started workspace is actually usable, using per-service probe
+definitions ("x-readiness" in the compose file) with exponential backoff and a deadline
+"""
+
+import re
+import socket
+import threading
+import time
+
+import requests
+
+DEFAULT_PROBE = {
+    "type": "http",        # tcp | http | log
+    "port": 3000,          # container port; probed on its published host port
+    "path": "/",
+    "expect_status": 200,
+    "pattern": None,       # regex for type "log"
+    "timeout": 120,        # overall deadline in seconds
+    "initial_delay": 0.1,
+    "max_delay": 2.0,
+}
+
+
+def probe_from_config(config, default_timeout=None):
+    """Normalize an x-readiness block (or None) into a full probe definition"""
+    probe = dict(DEFAULT_PROBE)
+    if default_timeout is not None:
+        probe["timeout"] = default_timeout
+    if isinstance(config, str):
+        config = {"type": config}
+    probe.update(config or {})
+
+    if probe["type"] not in ("tcp", "http", "log"):
+        raise ValueError(f"Unknown readiness probe type '{probe['type']}'")
+    if probe["type"] == "log" and not probe.get("pattern"):
+        raise ValueError("Readiness probe of type 'log' needs a 'pattern'")
+    expect = probe["expect_status"]
+    probe["expect_status"] = [int(s) for s in expect] if isinstance(expect, (list, tuple)) else [int(expect)]
+    return probe
+
+
+def check_once(probe, host_port, container=None, host="127.0.0.1"):
+    """Run a single probe attempt; returns (ok, detail)"""
+    try:
+        if probe["type"] == "tcp":
+            with socket.create_connection((host, host_port), timeout=1):
+                return True, "tcp connect ok"
+
+        if probe["type"] == "http":
+            response = requests.get(f"http://{host}:{host_port}{probe['path']}", timeout=2, allow_redirects=False)
+            if response.status_code in probe["expect_status"]:
+                return True, f"http {response.status_code}"
+            return False, f"http {response.status_code}"
+
+        if container is None:
+            return False, "no container for log probe"
+        logs = container.logs(tail=500).decode(errors="replace")
+        if re.search(probe["pattern"], logs, re.MULTILINE):
+            return True, "log pattern matched"
+        return False, "log pattern not seen yet"
+    except (OSError, requests.exceptions.RequestException) as e:
+        return False, str(e)
+
+
+class ReadinessTracker:
+    """Waits for workspaces to become ready and keeps per-service timing stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def wait_until_ready(self, service_name, probe, host_port, container=None, progress=None, host="127.0.0.1"):
+        """Probe with exponential backoff until ready, the deadline passes or the container dies"""
+        started = time.monotonic()
+        deadline = started + probe["timeout"]
+        delay = probe["initial_delay"]
+        attempts = 0
+        detail = "not probed"
+        status = "running"
+
+        while True:
+            attempts += 1
+            ok, detail = check_once(probe, host_port, container, host)
+            if ok:
+                return self._record(service_name, probe, True, started, attempts, detail)
+
+            # Past the first few quick attempts, make sure we are not waiting on a dead container
+            if container is not None and attempts >= 3:
+                try:
+                    container.reload()
+                    status = container.status
+                except Exception as e:
+                    status = f"unknown ({e})"
+                if status != "running":
+                    return self._record(service_name, probe, False, started, attempts, f"container {status}")
+
+            if time.monotonic() + delay > deadline:
+                return self._record(service_name, probe, False, started, attempts, f"timeout: {detail}")
+
+            if progress and attempts % 5 == 0:
+                progress("waiting", f"Waiting for {service_name} to become ready ({detail})",
+                         elapsed=round(time.monotonic() - started, 1))
+            time.sleep(delay)
+            delay = min(delay * 2, probe["max_delay"])
+
+    def status(self):
+        with self._lock:
+            return {
+                service: {
+                    **entry,
+                    "avg_ready_seconds": round(entry["total_ready_seconds"] / entry["ready"], 3) if entry["ready"] else None,
+                }
+                for service, entry in self.stats.items()
+            }
+
+    def _record(self, service_name, probe, ready, started, attempts, detail):
+        elapsed = round(time.monotonic() - started, 3)
+        with self._lock:
+            entry = self.stats.setdefault(service_name, {
+                "launches": 0, "ready": 0, "failed": 0,
+                "total_ready_seconds": 0.0, "max_ready_seconds": 0.0, "last_ready_seconds": None,
+            })
+            entry["launches"] += 1
+            if ready:
+                entry["ready"] += 1
+                entry["total_ready_seconds"] += elapsed
+                entry["max_ready_seconds"] = max(entry["max_ready_seconds"], elapsed)
+                entry["last_ready_seconds"] = elapsed
+            else:
+                entry["failed"] += 1
+        return {"ready": ready, "seconds": elapsed, "attempts": attempts, "probe": probe["type"], "detail": detail}
@@ -0,0 +1,283 @@
+"""
+Service Catalog
+Parses the workspace compose file once into typed service specs and re-parses
+only when the file changes on disk
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import ChainMap
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import yaml
+
+BYTE_UNITS = {"": 1, "b": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+# ${VAR}, ${VAR:-default}, ${VAR-default} and $VAR, as docker compose interpolates them
+VARIABLE_PATTERN = re.compile(r"\$(?:\{(?P<braced>[A-Za-z_][A-Za-z0-9_]*)(?:(?P<sep>:?-)(?P<default>[^}]*))?\}|(?P<named>[A-Za-z_][A-Za-z0-9_]*)|(?P<escaped>\$))")
+
+
+@dataclass
+class ServiceSpec:
+    """A compose service normalized into what containers.run() needs"""
+    name: str
+    image: str
+    description: str = ""
+    icon: str = "🐳"
+    environment: dict = field(default_factory=dict)
+    volumes: dict = field(default_factory=dict)
+    ports: dict = field(default_factory=dict)
+    shm_size: str = "1gb"
+    security_opt: list = field(default_factory=list)
+    cap_add: list = field(default_factory=list)
+    restart: str = None
+    resources: dict = field(default_factory=dict)
+    extensions: dict = field(default_factory=dict)
+    config: dict = field(default_factory=dict)
+
+    def summary(self):
+        """Public description used by /api/services"""
+        return {
+            "name": self.name,
+            "image": self.image or "unknown",
+            "description": self.description,
+            "icon": self.icon
+        }
+
+
+def interpolate(value, variables):
+    """Substitute compose-style variables in a string"""
+    def replace(match):
+        if match.group("escaped"):
+            return "$"
+        name = match.group("braced") or match.group("named")
+        current = variables.get(name)
+        separator = match.group("sep")
+        if separator == ":-" and not current:
+            return match.group("default")
+        if separator == "-" and current is None:
+            return match.group("default")
+        return current or ""
+    return VARIABLE_PATTERN.sub(replace, value)
+
+
+def parse_environment(entries, variables):
+    """Compose environment (list or mapping) to a dict; variables that resolve empty are dropped"""
+    if isinstance(entries, dict):
+        entries = [f"{k}={'' if v is None else v}" for k, v in entries.items()]
+    environment = {}
+    for entry in entries or []:
+        if not isinstance(entry, str) or "=" not in entry:
+            continue
+        key, value = entry.split("=", 1)
+        value = interpolate(value, variables)
+        # An unset ${TZ} should fall back to the image default, not an empty TZ
+        if value == "" and "$" in entry.split("=", 1)[1]:
+            continue
+        environment[key] = value
+    return environment
+
+
+def parse_volumes(entries, base_dir, variables):
+    """Compose short-syntax volumes to the containers.run() volumes mapping"""
+    volumes = {}
+    for entry in entries or []:
+        if not isinstance(entry, str) or ":" not in entry:
+            continue
+        parts = interpolate(entry, variables).split(":")
+        host_path, container_path = parts[0], parts[1]
+        mode = parts[2] if len(parts) > 2 else "rw"
+        if host_path.startswith((".", "/", "~")):
+            host_path = str((Path(base_dir) / Path(host_path).expanduser()).resolve())
+        volumes[host_path] = {"bind": container_path, "mode": mode}
+    return volumes
+
+
+def parse_ports(entries, variables):
+    """Compose short-syntax ports ("[ip:]host:container[/proto]") to {"container/proto": host}"""
+    ports = {}
+    for entry in entries or []:
+        entry = interpolate(str(entry), variables)
+        if ":" not in entry:
+            continue
+        container_port, _, protocol = entry.rsplit(":", 1)[1].partition("/")
+        host_port = entry.rsplit(":", 1)[0].rsplit(":", 1)[-1]
+        ports[f"{container_port}/{protocol or 'tcp'}"] = int(host_port)
+    return ports
+
+
+def parse_bytes(value):
+    """Compose memory size ("512m", "2g", "1.5gb", 1073741824) to bytes"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*([0-9.]+)\s*([bkmgt]?)b?\s*", str(value).lower())
+    if not match:
+        raise ValueError(f"Invalid memory size '{value}'")
+    return int(float(match.group(1)) * BYTE_UNITS[match.group(2)])
+
+
+def parse_resources(config, variables):
+    """Compose CPU, memory and pids limits (service keys or deploy.resources) as containers.run() kwargs"""
+    resources = {}
+    deploy = (config.get("deploy") or {}).get("resources") or {}
+    limits = deploy.get("limits") or {}
+    reservations = deploy.get("reservations") or {}
+
+    def value(*candidates):
+        for candidate in candidates:
+            if candidate is not None and candidate != "":
+                return interpolate(str(candidate), variables)
+        return None
+
+    cpus = value(config.get("cpus"), limits.get("cpus"))
+    if cpus is not None:
+        resources["nano_cpus"] = int(float(cpus) * 1e9)
+    for key in ("cpu_shares", "cpu_quota", "cpu_period"):
+        if value(config.get(key)) is not None:
+            resources[key] = int(value(config.get(key)))
+    cpuset = value(config.get("cpuset"))
+    if cpuset is not None:
+        # "auto" asks the app to pin the workspace to its least loaded cores
+        resources["cpuset_cpus"] = cpuset
+    memory = value(config.get("mem_limit"), limits.get("memory"))
+    if memory is not None:
+        resources["mem_limit"] = parse_bytes(memory)
+    reservation = value(config.get("mem_reservation"), reservations.get("memory"))
+    if reservation is not None:
+        resources["mem_reservation"] = parse_bytes(reservation)
+    swap = value(config.get("memswap_limit"))
+    if swap is not None:
+        resources["memswap_limit"] = -1 if swap == "-1" else parse_bytes(swap)
+    pids = value(config.get("pids_limit"), limits.get("pids"))
+    if pids is not None:
+        resources["pids_limit"] = int(pids)
+    return resources
+
+
+def build_spec(name, config, base_dir, variables):
+    """Normalize one compose service"""
+    return ServiceSpec(
+        name=name,
+        image=interpolate(config.get("image") or "", variables),
+        description=config.get("description", ""),
+        icon=config.get("icon", "🐳"),
+        environment=parse_environment(config.get("environment"), variables),
+        volumes=parse_volumes(config.get("volumes"), base_dir, variables),
+        ports=parse_ports(config.get("ports"), variables),
+        shm_size=config.get("shm_size", "1gb"),
+        security_opt=list(config.get("security_opt") or []),
+        cap_add=list(config.get("cap_add") or []),
+        restart=config.get("restart"),
+        resources=parse_resources(config, variables),
+        extensions={k: v for k, v in config.items() if k.startswith("x-")},
+        config=config
+    )
+
+
+class ServiceCatalog:
+    """Cached view of the workspace compose file"""
+
+    def __init__(self, path, variables=None, check_interval=1.0):
+        self.path = Path(path)
+        self._variables = variables if variables is not None else os.environ
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._services = {}
+        self._extensions = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self.version = None
+        self.loaded_at = None
+        self._listeners = []
+        self.stats = {"loads": 0, "reads": 0, "errors": 0}
+
+    def services(self):
+        """All service specs keyed by name, in compose file order"""
+        self._refresh()
+        return self._services
+
+    def get(self, name):
+        """Spec for one service, or None"""
+        return self.services().get(name)
+
+    def extension(self, key, default=None):
+        """A top-level "x-" block of the compose file"""
+        self._refresh()
+        return self._extensions.get(key, default)
+
+    def resolve(self, name, overrides):
+        """Spec for one service re-interpolated with variables layered over the environment
+
+        This is how a profile's TZ/lang reach ${TZ}/${lang} in the compose file. None if unknown.
+        """
+        return self.derive(self.get(name), overrides)
+
+    def derive(self, spec, overrides):
+        """Re-interpolate a spec this catalog already loaded, without reading the catalog
+
+        Safe inside listeners, which run while the catalog is being reloaded.
+        """
+        if spec is None or not overrides:
+            return spec
+        return build_spec(spec.name, spec.config, self.path.parent, ChainMap(overrides, self._variables))
+
+    def add_listener(self, callback):
+        """Call callback(services) after every re-parse"""
+        self._listeners.append(callback)
+
+    def invalidate(self):
+        """Force a re-parse on the next read"""
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
+    def _refresh(self):
+        with self._lock:
+            self.stats["reads"] += 1
+            now = time.monotonic()
+            if self._signature is not None and now - self._checked_at < self._check_interval:
+                return
+            self._checked_at = now
+
+            try:
+                stat = self.path.stat()
+                signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            except FileNotFoundError:
+                signature = None
+            if signature == self._signature and self.version is not None:
+                return
+
+            try:
+                self._load(signature)
+            except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+                # Keep serving the last good catalog rather than failing every request
+                self.stats["errors"] += 1
+                print(f"[WARNING] Could not parse {self.path.name}: {e}")
+
+    def _load(self, signature):
+        if signature is None:
+            raw, compose = b"", {}
+        else:
+            raw = self.path.read_bytes()
+            compose = yaml.safe_load(raw) or {}
+
+        services = {}
+        for name, config in (compose.get("services") or {}).items():
+            services[name] = build_spec(name, config or {}, self.path.parent, self._variables)
+
+        self._services = services
+        self._extensions = {k: v for k, v in compose.items() if isinstance(k, str) and k.startswith("x-")}
+        self._signature = signature
+        self.version = hashlib.sha1(raw).hexdigest()[:16]
+        self.loaded_at = time.time()
+        self.stats["loads"] += 1
+        print(f"[INFO] Service catalog loaded: {len(services)} service(s) from {self.path.name}")
+        for callback in self._listeners:
+            try:
+                callback(services)
+            except Exception as e:
+                print(f"[WARNING] Service catalog listener failed: {e}")
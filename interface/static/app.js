@@ -21,9 +21,17 @@ function switchTab(tabName) {
 }
 
 // Load workspaces
+let workspacesEtag = null;
+
 async function loadWorkspaces() {
     try {
-        const response = await fetch('/api/workspaces');
+        // Revalidate with the last ETag; a 304 means the grid is already current
+        const headers = workspacesEtag ? { 'If-None-Match': workspacesEtag } : {};
+        const response = await fetch('/api/workspaces', { headers, cache: 'no-store' });
+        if (response.status === 304) {
+            return;
+        }
+        workspacesEtag = response.headers.get('ETag');
         const data = await response.json();
         
         const grid = document.getElementById('workspaces-grid');
@@ -76,11 +84,21 @@ function createWorkspaceCard(workspace) {
             ` : ''}
         </div>
         <div class="workspace-card-actions">
-            ${workspace.current_status === 'running' ? `
-                <a href="http://localhost:${workspace.web_port}" target="_blank" class="btn btn-primary btn-sm" style="flex: 1;">
+            ${workspace.current_status === 'running' && workspace.ready === false ? `
+                <button class="btn btn-secondary btn-sm" style="flex: 1;" onclick="checkWorkspaceReady('${workspace.name}')">
+                    <i class="bi bi-hourglass-split"></i>
+                    Starting...
+                </button>
+            ` : workspace.current_status === 'running' ? `
+                <a href="${workspace.web_url || `http://localhost:${workspace.web_port}`}" target="_blank" class="btn btn-primary btn-sm" style="flex: 1;">
                     <i class="bi bi-box-arrow-up-right"></i>
                     Connect
                 </a>
+            ` : ['paused', 'exited'].includes(workspace.current_status) ? `
+                <button class="btn btn-secondary btn-sm" style="flex: 1;" onclick="resumeWorkspace('${workspace.name}')">
+                    <i class="bi bi-play-circle"></i>
+                    Resume
+                </button>
             ` : `
                 <button class="btn btn-secondary btn-sm" style="flex: 1;" disabled>
                     <i class="bi bi-lock"></i>
@@ -157,6 +175,20 @@ function openNewWorkspaceModal(serviceName = null) {
             });
         });
     
+    // Load environment profiles
+    const profileSelect = document.getElementById('profileSelect');
+    fetch('/api/profiles')
+        .then(res => res.json())
+        .then(data => {
+            profileSelect.innerHTML = '<option value="">Service default</option>';
+            data.profiles.forEach(profile => {
+                const option = document.createElement('option');
+                option.value = profile.id;
+                option.textContent = `${profile.description} (${profile.timezone || 'default'}, ${profile.locale || 'default'})`;
+                profileSelect.appendChild(option);
+            });
+        });
+    
     workspaceName.value = '';
     modal.classList.add('active');
 }
@@ -176,6 +208,7 @@ async function createWorkspace() {
     
     const service = serviceSelect.value;
     const name = workspaceName.value || undefined;
+    const profile = document.getElementById('profileSelect').value || undefined;
 
     if (!service) {
         alert('Please select a service');
@@ -200,7 +233,8 @@ async function createWorkspace() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 service: service,
-                name: name
+                name: name,
+                profile: profile
             })
         });
 
@@ -208,11 +242,24 @@ async function createWorkspace() {
 
         if (response.ok) {
             closeNewWorkspaceModal();
-            showNotification(data.message, 'success');
-            await new Promise(resolve => setTimeout(resolve, 2000)); // Wait 2 seconds for container to stabilize
-            loadWorkspaces();
+            showNotification(data.message, 'info');
             // Switch to active tab
             document.querySelector('[onclick="switchTab(\'active\')"]').click();
+
+            if (data.job_id) {
+                const job = await followJob(data.job_id, event => {
+                    if (event.phase === 'pull' || event.phase === 'started' || event.phase === 'ready') {
+                        showNotification(event.message, 'info', 3000);
+                    }
+                });
+                const result = job.result || {};
+                if (job.status === 'succeeded') {
+                    showNotification(result.message, 'success');
+                } else {
+                    showNotification(result.error || 'Failed to create workspace', 'error');
+                }
+            }
+            loadWorkspaces();
         } else {
             showNotification(data.error || 'Failed to create workspace', 'error');
             console.error('Error response:', data);
@@ -229,6 +276,61 @@ async function createWorkspace() {
     }
 }
 
+// Follow a background job's server-sent events until it finishes
+function followJob(jobId, onProgress) {
+    return new Promise(resolve => {
+        const source = new EventSource(`/api/jobs/${encodeURIComponent(jobId)}/events`);
+        source.addEventListener('progress', e => onProgress(JSON.parse(e.data)));
+        source.addEventListener('done', e => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.onerror = async () => {
+            // Stream dropped for good (e.g. server restart); fall back to one status read
+            if (source.readyState === EventSource.CLOSED) {
+                const response = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`);
+                const data = await response.json();
+                resolve(data.job || { status: 'failed', result: { error: 'Lost track of job' } });
+            }
+        };
+    });
+}
+
+// Re-probe a workspace that was still starting when its launch finished
+async function checkWorkspaceReady(workspaceName) {
+    try {
+        const response = await fetch(`/api/workspace/${encodeURIComponent(workspaceName)}/ready`);
+        const data = await response.json();
+        if (data.ready) {
+            loadWorkspaces();
+        } else {
+            showNotification(`${workspaceName} is still starting (${data.detail || 'not ready'})`, 'info', 3000);
+        }
+    } catch (error) {
+        console.error('Error checking readiness:', error);
+    }
+}
+
+// Bring back a workspace the idle reaper paused or stopped
+async function resumeWorkspace(workspaceName) {
+    try {
+        const response = await fetch(`/api/workspace/${encodeURIComponent(workspaceName)}/resume`, {
+            method: 'POST'
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            showNotification(data.message || `${workspaceName} is running`, 'success', 3000);
+            loadWorkspaces();
+        } else {
+            showNotification(data.error || 'Failed to resume workspace', 'error');
+        }
+    } catch (error) {
+        console.error('Error resuming workspace:', error);
+        showNotification('Error resuming workspace', 'error');
+    }
+}
+
 // Delete workspace
 async function deleteWorkspace(workspaceName) {
     if (!confirm(`Delete workspace "${workspaceName}"? This action cannot be undone.`)) {
@@ -282,10 +384,12 @@ async function showWorkspaceDetails(workspaceName) {
                 <label>Created</label>
                 <input type="text" class="form-control" value="${new Date(workspace.created).toLocaleString()}" readonly>
             </div>
+            ${workspace.web_port ? `
             <div class="form-group">
                 <label>Web Interface Port</label>
                 <input type="text" class="form-control" value="${workspace.web_port}" readonly>
             </div>
+            ` : ''}
             <div class="form-group">
                 <label>Access URL</label>
                 <input type="text" class="form-control" value="${workspace.web_url}" readonly>
@@ -62,24 +62,72 @@ async function refreshWorkspaceStatus() {
     }
 }
 
-// Load container logs
-async function loadLogs() {
+// Container logs, followed over server-sent events while the pane is open
+const MAX_LOG_LINES = 1000;
+let logStream = null;
+
+function loadLogs() {
     const container = document.getElementById('logsContainer');
-    const content = document.getElementById('logsContent');
+    const filter = document.getElementById('logsFilter');
 
     if (container.style.display === 'none') {
-        try {
-            const response = await fetch(`/api/workspace/${encodeURIComponent(workspaceName)}/logs`);
-            const data = await response.json();
-            content.textContent = data.logs || 'No logs available';
-            container.style.display = 'block';
-        } catch (error) {
-            console.error('Error loading logs:', error);
-            content.textContent = 'Error loading logs';
-            container.style.display = 'block';
-        }
+        container.style.display = 'block';
+        filter.style.display = 'block';
+        startLogs();
     } else {
+        stopLogs();
         container.style.display = 'none';
+        filter.style.display = 'none';
+    }
+}
+
+function startLogs() {
+    const content = document.getElementById('logsContent');
+    const grep = document.getElementById('logsFilter').value;
+    const params = new URLSearchParams({tail: 200});
+    if (grep) {
+        params.set('grep', grep);
+        params.set('ignore_case', '1');
+    }
+
+    content.textContent = '';
+    logStream = new EventSource(`/api/workspace/${encodeURIComponent(workspaceName)}/logs/stream?${params}`);
+    logStream.addEventListener('log', (event) => appendLogLine(JSON.parse(event.data).line));
+    logStream.addEventListener('end', () => {
+        appendLogLine('--- container stopped ---');
+        stopLogs();
+    });
+    logStream.onerror = () => {
+        if (logStream && logStream.readyState === EventSource.CLOSED) {
+            appendLogLine('--- log stream unavailable ---');
+            stopLogs();
+        }
+    };
+}
+
+function stopLogs() {
+    if (logStream) {
+        logStream.close();
+        logStream = null;
+    }
+}
+
+function restartLogs() {
+    stopLogs();
+    startLogs();
+}
+
+function appendLogLine(line) {
+    const container = document.getElementById('logsContainer');
+    const content = document.getElementById('logsContent');
+    const atBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 5;
+
+    content.appendChild(document.createTextNode(line + '\n'));
+    while (content.childNodes.length > MAX_LOG_LINES) {
+        content.removeChild(content.firstChild);
+    }
+    if (atBottom) {
+        container.scrollTop = container.scrollHeight;
     }
 }
 
@@ -0,0 +1,288 @@
+"""
+Warm Pool
+Keeps pre-started workspace containers idle so a launch only has to claim and rename one;
+the idle list lives in the workspace database so any worker process can claim from it
+"""
+
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+POOL_LABEL = "warm_pool"
+POOL_KEY_LABEL = "pool_key"
+POOL_NAME_PREFIX = "pool-"
+
+# A claim that hasn't finished after this many seconds was abandoned by a worker that exited
+CLAIM_TIMEOUT = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS warm_pool (
+    name TEXT PRIMARY KEY,
+    pool_key TEXT NOT NULL,
+    web_port INTEGER,
+    added_at TEXT NOT NULL,
+    claimed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_warm_pool_key ON warm_pool(pool_key);
+"""
+
+
+def pool_key(service_name, environment=None):
+    """Build the pool key for a service and its TZ/LC_ALL profile"""
+    environment = environment or {}
+    return f"{service_name}|{environment.get('TZ', '')}|{environment.get('LC_ALL', '')}"
+
+
+def container_web_port(container, container_port="3000/tcp"):
+    """Read the host port a container's web interface is published on"""
+    bindings = (container.attrs.get("NetworkSettings", {}).get("Ports") or {}).get(container_port) or []
+    for binding in bindings:
+        if binding.get("HostPort"):
+            return int(binding["HostPort"])
+    return None
+
+
+class WarmPool:
+    """Per service/profile pool of idle containers, refilled by a background thread
+
+    Every worker configures the targets and claims from the shared idle list; only the
+    process running the background services starts the refill thread.
+    """
+
+    def __init__(self, spawn, client_factory, data_dir, store, refill_interval=30, publish_ports=True, claimed=None):
+        # spawn(service_name, environment, container_name, labels) -> (container, web_port)
+        # claimed(name) -> whether a workspace is tracked under that container name
+        self._spawn = spawn
+        self._claimed = claimed or (lambda name: False)
+        self._client_factory = client_factory
+        self._data_dir = Path(data_dir)
+        self._store = store
+        self._refill_interval = refill_interval
+        # Proxy-routed containers publish no web port
+        self._publish_ports = publish_ports
+        self._targets = {}
+        self._spawning = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {"hits": 0, "misses": 0, "spawned": 0, "spawn_failures": 0, "discarded": 0}
+
+        with store.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def configure(self, targets):
+        """Set the desired pool sizes: list of {"service", "environment", "size"}"""
+        with self._lock:
+            self._targets = {}
+            for target in targets:
+                if target.get("size", 0) <= 0:
+                    continue
+                key = pool_key(target["service"], target.get("environment"))
+                self._targets[key] = {
+                    "service": target["service"],
+                    "environment": dict(target.get("environment") or {}),
+                    "size": int(target["size"]),
+                }
+        self._wakeup.set()
+
+    def start(self):
+        """Adopt surviving pool containers and start the refill thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._adopt_existing()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refill_loop, name="warm-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the refill thread (idle containers are left running for the next start)"""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def claim(self, key, workspace_name):
+        """Take an idle container for key and rename it; returns (container, web_port) or None"""
+        while True:
+            # Marked claimed in a write transaction, so two workers never take the same one
+            with self._store.transaction() as conn:
+                entry = conn.execute(
+                    "SELECT name, web_port FROM warm_pool WHERE pool_key = ? AND claimed_at IS NULL "
+                    "ORDER BY added_at LIMIT 1", (key,)
+                ).fetchone()
+                if entry is not None:
+                    conn.execute(
+                        "UPDATE warm_pool SET claimed_at = ? WHERE name = ?", (datetime.now().isoformat(), entry[0])
+                    )
+            if entry is None:
+                with self._lock:
+                    self.stats["misses"] += 1
+                self._wakeup.set()
+                return None
+            name, web_port = entry
+
+            try:
+                client = self._client_factory()
+                container = client.containers.get(name)
+                if container.status != "running":
+                    raise RuntimeError(f"pool container is {container.status}")
+                container.rename(workspace_name)
+                self._move_data_dir(name, workspace_name)
+                container.reload()
+            except Exception as e:
+                print(f"[WARNING] Discarding pool container '{name}': {e}")
+                self._discard(name)
+                continue
+
+            with self._store.transaction() as conn:
+                conn.execute("DELETE FROM warm_pool WHERE name = ?", (name,))
+            with self._lock:
+                self.stats["hits"] += 1
+            self._wakeup.set()
+            print(f"[INFO] Claimed warm container '{name}' as '{workspace_name}'")
+            return container, web_port
+
+    def status(self):
+        """Pool counters and per-key fill levels"""
+        idle = self._idle_counts()
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+                "pools": [
+                    {
+                        "key": key,
+                        "service": target["service"],
+                        "environment": target["environment"],
+                        "size": target["size"],
+                        "idle": idle.get(key, 0),
+                        "spawning": self._spawning.get(key, 0),
+                    }
+                    for key, target in self._targets.items()
+                ],
+            }
+
+    def _idle_counts(self):
+        rows = self._store.connection().execute(
+            "SELECT pool_key, COUNT(*) FROM warm_pool WHERE claimed_at IS NULL GROUP BY pool_key"
+        ).fetchall()
+        return dict(rows)
+
+    def _adopt_existing(self):
+        """Re-register idle pool containers left over from a previous run"""
+        try:
+            client = self._client_factory()
+            containers = client.containers.list(all=True, filters={"label": f"{POOL_LABEL}=true"})
+        except Exception as e:
+            print(f"[WARNING] Could not list warm pool containers: {e}")
+            return
+
+        stale = (datetime.now() - timedelta(seconds=CLAIM_TIMEOUT)).isoformat()
+        with self._store.transaction() as conn:
+            # Claims still in progress in another worker are left to finish
+            conn.execute("DELETE FROM warm_pool WHERE claimed_at IS NOT NULL AND claimed_at < ?", (stale,))
+            claiming = {row[0] for row in conn.execute("SELECT name FROM warm_pool WHERE claimed_at IS NOT NULL")}
+            conn.execute("DELETE FROM warm_pool WHERE claimed_at IS NULL")
+
+        adopted = {}
+        for container in containers:
+            key = container.labels.get(POOL_KEY_LABEL)
+            # Claimed containers keep the pool labels under their workspace name; never touch those
+            service = (key or "").split("|", 1)[0]
+            if (not container.name.startswith(f"{POOL_NAME_PREFIX}{service}-") or container.name in claiming
+                    or self._claimed(container.name)):
+                continue
+            web_port = container_web_port(container)
+            with self._lock:
+                wanted = key in self._targets and adopted.get(key, 0) < self._targets[key]["size"]
+            # Containers started under the other routing mode are not reusable
+            if container.status == "running" and wanted and (web_port is not None) == self._publish_ports:
+                with self._store.transaction() as conn:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO warm_pool (name, pool_key, web_port, added_at) VALUES (?, ?, ?, ?)",
+                        (container.name, key, web_port, datetime.now().isoformat())
+                    )
+                adopted[key] = adopted.get(key, 0) + 1
+                continue
+            self._discard(container.name)
+        print(f"[INFO] Warm pool adopted {sum(adopted.values())} idle container(s)")
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            # Claims in other workers can't wake this thread; it notices them on the next interval
+            self._wakeup.wait(self._refill_interval)
+            self._wakeup.clear()
+            while not self._stopped.is_set() and self._refill_one():
+                pass
+
+    def _refill_one(self):
+        """Spawn a single container for the emptiest pool; returns False when all are full"""
+        idle = self._idle_counts()
+        with self._lock:
+            deficits = [
+                (target["size"] - idle.get(key, 0) - self._spawning.get(key, 0), key)
+                for key, target in self._targets.items()
+            ]
+            deficits = [d for d in deficits if d[0] > 0]
+            if not deficits:
+                return False
+            _, key = max(deficits)
+            target = self._targets[key]
+            self._spawning[key] = self._spawning.get(key, 0) + 1
+
+        name = f"{POOL_NAME_PREFIX}{target['service']}-{str(uuid.uuid4())[:8]}"
+        try:
+            container, web_port = self._spawn(
+                target["service"],
+                target["environment"],
+                name,
+                {POOL_LABEL: "true", POOL_KEY_LABEL: key},
+            )
+        except Exception as e:
+            print(f"[WARNING] Warm pool spawn failed for '{target['service']}': {e}")
+            with self._lock:
+                self._spawning[key] -= 1
+                self.stats["spawn_failures"] += 1
+            # Back off instead of hammering the daemon with a broken service
+            self._stopped.wait(self._refill_interval)
+            return not self._stopped.is_set()
+
+        with self._store.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO warm_pool (name, pool_key, web_port, added_at) VALUES (?, ?, ?, ?)",
+                (container.name, key, web_port, datetime.now().isoformat())
+            )
+        with self._lock:
+            self._spawning[key] -= 1
+            self.stats["spawned"] += 1
+        print(f"[INFO] Warm pool container ready: {container.name} (port {web_port})")
+        return True
+
+    def _move_data_dir(self, pool_name, workspace_name):
+        """Hand the pool container's /data directory over to the workspace name"""
+        pool_dir = self._data_dir / pool_name
+        workspace_dir = self._data_dir / workspace_name
+        if not pool_dir.exists() or workspace_dir.exists():
+            return
+        os.rename(pool_dir, workspace_dir)
+        # The container's bind mount still names the pool path; keep it resolvable across restarts
+        os.symlink(workspace_name, pool_dir)
+
+    def _discard(self, container_name):
+        with self._store.transaction() as conn:
+            conn.execute("DELETE FROM warm_pool WHERE name = ?", (container_name,))
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            client = self._client_factory()
+            client.containers.get(container_name).remove(force=True)
+        except Exception:
+            pass
+        pool_dir = self._data_dir / container_name
+        try:
+            if pool_dir.is_dir() and not pool_dir.is_symlink() and not any(pool_dir.iterdir()):
+                pool_dir.rmdir()
+        except OSError:
+            pass
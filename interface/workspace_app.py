@@ -3,23 +3,45 @@ Kasm-style Workspaces Manager
 A modern web interface for launching and managing Docker-based workspaces
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, send_file
 from flask_cors import CORS
 import docker
-import yaml
 import subprocess
-import json
 import uuid
 import os
+import re
 from pathlib import Path
 from datetime import datetime, timedelta
 import secrets
+import dataclasses
+import fcntl
+import hashlib
+import io
 import threading
 import time
 import requests
 
+import bookmarks
+from bulk_ops import BulkRunner
+import container_logs
+from capacity import CapacityError, HostCapacity
+from container_state import ContainerStateCache
+from docker_client import DockerClientManager
+from evidence_store import EvidenceStore
+from idle_reaper import IdleReaper, idle_policy
+from image_cache import ImageCache, repo_digest
+from jobs import JobManager, JobQueueFull
+from metrics import LatencyHistogram, WorkspaceMetrics
+from nodes import Node, NodeRegistry, parse_nodes, remote_node
+from port_allocator import PortAllocator, published_ports
+from profiles import ProfileCatalog
+from service_catalog import ServiceCatalog, parse_bytes, parse_resources
+from readiness import ReadinessTracker, check_once, probe_from_config
+from warm_pool import WarmPool, pool_key
+from workspace_routes import ROUTE_LABEL, RouteTable, container_address, route_prefix
+from workspace_store import WorkspaceStore
+
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
 CORS(app)
 
 # Configuration - Absolute paths from script location
@@ -28,91 +50,332 @@ PROJECT_DIR = BASE_DIR.parent               # OSINT_platform directory
 DATA_DIR = PROJECT_DIR / "data"
 DOCKER_COMPOSE_FILE = PROJECT_DIR / "docker-compose-workspace.yml"
 WORKSPACES_FILE = BASE_DIR / "workspaces.json"
+WORKSPACES_DB = Path(os.environ.get("WORKSPACES_DB", BASE_DIR / "workspaces.db"))
 DOCKER_SOCKET = "/var/run/docker.sock"
 
 # VNC Configuration
 VNC_BASE_PORT = 5900
 NOVNC_PORT = 6080
 
+# Docker client - one pooled connection shared by every request thread
+DOCKER_MAX_POOL_SIZE = int(os.environ.get("DOCKER_MAX_POOL_SIZE", "32"))
+DOCKER_HEALTH_INTERVAL = int(os.environ.get("DOCKER_HEALTH_INTERVAL", "15"))
+
+# Other Docker daemons workspaces can be placed on: DOCKER_NODES="name=tcp://host:2376,..." and/or
+# a DOCKER_NODES_FILE YAML list (url + tls, or a Docker context). This host is node DOCKER_NODE_NAME;
+# new workspaces go to the healthy node with the lowest load by NODE_SCHEDULER.
+DOCKER_NODES = os.environ.get("DOCKER_NODES", "")
+DOCKER_NODES_FILE = Path(os.environ.get("DOCKER_NODES_FILE", BASE_DIR / "nodes.yml"))
+DOCKER_NODE_NAME = os.environ.get("DOCKER_NODE_NAME", "local")
+NODE_SCHEDULER = os.environ.get("NODE_SCHEDULER", "least-memory")
+
+# Browsers may reuse /api/services for this many seconds before revalidating
+SERVICES_MAX_AGE = int(os.environ.get("SERVICES_MAX_AGE", "30"))
+
+# Image pulls give up after this many seconds (5 minutes)
+IMAGE_PULL_TIMEOUT = int(os.environ.get("IMAGE_PULL_TIMEOUT", "300"))
+
+# Image cache - every service image is pulled on each node at startup and re-pulled every
+# IMAGE_REFRESH_INTERVAL seconds (0: startup only), IMAGE_PULL_CONCURRENCY at a time, so launches
+# don't wait for pulls. Workspace images no container uses are removed once unused for
+# IMAGE_CACHE_MAX_UNUSED seconds, and least recently used first while images exceed IMAGE_CACHE_MAX_SIZE
+IMAGE_REFRESH_INTERVAL = int(os.environ.get("IMAGE_REFRESH_INTERVAL", "21600"))
+IMAGE_PULL_CONCURRENCY = int(os.environ.get("IMAGE_PULL_CONCURRENCY", "2"))
+IMAGE_CACHE_MAX_UNUSED = int(os.environ.get("IMAGE_CACHE_MAX_UNUSED", "604800"))
+IMAGE_CACHE_MAX_SIZE = os.environ.get("IMAGE_CACHE_MAX_SIZE", "")
+
+# Background jobs (workspace creation) - worker threads and queue limit
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "32"))
+
+# Default deadline for readiness probes ("x-readiness" in the compose file can override it)
+READINESS_TIMEOUT = int(os.environ.get("READINESS_TIMEOUT", "120"))
+
+# Workspace routing - "ports" publishes each workspace's web interface on its own host port;
+# "proxy" attaches workspaces to WORKSPACE_NETWORK and serves them at /w/<workspace>/ through
+# the SWAG reverse proxy (WORKSPACE_PUBLIC_URL), using a generated nginx routes file
+WORKSPACE_ROUTING = os.environ.get("WORKSPACE_ROUTING", "ports")
+WORKSPACE_NETWORK = os.environ.get("WORKSPACE_NETWORK", "workspaces")
+WORKSPACE_PUBLIC_URL = os.environ.get("WORKSPACE_PUBLIC_URL", "https://localhost").rstrip("/")
+WORKSPACE_ROUTES_FILE = Path(os.environ.get(
+    "WORKSPACE_ROUTES_FILE", PROJECT_DIR / "swag/config/nginx/site-confs/workspaces-routes.conf"
+))
+PROXY_CONTAINER = os.environ.get("PROXY_CONTAINER", "swag")
+
+# Host ports leased to workspace web interfaces (container port 3000, "ports" routing only)
+WORKSPACE_PORT_RANGE = tuple(int(p) for p in os.environ.get("WORKSPACE_PORT_RANGE", "3000-3999").split("-", 1))
+
+# Default resource limits for services that set none (cpus / mem_limit / mem_reservation /
+# pids_limit / cpuset in the compose file override them; an empty value means unlimited)
+WORKSPACE_CPUS = os.environ.get("WORKSPACE_CPUS", "2")
+WORKSPACE_MEM_LIMIT = os.environ.get("WORKSPACE_MEM_LIMIT", "4g")
+WORKSPACE_MEM_RESERVATION = os.environ.get("WORKSPACE_MEM_RESERVATION", "1g")
+WORKSPACE_PIDS_LIMIT = os.environ.get("WORKSPACE_PIDS_LIMIT", "2048")
+
+# Host capacity - committed CPUs may exceed the core count by CPU_OVERCOMMIT, committed memory
+# (reservations) must fit in MemTotal * MEM_OVERCOMMIT - RESERVED_MEMORY. Creates that do not
+# fit wait up to CAPACITY_WAIT seconds for room, then fail.
+CPU_OVERCOMMIT = float(os.environ.get("CPU_OVERCOMMIT", "4"))
+MEM_OVERCOMMIT = float(os.environ.get("MEM_OVERCOMMIT", "1.0"))
+RESERVED_MEMORY = os.environ.get("RESERVED_MEMORY", "1g")
+CAPACITY_WAIT = int(os.environ.get("CAPACITY_WAIT", "120"))
+
+# A create can hold a port lease or capacity reservation this long before its container exists;
+# reconciles and ledger rebuilds (in any worker) leave younger ones alone
+CREATE_GRACE = IMAGE_PULL_TIMEOUT + CAPACITY_WAIT + 60
+
+# last_accessed updates are coalesced and written at most this often (seconds)
+LAST_ACCESSED_FLUSH_INTERVAL = int(os.environ.get("LAST_ACCESSED_FLUSH_INTERVAL", "30"))
+
+# Warm pool - per-service sizes come from "x-warm-pool" in the compose file
+WARM_POOL_REFILL_INTERVAL = int(os.environ.get("WARM_POOL_REFILL_INTERVAL", "30"))
+
+# Shared link set compiled into per-workspace bookmark files for services with "x-bookmarks"
+# (comma-separated, relative to the project directory; later files only add URLs not seen yet)
+BOOKMARKS_SOURCES = [
+    PROJECT_DIR / p.strip()
+    for p in os.environ.get("BOOKMARKS_SOURCES", "bookmarks/bookmarks_1_17_24.html,chromium/bookmarks").split(",")
+    if p.strip()
+]
+
+# Idle reaper - workspaces untouched for IDLE_TIMEOUT seconds (0 disables) with no open
+# sessions are paused or stopped; "x-idle" in the compose file overrides per service.
+# Below IDLE_MEMORY_THRESHOLD of available host memory, idle ones are stopped after IDLE_PRESSURE_TIMEOUT.
+IDLE_TIMEOUT = int(os.environ.get("IDLE_TIMEOUT", "7200"))
+IDLE_ACTION = os.environ.get("IDLE_ACTION", "stop")
+IDLE_CHECK_INTERVAL = int(os.environ.get("IDLE_CHECK_INTERVAL", "60"))
+IDLE_MEMORY_THRESHOLD = float(os.environ.get("IDLE_MEMORY_THRESHOLD", "0.1"))
+IDLE_PRESSURE_TIMEOUT = int(os.environ.get("IDLE_PRESSURE_TIMEOUT", "600"))
+
+# Evidence store - files saved under data/<workspace>/ are hashed into content-addressed
+# blobs (EVIDENCE_DEDUP: auto = reflink where supported, else index only; reflink; none = index only)
+# and indexed; inotify picks up new files, with a full rescan every EVIDENCE_SCAN_INTERVAL seconds
+EVIDENCE_DEDUP = os.environ.get("EVIDENCE_DEDUP", "auto")
+EVIDENCE_SCAN_INTERVAL = int(os.environ.get("EVIDENCE_SCAN_INTERVAL", "300"))
+EVIDENCE_IGNORE = [p.strip() for p in os.environ.get("EVIDENCE_IGNORE", "bookmarks").split(",") if p.strip()]
+
+# Environment profiles: enviroment.csv, language, timezones and .env.<case> files in this directory
+PROFILES_DIR = Path(os.environ.get("PROFILES_DIR", PROJECT_DIR))
+
+# Bulk operations run at most BULK_WORKERS workspace actions at once, BULK_MAX_BATCH per request
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "8"))
+BULK_MAX_BATCH = int(os.environ.get("BULK_MAX_BATCH", "100"))
+
+# Most log lines returned by one /logs request
+LOG_PAGE_LIMIT = int(os.environ.get("LOG_PAGE_LIMIT", "1000"))
+
+# Running workspaces are sampled every METRICS_INTERVAL seconds (0 disables) and the
+# last METRICS_HISTORY samples of each are kept for /api/workspace/<name>/metrics
+METRICS_INTERVAL = int(os.environ.get("METRICS_INTERVAL", "10"))
+METRICS_HISTORY = int(os.environ.get("METRICS_HISTORY", "360"))
+
+# Session signing key - SECRET_KEY, or one generated on first start and kept in SECRET_KEY_FILE
+# so sessions survive restarts and every app server worker signs with the same key
+SECRET_KEY_FILE = Path(os.environ.get("SECRET_KEY_FILE", WORKSPACES_DB.parent / ".secret_key"))
+
+# Under gunicorn, one worker process per host runs the background services (image cache, warm
+# pool, metrics, evidence indexer, idle reaper); the others retry SERVICES_LOCK_FILE every SERVICES_LOCK_RETRY seconds
+SERVICES_LOCK_FILE = Path(os.environ.get("SERVICES_LOCK_FILE", WORKSPACES_DB.parent / ".services.lock"))
+SERVICES_LOCK_RETRY = int(os.environ.get("SERVICES_LOCK_RETRY", "10"))
+
+def running_on_gevent():
+    """Whether gunicorn's gevent worker patched this process (an open stream then holds no thread)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+# Server-sent event streams: at most STREAM_MAX_CONNECTIONS open per worker (others get 503), each
+# ended after STREAM_MAX_SECONDS; EventSource reconnects from its Last-Event-ID. Under threaded
+# workers every open stream holds a thread, so the default cap leaves most of them to the dashboard
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", "500" if running_on_gevent() else "64"))
+STREAM_MAX_SECONDS = int(os.environ.get("STREAM_MAX_SECONDS", "300"))
+
+def load_secret_key(path):
+    """SECRET_KEY from the environment, else the key kept in path (created on first use)"""
+    if os.environ.get("SECRET_KEY"):
+        return os.environ["SECRET_KEY"]
+    if path.exists() and path.read_text().strip():
+        return path.read_text().strip()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(secrets.token_hex(32))
+    try:
+        # link() refuses to replace a key another worker wrote first; that one wins
+        os.link(temporary, path)
+    except FileExistsError:
+        pass
+    finally:
+        temporary.unlink()
+    return path.read_text().strip()
+
+app.secret_key = load_secret_key(SECRET_KEY_FILE)
+
+
+docker_clients = DockerClientManager(
+    max_pool_size=DOCKER_MAX_POOL_SIZE,
+    health_interval=DOCKER_HEALTH_INTERVAL
+)
+
+container_states = ContainerStateCache(client_factory=lambda: get_docker_client())
+
+# Initialize workspaces tracking (workspaces.json is imported once, then SQLite is authoritative)
+workspace_store = WorkspaceStore(WORKSPACES_DB, flush_interval=LAST_ACCESSED_FLUSH_INTERVAL)
+workspace_store.import_json(WORKSPACES_FILE)
+
+# Port leases live next to the metadata so they survive restarts
+port_allocator = PortAllocator(workspace_store, *WORKSPACE_PORT_RANGE)
+
+def release_port_on_destroy(action, entry):
+    """Reclaim a container's port lease as soon as Docker reports it removed"""
+    if action == "destroy" and entry.get("name"):
+        port_allocator.release(entry["name"])
+
+container_states.add_listener(release_port_on_destroy)
+
+# The ledger lives in the workspace database, so every worker places against the same commitments
+capacity = HostCapacity(
+    client_factory=lambda: get_docker_client(),
+    store=workspace_store,
+    node=DOCKER_NODE_NAME,
+    reservation_grace=CREATE_GRACE,
+    cpu_overcommit=CPU_OVERCOMMIT,
+    mem_overcommit=MEM_OVERCOMMIT,
+    reserved_memory=parse_bytes(RESERVED_MEMORY)
+)
+container_states.add_listener(capacity.on_container_event)
+
+def build_node_registry():
+    """This host plus every configured remote Docker node"""
+    local = Node(DOCKER_NODE_NAME, docker_clients, container_states, capacity,
+                 url=os.environ.get("DOCKER_HOST", f"unix://{DOCKER_SOCKET}"), local=True)
+    nodes = [local]
+    configs, problems = parse_nodes(DOCKER_NODES, DOCKER_NODES_FILE)
+    for problem in problems:
+        print(f"[WARNING] Docker nodes: {problem}")
+    for config in configs:
+        if config["name"] == DOCKER_NODE_NAME:
+            # An entry for this host only tunes it
+            local.host = config.get("host", local.host)
+            local.draining = bool(config.get("drain"))
+            continue
+        try:
+            nodes.append(remote_node(
+                config,
+                max_pool_size=DOCKER_MAX_POOL_SIZE,
+                health_interval=DOCKER_HEALTH_INTERVAL,
+                store=workspace_store,
+                reservation_grace=CREATE_GRACE,
+                cpu_overcommit=CPU_OVERCOMMIT,
+                mem_overcommit=MEM_OVERCOMMIT,
+                reserved_memory=parse_bytes(RESERVED_MEMORY)
+            ))
+        except (ValueError, KeyError, docker.errors.DockerException) as e:
+            print(f"[WARNING] Docker node '{config['name']}' skipped: {e}")
+    return NodeRegistry(nodes, strategy=NODE_SCHEDULER)
+
+node_registry = build_node_registry()
 
+route_table = RouteTable(
+    client_factory=lambda: get_docker_client(),
+    network=WORKSPACE_NETWORK,
+    routes_file=WORKSPACE_ROUTES_FILE,
+    proxy_container=PROXY_CONTAINER
+)
+
+workspace_metrics = WorkspaceMetrics(
+    client_factory=lambda node: (node_registry.get(node) or node_registry.default).client(),
+    statuses=lambda: get_workspace_statuses(),
+    store=workspace_store,
+    interval=METRICS_INTERVAL,
+    history=METRICS_HISTORY
+)
+for node in node_registry.nodes():
+    node.states.add_listener(workspace_metrics.on_container_event)
+
+request_latency = LatencyHistogram()
+
+evidence_store = EvidenceStore(
+    DATA_DIR,
+    case_for=lambda workspace_name: (workspace_store.get(workspace_name) or {}).get("case"),
+    dedup=EVIDENCE_DEDUP,
+    ignore=EVIDENCE_IGNORE,
+    scan_interval=EVIDENCE_SCAN_INTERVAL
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Per-route latency for /metrics, labelled by URL rule so workspace names don't explode it"""
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_latency.observe(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+if WORKSPACE_ROUTING == "proxy":
+    # Routes follow containers as they start, stop, get renamed or go away
+    container_states.add_listener(route_table.on_container_event)
+
+def workspace_url(workspace_name, web_port, node=None):
+    """Where users reach a workspace's web interface"""
+    if web_port is None:
+        return f"{WORKSPACE_PUBLIC_URL}{route_prefix(workspace_name)}"
+    return f"http://{node.host if node and not node.local else 'localhost'}:{web_port}"
+
+def workspace_node(workspace_name):
+    """The Docker node a workspace was placed on"""
+    return node_registry.owner(workspace_store.get(workspace_name))
+
+def workspace_client(workspace_name):
+    """Docker client of the node that owns a workspace (None if that daemon is unreachable)"""
+    return workspace_node(workspace_name).client()
+
+def schedule_node(resources):
+    """Pick the node a new workspace runs on; proxy routing keeps everything on this host"""
+    allowed = None if WORKSPACE_ROUTING == "ports" else {node_registry.default.name}
+    return node_registry.schedule(resources, allowed)
 
-# Initialize workspaces tracking
 def load_workspaces():
     """Load saved workspaces"""
-    if WORKSPACES_FILE.exists():
-        with open(WORKSPACES_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_workspaces(workspaces):
-    """Save workspaces to file"""
-    with open(WORKSPACES_FILE, "w") as f:
-        json.dump(workspaces, f, indent=2)
-
-def load_docker_compose():
-    """Load docker-compose.yml"""
-    if DOCKER_COMPOSE_FILE.exists():
-        with open(DOCKER_COMPOSE_FILE, "r") as f:
-            return yaml.safe_load(f)
-    return {"services": {}}
-
-def get_available_port(start_port=VNC_BASE_PORT, check_count=1000):
-    """Find an available port with retry logic"""
-    import socket
-    port = start_port
-    for attempt in range(check_count):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                s.bind(("0.0.0.0", port))
-                s.close()
-            # Double-check the port is still available
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(0.1)
-                result = s.connect_ex(("127.0.0.1", port))
-                if result != 0:
-                    return port
-        except (OSError, socket.error):
-            pass
-        port += 1
-    raise RuntimeError(f"No available ports found starting from {start_port}")
-
-def is_port_available(port):
-    """Check if a specific port is available"""
-    import socket
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            s.bind(("0.0.0.0", port))
-            return True
-    except OSError:
-        return False
+    return workspace_store.all()
+
+# Parsed once, re-parsed only when the compose file changes on disk
+service_catalog = ServiceCatalog(DOCKER_COMPOSE_FILE)
+
+# Case locale/timezone profiles, merged into a service's ${TZ}/${lang} at launch
+profile_catalog = ProfileCatalog(PROFILES_DIR)
+
+# One build at a time per derived image tag
+derived_image_locks = {}
+derived_image_locks_lock = threading.Lock()
 
 def container_name_exists(container_name):
-    """Check if a container with this name already exists"""
-    try:
-        client = get_docker_client()
-        if not client:
-            return False
-        containers = client.containers.list(all=True, filters={"name": f"^{container_name}$"})
-        return len(containers) > 0
-    except Exception:
-        return False
+    """Check if a container with this name already exists on any node"""
+    for node in node_registry.nodes():
+        try:
+            client = node.client()
+            if client and client.containers.list(all=True, filters={"name": f"^{container_name}$"}):
+                return True
+        except Exception:
+            continue
+    return False
 
 def get_docker_client():
-    """Get Docker client"""
-    try:
-        return docker.from_env()
-    except Exception as e:
-        print(f"Error connecting to Docker: {e}")
-        return None
+    """Get the shared Docker client (None if the daemon is unreachable)"""
+    return docker_clients.get()
 
 def verify_docker_connection():
     """Verify Docker is available and accessible"""
     try:
-        client = docker.from_env()
-        # Try to ping Docker to verify connection
-        client.ping()
+        # Connecting pings the daemon to verify the connection
+        docker_clients.connect()
         print("[SUCCESS] Docker daemon is available and responding")
         return True
     except docker.errors.DockerException as e:
@@ -137,8 +400,330 @@ def verify_docker_connection():
         print(f"{'='*60}\n")
         return False
 
-def create_workspace(service_name, workspace_name=None):
-    """Create a new workspace instance using Docker SDK"""
+def no_progress(phase, message, **details):
+    """Default progress callback for synchronous callers"""
+
+def ensure_image(client, image, progress=no_progress, node=None):
+    """Make sure an image is present on a node (normally prefetched already); returns an error message or None"""
+    try:
+        image_cache.ensure(node or node_registry.default.name, client, image, progress)
+    except Exception as e:
+        error_msg = str(e)
+        if "timeout" in error_msg.lower():
+            return f"Image pull timeout for '{image}' - took too long"
+        return f"Failed to pull image '{image}': {error_msg}"
+    return None
+
+def pull_image(client, image, progress=no_progress):
+    """Stream an image pull, reporting per-layer progress and enforcing IMAGE_PULL_TIMEOUT"""
+    repository, tag = docker.utils.parse_repository_tag(image)
+    deadline = time.monotonic() + IMAGE_PULL_TIMEOUT
+    layers = {}
+    reported = 0
+    
+    for event in client.api.pull(repository, tag=tag or "latest", stream=True, decode=True):
+        if "error" in event:
+            raise RuntimeError(event["error"])
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"timeout after {IMAGE_PULL_TIMEOUT}s")
+        if event.get("id") and event.get("status"):
+            layers[event["id"]] = event["status"]
+        
+        done = sum(1 for status in layers.values() if status in ("Pull complete", "Already exists"))
+        if done != reported:
+            reported = done
+            progress("pull", f"Pulled {done}/{len(layers)} layers", layers_done=done, layers_total=len(layers))
+
+def derived_image_tag(service_name, base_image_id, packages):
+    """Tag for a service image with packages baked in, unique per base image and package set"""
+    digest = hashlib.sha1(f"{base_image_id}|{' '.join(packages)}".encode()).hexdigest()[:12]
+    return f"workspace-derived/{service_name}:{digest}"
+
+def ensure_derived_image(client, spec, env_vars, progress=no_progress, node=None):
+    """For "x-derive-image" services, build INSTALL_PACKAGES into a cached image
+
+    Returns (spec, env_vars, error); the spec points at the derived image and
+    INSTALL_PACKAGES is dropped so packages aren't installed again on every start.
+    """
+    packages = sorted(set(env_vars.get("INSTALL_PACKAGES", "").replace("|", " ").split()))
+    if not spec.extensions.get("x-derive-image") or not packages:
+        return spec, env_vars, None
+
+    base = client.images.get(spec.image)
+    tag = derived_image_tag(spec.name, base.id, packages)
+    with derived_image_locks_lock:
+        lock = derived_image_locks.setdefault(tag, threading.Lock())
+    with lock:
+        try:
+            derived = client.images.get(tag)
+            print(f"[INFO] Derived image already built: {tag}")
+        except docker.errors.ImageNotFound:
+            print(f"[INFO] Building derived image {tag} ({' '.join(packages)})")
+            progress("build", f"Building {spec.name} image with {' '.join(packages)}")
+            install = " ".join(packages)
+            dockerfile = (
+                f"FROM {base.id}\n"
+                "RUN if command -v apt-get >/dev/null; then "
+                f"apt-get update && apt-get install -y --no-install-recommends {install} && rm -rf /var/lib/apt/lists/*; "
+                f"elif command -v apk >/dev/null; then apk add --no-cache {install}; "
+                "else echo 'no supported package manager' >&2; exit 1; fi\n"
+            )
+            try:
+                derived, _ = client.images.build(
+                    fileobj=io.BytesIO(dockerfile.encode()),
+                    tag=tag,
+                    rm=True,
+                    labels={"created_by": "workspace_app", "derived_from": spec.image}
+                )
+            except (docker.errors.BuildError, docker.errors.APIError) as e:
+                return spec, env_vars, f"Failed to build derived image for '{spec.name}': {e}"
+            print(f"[SUCCESS] Derived image built: {tag}")
+    # Pinned to the base digest it was built from, and kept from pruning while in use
+    image_cache.used(node or node_registry.default.name, derived, tag, digest=repo_digest(base, spec.image))
+
+    env_vars = {k: v for k, v in env_vars.items() if k != "INSTALL_PACKAGES"}
+    return dataclasses.replace(spec, image=tag), env_vars, None
+
+def service_resources(spec):
+    """Resource limits for a service: its compose settings over the WORKSPACE_* defaults"""
+    resources = parse_resources({
+        "cpus": WORKSPACE_CPUS,
+        "mem_limit": WORKSPACE_MEM_LIMIT,
+        "mem_reservation": WORKSPACE_MEM_RESERVATION,
+        "pids_limit": WORKSPACE_PIDS_LIMIT,
+    }, {})
+    if "cpu_quota" in spec.resources:
+        # Docker rejects a CPU quota combined with nano_cpus
+        resources.pop("nano_cpus", None)
+    return {**resources, **spec.resources}
+
+def release_placement(container_name):
+    """Give back the port lease and capacity held for a container that never started"""
+    port_allocator.release(container_name)
+    # Names are unique across nodes, so whichever ledger holds it gives it back
+    for node in node_registry.nodes():
+        node.capacity.release(container_name)
+
+def build_container_kwargs(spec, container_name, env_vars, web_port, labels=None, resources=None):
+    """Build containers.run() keyword arguments for a service spec"""
+    # Volumes were resolved against the compose file's directory when the catalog was parsed
+    volumes = dict(spec.volumes)
+
+    # Ensure workspace-specific data directory
+    workspace_data_dir = DATA_DIR / container_name
+    workspace_data_dir.mkdir(parents=True, exist_ok=True)
+    volumes[str(workspace_data_dir)] = {"bind": "/data", "mode": "rw"}
+
+    bookmarks_config = spec.extensions.get("x-bookmarks")
+    if bookmarks_config:
+        bookmarks_file = workspace_bookmarks(bookmarks_config, workspace_data_dir)
+        if bookmarks_file:
+            volumes[str(bookmarks_file)] = {"bind": bookmarks_config["path"], "mode": "rw"}
+
+    ports = dict(spec.ports)
+    extra = {}
+    if web_port is None:
+        # Reached through the reverse proxy on the workspace network; the web interface
+        # (linuxserver images honour SUBFOLDER) is served under its route prefix. Nothing is
+        # published on the host, so the compose file's fixed host ports can't collide.
+        ports = {}
+        env_vars = {**env_vars, "SUBFOLDER": route_prefix(container_name)}
+        labels = {**(labels or {}), ROUTE_LABEL: container_name}
+        extra["network"] = WORKSPACE_NETWORK
+    else:
+        # Add mapping for web VNC port 3000 to available host port
+        # This allows access to the container's web interface (0: the node's daemon picks one)
+        ports["3000/tcp"] = web_port or None
+
+    return {
+        "image": spec.image,
+        "name": container_name,
+        "detach": True,
+        "environment": env_vars,
+        "volumes": volumes,
+        "ports": ports,
+        **extra,
+        "shm_size": spec.shm_size,
+        **(resources or {}),
+        "security_opt": spec.security_opt,
+        "cap_add": spec.cap_add,
+        "restart_policy": {"Name": "unless-stopped"} if spec.restart == "unless-stopped" else None,
+        "labels": {
+            "workspace": container_name,
+            "service": spec.name,
+            "created_by": "workspace_app",
+            **(labels or {})
+        }
+    }
+
+def workspace_bookmarks(config, workspace_data_dir):
+    """Compile the shared bookmarks into the workspace's data directory; returns the file or None"""
+    if not isinstance(config, dict) or "path" not in config:
+        print("[WARNING] x-bookmarks needs a 'path' to mount the compiled file at")
+        return None
+    fmt = config.get("format", "netscape")
+    target = workspace_data_dir / "bookmarks" / ("Bookmarks" if fmt == "chromium" else "bookmarks.html")
+    sources = [PROJECT_DIR / p for p in config["sources"]] if config.get("sources") else BOOKMARKS_SOURCES
+    try:
+        started = time.perf_counter()
+        stats = bookmarks.compile_bookmarks(sources, target, fmt, icons=config.get("icons", True))
+        print(f"[INFO] Compiled {stats['bookmarks']} bookmark(s) ({fmt}) in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return target
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[WARNING] Could not compile bookmarks for {workspace_data_dir.name}: {e}")
+        return None
+
+def spawn_pool_container(service_name, env_vars, container_name, labels):
+    """Start an idle container for the warm pool; returns (container, web_port)"""
+    client = get_docker_client()
+    if not client:
+        raise RuntimeError("Cannot connect to Docker daemon")
+
+    spec = service_catalog.get(service_name)
+    if not spec or not spec.image:
+        raise RuntimeError(f"Service '{service_name}' not found or has no image")
+
+    error = ensure_image(client, spec.image, node=node_registry.default.name)
+    if error:
+        raise RuntimeError(error)
+    spec, env_vars, error = ensure_derived_image(client, spec, env_vars, node=node_registry.default.name)
+    if error:
+        raise RuntimeError(error)
+
+    try:
+        # Idle pool containers never wait for room; real workspaces get it first
+        resources = capacity.reserve(container_name, service_resources(spec))
+    except CapacityError as e:
+        raise RuntimeError(f"no host capacity for a pool container ({e})")
+    try:
+        web_port = port_allocator.allocate(container_name) if WORKSPACE_ROUTING == "ports" else None
+        kwargs = build_container_kwargs(spec, container_name, env_vars, web_port, labels, resources)
+        container = client.containers.run(**kwargs)
+    except Exception:
+        release_placement(container_name)
+        raise
+    capacity.bind(container_name, container.id)
+
+    # Only hand out pool containers that already pass their readiness probe
+    probe = service_probe(spec, kwargs["labels"].get(ROUTE_LABEL))
+    host, port = probe_address(probe, kwargs, container)
+    ready = readiness.wait_until_ready(service_name, probe, port, container, host=host)
+    if not ready["ready"]:
+        container.remove(force=True)
+        release_placement(container_name)
+        raise RuntimeError(f"pool container never became ready ({ready['detail']})")
+    return container, web_port
+
+def service_probe(spec, route=None):
+    """Readiness probe for a service from its x-readiness block
+
+    A proxy-routed container (route = its ROUTE_LABEL) serves under SUBFOLDER, so the
+    HTTP path is probed under its route prefix.
+    """
+    try:
+        probe = probe_from_config(spec.extensions.get("x-readiness") if spec else None, READINESS_TIMEOUT)
+    except ValueError as e:
+        print(f"[WARNING] Invalid x-readiness for '{spec.name}', using default probe: {e}")
+        probe = probe_from_config(None, READINESS_TIMEOUT)
+    if route:
+        probe["path"] = route_prefix(route) + probe["path"].lstrip("/")
+    return probe
+
+def probe_address(probe, container_kwargs, container, host="127.0.0.1"):
+    """(host, port) to probe: the published host port, or the container's address on the workspace network"""
+    published = container_kwargs["ports"].get(f"{probe['port']}/tcp", container_kwargs["ports"].get("3000/tcp"))
+    if published and ROUTE_LABEL not in container_kwargs["labels"]:
+        return host, published
+    container.reload()
+    return container_address(container, WORKSPACE_NETWORK) or "127.0.0.1", probe["port"]
+
+def warm_pool_targets(services):
+    """Read per-service x-warm-pool settings from the service catalog"""
+    targets = []
+    for service_name, spec in services.items():
+        pool_config = spec.extensions.get("x-warm-pool")
+        if not pool_config:
+            continue
+        if isinstance(pool_config, int):
+            pool_config = {"size": pool_config}
+
+        base_env = spec.environment
+        # Each profile overrides TZ/LC_ALL; without profiles the service defaults are pooled
+        for profile in pool_config.get("profiles") or [{}]:
+            if isinstance(profile, str):
+                # A profile id pools exactly what a create with that profile would launch
+                resolved = profile_catalog.get(profile)
+                if resolved is None:
+                    print(f"[WARNING] x-warm-pool for '{service_name}' names unknown profile '{profile}'")
+                    continue
+                environment = service_catalog.derive(spec, resolved.variables).environment
+            else:
+                environment = {**base_env, **{k: str(v) for k, v in profile.items()}}
+            targets.append({
+                "service": service_name,
+                "environment": environment,
+                "size": int(pool_config.get("size", 1))
+            })
+    return targets
+
+warm_pool = WarmPool(
+    spawn=spawn_pool_container,
+    client_factory=get_docker_client,
+    data_dir=DATA_DIR,
+    store=workspace_store,
+    refill_interval=WARM_POOL_REFILL_INTERVAL,
+    publish_ports=WORKSPACE_ROUTING == "ports",
+    claimed=workspace_store.exists
+)
+
+def idle_policies(services):
+    """Read per-service x-idle settings from the service catalog"""
+    policies = {}
+    for service_name, spec in services.items():
+        if "x-idle" not in spec.extensions:
+            continue
+        try:
+            policies[service_name] = idle_policy(spec.extensions["x-idle"], IDLE_TIMEOUT, IDLE_ACTION)
+        except (TypeError, ValueError) as e:
+            print(f"[WARNING] Invalid x-idle for '{service_name}', using defaults: {e}")
+    return policies
+
+idle_reaper = IdleReaper(
+    client_factory=workspace_client,
+    store=workspace_store,
+    statuses=lambda: get_workspace_statuses(),
+    default_after=IDLE_TIMEOUT,
+    default_action=IDLE_ACTION,
+    interval=IDLE_CHECK_INTERVAL,
+    memory_threshold=IDLE_MEMORY_THRESHOLD,
+    pressure_after=IDLE_PRESSURE_TIMEOUT,
+    admit=lambda workspace_name: workspace_node(workspace_name).capacity.admit(workspace_name),
+    local=lambda workspace_name: workspace_node(workspace_name).local
+)
+
+readiness = ReadinessTracker()
+
+image_cache = ImageCache(
+    workspace_store,
+    clients=lambda: {node.name: node.client() for node in node_registry.nodes() if not node.draining},
+    references=lambda: [spec.image for spec in service_catalog.services().values() if spec.image],
+    pull=lambda client, image, progress: pull_image(client, image, progress or no_progress),
+    refresh_interval=IMAGE_REFRESH_INTERVAL,
+    max_parallel=IMAGE_PULL_CONCURRENCY,
+    max_unused=IMAGE_CACHE_MAX_UNUSED,
+    max_size=parse_bytes(IMAGE_CACHE_MAX_SIZE) if IMAGE_CACHE_MAX_SIZE else 0
+)
+
+bulk = BulkRunner(max_workers=BULK_WORKERS, max_batch=BULK_MAX_BATCH)
+
+# Jobs are recorded in the store so any app server worker can report and stream them
+jobs = JobManager(max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, store=workspace_store)
+
+def create_workspace(service_name, workspace_name=None, case=None, profile=None, store=True, progress=no_progress):
+    """Create a new workspace instance using Docker SDK (profile: a resolved environment profile)
+
+    With store=False the metadata is returned but not saved, for callers that batch the writes.
+    """
     if workspace_name is None:
         workspace_name = f"{service_name}-{str(uuid.uuid4())[:8]}"
     
@@ -146,10 +731,8 @@ def create_workspace(service_name, workspace_name=None):
     if not all(c.isalnum() or c in '-_' for c in workspace_name):
         return {"success": False, "error": "Workspace name can only contain alphanumeric characters, dashes, and underscores"}
     
-    workspaces = load_workspaces()
-    
     # Check if workspace already exists in tracking
-    if workspace_name in workspaces:
+    if workspace_store.exists(workspace_name):
         return {"success": False, "error": f"Workspace '{workspace_name}' already exists"}
     
     # Check if container with this name already exists in Docker
@@ -157,152 +740,73 @@ def create_workspace(service_name, workspace_name=None):
         return {"success": False, "error": f"Container named '{workspace_name}' already exists. Please remove it first or use a different name"}
     
     try:
-        # Get Docker client
-        client = get_docker_client()
-        if not client:
-            return {"success": False, "error": "Cannot connect to Docker daemon"}
-        
-        # Load compose config to get service details
-        compose = load_docker_compose()
-        if service_name not in compose.get("services", {}):
+        # Look up the parsed service spec, with the profile's TZ/lang substituted in
+        spec = service_catalog.resolve(service_name, profile.variables if profile else None)
+        if spec is None:
             return {"success": False, "error": f"Service '{service_name}' not found in docker-compose.yml"}
         
-        service_config = compose["services"][service_name]
-        
-        # Get available ports for web VNC interface
-        # We need to find a port for the container's port 3000
-        web_port = get_available_port(3000)  # Start from 3000 and find next available
-        if not is_port_available(web_port):
-            return {"success": False, "error": f"Port {web_port} is not available"}
-        
-
-        print(f"[INFO] Creating workspace '{workspace_name}' for service '{service_name}'")
-        print(f"[INFO] Allocated port - Web VNC: {web_port}")
-        
         # Prepare container configuration
-        image = service_config.get("image")
+        image = spec.image
         if not image:
             return {"success": False, "error": f"Service '{service_name}' has no image defined"}
         
-        # Pull image if not present
-        print(f"[INFO] Ensuring image '{image}' is available...")
-        try:
-            client.images.get(image)
-            print(f"[INFO] Image already present: {image}")
-        except docker.errors.ImageNotFound:
-            print(f"[INFO] Pulling image: {image}")
-            try:
-                # Set a timeout for pulling images (300 seconds = 5 minutes)
-                client.images.pull(image, timeout=300)
-                print(f"[SUCCESS] Image pulled: {image}")
-            except Exception as e:
-                error_msg = str(e)
-                if "timeout" in error_msg.lower():
-                    return {"success": False, "error": f"Image pull timeout for '{image}' - took too long"}
-                return {"success": False, "error": f"Failed to pull image '{image}': {error_msg}"}
-        
         # Prepare environment variables
-        env_vars = {}
-        if "environment" in service_config:
-            env_list = service_config["environment"]
-            for env_var in env_list:
-                if isinstance(env_var, str):
-                    if "=" in env_var:
-                        key, value = env_var.split("=", 1)
-                        env_vars[key] = value
-        
-        # Prepare volumes
-        volumes = {}
-        if "volumes" in service_config:
-            for volume in service_config["volumes"]:
-                if isinstance(volume, str) and ":" in volume:
-                    host_path, container_path = volume.split(":", 1)
-                    # Handle relative paths - resolve relative to project directory
-                    host_path = str(PROJECT_DIR) + host_path
-                    #print(f"[DEBUG] Volume: '{host_path}' -> resolved: '{resolved_host_path}' -> container: '{container_path}'")
-                    
-                    volumes[str(host_path)] = {"bind": container_path, "mode": "rw"}
+        env_vars = dict(spec.environment)
         
-        # Ensure workspace-specific data directory
-        workspace_data_dir = DATA_DIR / workspace_name
-        workspace_data_dir.mkdir(parents=True, exist_ok=True)
-        volumes[str(workspace_data_dir)] = {"bind": "/data", "mode": "rw"}
-
-
-        # Prepare port mappings from compose file
-        ports = {}
-        if "ports" in service_config:
-            for port_mapping in service_config["ports"]:
-                if isinstance(port_mapping, str) and ":" in port_mapping:
-                    host_port, container_port = port_mapping.split(":", 1)
-                    ports[f"{container_port}/tcp"] = int(host_port)
-        
-        # Add mapping for web VNC port 3000 to available host port
-        # This allows access to the container's web interface
-        ports["3000/tcp"] = web_port
-        
-        # Create the container with explicit name
-        print(f"[INFO] Creating Docker container '{workspace_name}'...")
-        
-        # Set a timeout for container creation (120 seconds = 2 minutes)
-        try:
-            container = client.containers.run(
-                image,
-                name=workspace_name,
-                detach=True,
-                environment=env_vars,
-                volumes=volumes,
-                ports=ports,
-                shm_size=service_config.get("shm_size", "1gb"),
-                security_opt=service_config.get("security_opt", []),
-                cap_add=service_config.get("cap_add", []),
-                restart_policy={"Name": "unless-stopped"} if service_config.get("restart") == "unless-stopped" else None,
-                labels={
-                    "workspace": workspace_name,
-                    "service": service_name,
-                    "created_by": "workspace_app"
-                }
+        # Fast path: claim an already running container from the warm pool (kept on this host)
+        claimed = None
+        if node_registry.default.client():
+            claimed = warm_pool.claim(pool_key(service_name, env_vars), workspace_name)
+        if claimed:
+            node = node_registry.default
+            container, web_port = claimed
+            if web_port:
+                port_allocator.reassign(web_port, workspace_name)
+            progress("started", f"Claimed a warm {service_name} container", web_port=web_port)
+            # Pool containers only join the pool once their readiness probe passes
+            ready = {"ready": True, "seconds": 0.0, "detail": "warm pool"}
+            progress("ready", f"{service_name} ready (warm pool)", web_port=web_port, seconds=0.0)
+            print(f"[SUCCESS] Workspace '{workspace_name}' served from warm pool (port {web_port})")
+        else:
+            node = schedule_node(service_resources(spec))
+            if node is None:
+                return {"success": False, "error": "Cannot connect to Docker daemon"}
+            container, web_port, ready, error = start_workspace_container(
+                node, spec, workspace_name, env_vars, progress
             )
-        except requests.exceptions.Timeout:
-            return {"success": False, "error": f"Container creation timeout - operation took too long. Please check Docker logs and try again."}
-        except docker.errors.ContainerError as e:
-            return {"success": False, "error": f"Container error during creation: {str(e)}"}
-        
-        print(f"[SUCCESS] Container created: {container.id[:12]} ({container.name})")
-        
-        # Wait a moment for container to stabilize
-        time.sleep(2)
-        
-        # Verify container is running
-        container.reload()
-        if container.status != "running":
-            # Try to get logs for debugging
-            logs = container.logs().decode()
-            print(f"[WARNING] Container status: {container.status}")
-            print(f"[WARNING] Container logs:\n{logs}")
+            if error:
+                return {"success": False, "error": error}
         
         # Save workspace metadata
         workspace_data = {
             "id": str(uuid.uuid4()),
             "name": workspace_name,
             "service": service_name,
+            "case": case,
+            "profile": profile.summary() if profile else None,
+            "node": node.name,
             "status": container.status,
             "container_id": container.id[:12],
             "container_name": container.name,
             "image": image,
+            **image_cache.pin(node.name, container.attrs.get("Image")),
             "created": datetime.now().isoformat(),
             "web_port": web_port,
-            "web_url": f"http://localhost:{web_port}",
-            "last_accessed": datetime.now().isoformat()
+            "web_url": workspace_url(workspace_name, web_port, node),
+            "last_accessed": datetime.now().isoformat(),
+            "warm_start": bool(claimed),
+            "ready": ready["ready"],
+            "ready_seconds": ready["seconds"]
         }
         
-        workspaces[workspace_name] = workspace_data
-        save_workspaces(workspaces)
+        if store and not workspace_store.insert(workspace_name, workspace_data):
+            print(f"[WARNING] Workspace '{workspace_name}' was tracked concurrently, overwriting metadata")
+            workspace_store.put(workspace_name, workspace_data)
         
         return {
             "success": True,
             "workspace": workspace_data,
-            "message": f"Workspace '{workspace_name}' created successfully. Access at: http://localhost:{web_port}"
+            "message": f"Workspace '{workspace_name}' created successfully. Access at: {workspace_data['web_url']}"
         }
     
     except docker.errors.ContainerError as e:
@@ -315,27 +819,116 @@ def create_workspace(service_name, workspace_name=None):
         print(f"[ERROR] Docker API error: {str(e)}")
         return {"success": False, "error": f"Docker API error: {str(e)}"}
     except Exception as e:
+        docker_clients.report_error(e)
         print(f"[ERROR] Unexpected error: {str(e)}")
         return {"success": False, "error": f"Unexpected error: {str(e)}"}
 
+def start_workspace_container(node, spec, workspace_name, env_vars, progress=no_progress):
+    """Cold path: pull the image if needed and start a fresh container on a node; returns (container, web_port, ready, error)"""
+    service_name = spec.name
+    image = spec.image
+    client = node.client()
+    if not client:
+        return None, None, None, f"Cannot connect to Docker node '{node.name}'"
+
+    # Lease a host port for the container's web VNC port 3000 (the proxy needs none).
+    # The lease table only knows this host's ports; other nodes' daemons pick a free one.
+    web_port = None
+    if WORKSPACE_ROUTING == "ports" and node.local:
+        try:
+            web_port = port_allocator.allocate(workspace_name)
+        except RuntimeError as e:
+            return None, None, None, str(e)
+    elif WORKSPACE_ROUTING == "ports":
+        web_port = 0
+
+    print(f"[INFO] Creating workspace '{workspace_name}' for service '{service_name}' on node '{node.name}'")
+    if web_port != 0:
+        print(f"[INFO] Web VNC: {workspace_url(workspace_name, web_port, node)}")
+
+    # Images are normally prefetched; a miss pulls here
+    error = ensure_image(client, image, progress, node=node.name)
+    if not error:
+        spec, env_vars, error = ensure_derived_image(client, spec, env_vars, progress, node=node.name)
+    if error:
+        port_allocator.release(workspace_name)
+        return None, None, None, error
+
+    # Place the workspace within host capacity, queueing for a while if the host is full
+    try:
+        resources = node.capacity.reserve(workspace_name, service_resources(spec), wait=CAPACITY_WAIT, progress=progress)
+    except CapacityError as e:
+        port_allocator.release(workspace_name)
+        print(f"[WARNING] Refusing workspace '{workspace_name}': host at capacity ({e})")
+        return None, None, None, f"Host is at capacity, try again later ({e})"
+
+    # Create the container with explicit name
+    print(f"[INFO] Creating Docker container '{workspace_name}'...")
+    progress("create", f"Creating container {workspace_name}")
+
+    try:
+        kwargs = build_container_kwargs(spec, workspace_name, env_vars, web_port, resources=resources)
+        container = client.containers.run(**kwargs)
+    except requests.exceptions.Timeout:
+        release_placement(workspace_name)
+        return None, None, None, "Container creation timeout - operation took too long. Please check Docker logs and try again."
+    except docker.errors.ContainerError as e:
+        release_placement(workspace_name)
+        return None, None, None, f"Container error during creation: {str(e)}"
+    except Exception:
+        release_placement(workspace_name)
+        raise
+    node.capacity.bind(workspace_name, container.id)
+
+    if web_port == 0:
+        container.reload()
+        web_port = next(iter(published_ports(container, 3000)), None)
+        kwargs["ports"]["3000/tcp"] = web_port
+        print(f"[INFO] Web VNC: {workspace_url(workspace_name, web_port, node)}")
+
+    print(f"[SUCCESS] Container created: {container.id[:12]} ({container.name})")
+
+    progress("started", f"Container {workspace_name} started", web_port=web_port)
+
+    # Probe until the service is actually usable instead of sleeping a fixed time
+    probe = service_probe(spec, kwargs["labels"].get(ROUTE_LABEL))
+    host, port = probe_address(probe, kwargs, container, node.host)
+    ready = readiness.wait_until_ready(service_name, probe, port, container, progress, host=host)
+
+    # Verify container is running
+    container.reload()
+    if container.status != "running":
+        # Try to get logs for debugging
+        logs = container.logs().decode()
+        print(f"[WARNING] Container status: {container.status}")
+        print(f"[WARNING] Container logs:\n{logs}")
+    elif ready["ready"]:
+        print(f"[SUCCESS] Workspace '{workspace_name}' ready after {ready['seconds']}s ({ready['detail']})")
+        progress("ready", f"{service_name} ready after {ready['seconds']}s", web_port=web_port, seconds=ready["seconds"])
+    else:
+        print(f"[WARNING] Workspace '{workspace_name}' not ready: {ready['detail']}")
+        progress("not_ready", f"{service_name} not ready: {ready['detail']}", web_port=web_port)
+
+    return container, web_port, ready, None
+
 def delete_workspace(workspace_name):
     """Delete a workspace safely using Docker SDK"""
+    node = None
     try:
         print(f"[INFO] Deleting workspace '{workspace_name}'")
         
-        client = get_docker_client()
+        node = workspace_node(workspace_name)
+        client = node.client()
         if not client:
-            return {"success": False, "error": "Cannot connect to Docker daemon"}
+            return {"success": False, "error": f"Cannot connect to Docker node '{node.name}'"}
         
         # Find container by name
         try:
             container = client.containers.get(workspace_name)
         except docker.errors.NotFound:
             # Container not found, just remove from tracking
-            workspaces = load_workspaces()
-            if workspace_name in workspaces:
-                del workspaces[workspace_name]
-                save_workspaces(workspaces)
+            release_placement(workspace_name)
+            if workspace_store.delete(workspace_name):
                 print(f"[INFO] Container '{workspace_name}' not found, removed from tracking")
             return {"success": True, "message": f"Workspace '{workspace_name}' cleaned up"}
         
@@ -351,10 +944,8 @@ def delete_workspace(workspace_name):
         print(f"[SUCCESS] Container removed")
         
         # Remove from tracking
-        workspaces = load_workspaces()
-        if workspace_name in workspaces:
-            del workspaces[workspace_name]
-            save_workspaces(workspaces)
+        release_placement(workspace_name)
+        if workspace_store.delete(workspace_name):
             print(f"[SUCCESS] Workspace tracking removed for '{workspace_name}'")
         
         return {"success": True, "message": f"Workspace '{workspace_name}' deleted"}
@@ -363,15 +954,163 @@ def delete_workspace(workspace_name):
         print(f"[ERROR] Docker API error: {str(e)}")
         return {"success": False, "error": f"Docker API error: {str(e)}"}
     except Exception as e:
+        if node is not None:
+            node.clients.report_error(e)
         print(f"[ERROR] Error deleting workspace: {str(e)}")
         return {"success": False, "error": str(e)}
 
+def bulk_create_plan(data):
+    """Expand a bulk create request into [{"service", "name", "profile"}]; returns (plan, errors)"""
+    case = str(data.get("case") or "").strip() or None
+    items = data.get("items")
+    if data.get("template"):
+        templates = service_catalog.extension("x-case-templates", {}) or {}
+        items = templates.get(data["template"])
+        if items is None:
+            return [], [f"Unknown case template '{data['template']}'"]
+    if not items:
+        return [], ["Give 'items' or a 'template'"]
+
+    prefix = "".join(c if c.isalnum() or c in "-_" else "-" for c in case) if case else None
+    plan, errors, taken = [], [], set()
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"service": item}
+        service_name = item.get("service")
+        if service_catalog.get(service_name) is None:
+            errors.append(f"items[{index}]: unknown service '{service_name}'")
+            continue
+        try:
+            profile = profile_catalog.resolve(item.get("profile", data.get("profile")), item.get("timezone"), item.get("locale"))
+            count = int(item.get("count", 1))
+        except ValueError as e:
+            errors.append(f"items[{index}]: {e}")
+            continue
+        for _ in range(count):
+            name = item.get("name") if count == 1 else None
+            if name is None:
+                # <case>-<service>-<n>, skipping numbers already in use
+                base = f"{prefix}-{service_name}" if prefix else service_name
+                number = 1
+                while f"{base}-{number}" in taken or workspace_store.exists(f"{base}-{number}"):
+                    number += 1
+                name = f"{base}-{number}"
+            if not all(c.isalnum() or c in "-_" for c in name):
+                errors.append(f"items[{index}]: invalid workspace name '{name}'")
+            elif name in taken or workspace_store.exists(name):
+                errors.append(f"items[{index}]: workspace '{name}' already exists")
+            taken.add(name)
+            plan.append({"service": service_name, "name": name, "profile": profile})
+    return plan, errors
+
+def bulk_create(plan, case=None, progress=no_progress):
+    """Create many workspaces in parallel and save their metadata in one transaction"""
+    def create_one(item):
+        result = create_workspace(item["service"], item["name"], case=case, profile=item["profile"], store=False)
+        return {key: value for key, value in result.items() if key != "message"}
+
+    def commit(results):
+        workspace_store.put_many({result["target"]: result["workspace"] for result in results})
+
+    return bulk.run("create", plan, create_one, commit, target=lambda item: item["name"], progress=progress)
+
+def select_workspaces(selector):
+    """Workspace names matching {"names"} or {"case", "service", "label"}, or everything with {"all": true}"""
+    if selector.get("names"):
+        return list(dict.fromkeys(selector["names"]))
+    case, service, label = selector.get("case"), selector.get("service"), selector.get("label")
+    if not (case or service or label or selector.get("all") is True):
+        raise ValueError("Select workspaces with 'names', 'case', 'service', 'label' or 'all': true")
+
+    workspaces = workspace_store.find(service=service) if service else workspace_store.all()
+    names = [name for name, data in workspaces.items() if not case or data.get("case") == case]
+    if label:
+        owners = {}
+        for name in names:
+            node = node_registry.owner(workspaces.get(name))
+            owners[node.name] = node
+        labelled = set()
+        for node in owners.values():
+            client = node.client()
+            if not client:
+                raise RuntimeError(f"Cannot connect to Docker node '{node.name}'")
+            containers = client.containers.list(
+                all=True, sparse=True, filters={"label": ["created_by=workspace_app", label]}
+            )
+            labelled.update(n.lstrip("/") for container in containers for n in container.attrs.get("Names") or [])
+        names = [name for name in names if name in labelled]
+    return names
+
+def bulk_container_action(action, names, timeout=10, force=False, progress=no_progress):
+    """Delete, stop or restart many workspaces in parallel with one metadata commit"""
+    workspaces = workspace_store.all()
+
+    def apply(name):
+        node = node_registry.owner(workspaces.get(name))
+        client = node.client()
+        if not client:
+            return {"success": False, "error": f"Cannot connect to Docker node '{node.name}'"}
+        try:
+            container = client.containers.get(name)
+        except docker.errors.NotFound:
+            if action == "delete":
+                release_placement(name)
+                return {"success": True, "removed": False}
+            return {"success": False, "error": "Container not found"}
+        try:
+            if action == "delete":
+                if force:
+                    container.remove(force=True)
+                else:
+                    if container.status == "paused":
+                        container.unpause()
+                    if container.status in ("running", "paused"):
+                        container.stop(timeout=timeout)
+                    container.remove()
+                release_placement(name)
+                return {"success": True, "removed": True}
+            if action == "stop":
+                if container.status not in ("running", "paused"):
+                    return {"success": True, "stopped": False, "status": container.status}
+                if container.status == "paused":
+                    container.unpause()
+                container.stop(timeout=timeout)
+                return {"success": True, "stopped": True}
+            if container.status != "running" and not node.capacity.admit(name):
+                return {"success": False, "error": "Not enough host capacity to restart"}
+            container.restart(timeout=timeout)
+            return {"success": True, "restarted": True}
+        except docker.errors.APIError as e:
+            return {"success": False, "error": f"Docker API error: {e}"}
+
+    def commit(results):
+        now = datetime.now().isoformat()
+        if action == "delete":
+            workspace_store.delete_many(result["target"] for result in results)
+        elif action == "stop":
+            workspace_store.update_many({
+                result["target"]: {"suspended": "stopped", "suspended_at": now, "suspend_reason": "bulk stop"}
+                for result in results if result.get("stopped")
+            })
+        else:
+            # A restarted desktop needs its readiness probe again
+            workspace_store.update_many({
+                result["target"]: {"suspended": None, "resumed_at": now, "ready": False}
+                for result in results
+            })
+
+    return bulk.run(action, names, apply, commit, progress=progress)
+
 def get_workspace_status(workspace_name):
-    """Get status of a workspace using Docker SDK"""
+    """Get status of a workspace from its node, using the events-fed cache when it is in sync"""
+    node = workspace_node(workspace_name)
+    if node.states.synced:
+        return node.states.get(workspace_name) or {"status": "stopped", "running": False}
+    
     try:
-        client = get_docker_client()
+        client = node.client()
         if not client:
-            return {"status": "unknown", "error": "Docker not available"}
+            return {"status": "unknown", "error": f"Docker node '{node.name}' not available"}
         
         # Find container by exact name
         try:
@@ -386,8 +1125,75 @@ def get_workspace_status(workspace_name):
             return {"status": "stopped", "running": False}
     
     except Exception as e:
+        node.clients.report_error(e)
         return {"status": "unknown", "error": str(e)}
 
+def get_workspace_statuses():
+    """Get the status of every app-managed container on every node, one list call per node at most
+
+    Returns a dict keyed by container name, or None if no Docker node is available.
+    """
+    statuses = {}
+    unreachable = set()
+    for node in node_registry.nodes():
+        node_statuses = node_workspace_statuses(node)
+        if node_statuses is None:
+            unreachable.add(node.name)
+            continue
+        for name, entry in node_statuses.items():
+            statuses[name] = {**entry, "node": node.name}
+    
+    if len(unreachable) == len(node_registry.nodes()):
+        return None
+    if unreachable:
+        # Workspaces on a node that can't be reached are unknown, not stopped
+        for name, data in workspace_store.all().items():
+            node = node_registry.owner(data)
+            if node.name in unreachable and name not in statuses:
+                statuses[name] = {"status": "unknown", "running": False, "name": name, "node": node.name}
+    return statuses
+
+def node_workspace_statuses(node):
+    """App-managed containers on one node keyed by name, or None if its daemon is unavailable"""
+    if node.states.synced:
+        return node.states.snapshot()
+    
+    try:
+        client = node.client()
+        if not client:
+            return None
+        
+        # sparse=True keeps this to one API call instead of an inspect per container
+        containers = client.containers.list(
+            all=True,
+            sparse=True,
+            filters={"label": "created_by=workspace_app"}
+        )
+    except Exception as e:
+        node.clients.report_error(e)
+        print(f"[WARNING] Could not list workspace containers on node '{node.name}': {e}")
+        return None
+    
+    statuses = {}
+    for container in containers:
+        state = container.attrs.get("State")
+        status = state.get("Status") if isinstance(state, dict) else state
+        for name in container.attrs.get("Names") or []:
+            statuses[name.lstrip("/")] = {
+                "status": status,
+                "running": status == "running",
+                "id": container.id[:12],
+                "name": name.lstrip("/")
+            }
+    return statuses
+
+def conditional_json(payload, cache_control="no-cache"):
+    """JSON response with an ETag so unchanged payloads come back as 304"""
+    response = jsonify(payload)
+    response.headers["Cache-Control"] = cache_control
+    response.add_etag()
+    return response.make_conditional(request)
+
 # Routes
 @app.route("/")
 def index():
@@ -400,48 +1206,53 @@ def index():
 @app.route("/api/services")
 def api_services():
     """Get available services"""
-    compose = load_docker_compose()
-    services = []
-    
-    for service_name, config in compose.get("services", {}).items():
-        services.append({
-            "name": service_name,
-            "image": config.get("image", "unknown"),
-            "description": config.get("description", ""),
-            "icon": config.get("icon", "🐳")
-        })
+    services = [spec.summary() for spec in service_catalog.services().values()]
     
-    return jsonify({"services": services})
+    # The catalog rarely changes; let the browser reuse it briefly and revalidate by ETag
+    return conditional_json({"services": services}, cache_control=f"max-age={SERVICES_MAX_AGE}")
+
+@app.route("/api/profiles")
+def api_profiles():
+    """Environment profiles plus the locale and timezone tables they are checked against"""
+    return conditional_json({
+        "profiles": [profile.summary() for profile in profile_catalog.profiles().values()],
+        "languages": profile_catalog.languages(),
+        "timezones": profile_catalog.timezones(),
+        "problems": profile_catalog.problems()
+    })
 
 @app.route("/api/workspaces")
 def api_workspaces():
     """Get all workspaces"""
     workspaces = load_workspaces()
+    statuses = get_workspace_statuses()
     workspace_list = []
     
     for ws_name, ws_data in workspaces.items():
-        status = get_workspace_status(ws_name)
-        ws_data["current_status"] = status.get("status", "unknown")
+        if statuses is None:
+            ws_data["current_status"] = "unknown"
+        else:
+            ws_data["current_status"] = statuses.get(ws_name, {}).get("status", "stopped")
         workspace_list.append(ws_data)
     
-    return jsonify({"workspaces": workspace_list})
+    return conditional_json({"workspaces": workspace_list})
 
 @app.route("/api/workspace/<workspace_name>")
 def api_workspace(workspace_name):
     """Get specific workspace details"""
-    workspaces = load_workspaces()
+    ws_data = workspace_store.get(workspace_name)
     
-    if workspace_name not in workspaces:
+    if ws_data is None:
         return jsonify({"error": "Workspace not found"}), 404
     
-    ws_data = workspaces[workspace_name]
     status = get_workspace_status(workspace_name)
     ws_data["current_status"] = status.get("status", "unknown")
+    latest = workspace_metrics.series(workspace_name, limit=1)
+    ws_data["metrics"] = latest[-1] if latest else None
     
-    # Update last accessed
+    # Update last accessed (coalesced, written by the store's flusher)
     ws_data["last_accessed"] = datetime.now().isoformat()
-    workspaces[workspace_name] = ws_data
-    save_workspaces(workspaces)
+    workspace_store.touch(workspace_name, ws_data["last_accessed"])
     
     return jsonify({"workspace": ws_data})
 
@@ -451,16 +1262,140 @@ def api_create_workspace():
     data = request.get_json()
     service_name = data.get("service")
     workspace_name = data.get("name")
+    # Case/investigation reference recorded with everything the workspace captures
+    case = str(data.get("case") or "").strip() or None
+    
+    # Environment profile by id, optionally with its timezone/locale overridden
+    try:
+        profile = profile_catalog.resolve(data.get("profile"), data.get("timezone"), data.get("locale"))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     
     if not service_name:
         return jsonify({"error": "Service name required"}), 400
     
-    result = create_workspace(service_name, workspace_name)
+    if workspace_name is None:
+        workspace_name = f"{service_name}-{str(uuid.uuid4())[:8]}"
     
-    if result["success"]:
-        return jsonify(result), 201
+    # "async": false keeps the old blocking behaviour for scripted clients
+    if data.get("async", True) is False:
+        result = create_workspace(service_name, workspace_name, case=case, profile=profile)
+        return jsonify(result), 201 if result["success"] else 400
+    
+    # Reject obvious mistakes now rather than in a job the client has to follow
+    if not all(c.isalnum() or c in '-_' for c in workspace_name):
+        return jsonify({"success": False, "error": "Workspace name can only contain alphanumeric characters, dashes, and underscores"}), 400
+    if workspace_store.exists(workspace_name):
+        return jsonify({"success": False, "error": f"Workspace '{workspace_name}' already exists"}), 400
+    
+    try:
+        job = jobs.submit("create", create_workspace, service_name, workspace_name, case=case, profile=profile,
+                          target=workspace_name)
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": f"Too many workspace launches in progress ({e}), try again shortly"}), 429
+    
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "job": job.to_dict(),
+        "message": f"Creating workspace '{workspace_name}'..."
+    }), 202
+
+@app.route("/api/workspaces/bulk/<action>", methods=["POST"])
+def api_bulk(action):
+    """Create from a case template, or delete/stop/restart a selection of workspaces, in one batch"""
+    if action not in ("create", "delete", "stop", "restart"):
+        return jsonify({"success": False, "error": f"Unknown bulk action '{action}'"}), 404
+    data = request.get_json(silent=True) or {}
+    
+    if action == "create":
+        plan, errors = bulk_create_plan(data)
+        if errors:
+            return jsonify({"success": False, "error": "; ".join(errors), "errors": errors}), 400
+        case = str(data.get("case") or "").strip() or None
+        fn, args, kwargs, count = bulk_create, (plan,), {"case": case}, len(plan)
     else:
-        return jsonify(result), 400
+        try:
+            names = select_workspaces(data)
+        except (ValueError, RuntimeError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        kwargs = {"timeout": int(data.get("timeout", 10)), "force": data.get("force") is True}
+        fn, args, count = bulk_container_action, (action, names), len(names)
+    
+    if count > BULK_MAX_BATCH:
+        return jsonify({"success": False, "error": f"Batch of {count} exceeds the limit of {BULK_MAX_BATCH}"}), 400
+    if count == 0:
+        return jsonify({"success": True, "total": 0, "results": []})
+    
+    if data.get("async", True) is False:
+        result = fn(*args, **kwargs)
+        return jsonify(result), 200 if result["success"] else 207
+    
+    try:
+        job = jobs.submit(f"bulk-{action}", fn, *args, target=data.get("case") or f"{count} workspace(s)", **kwargs)
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": f"Too many jobs in progress ({e}), try again shortly"}), 429
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "job": job.to_dict(),
+        "message": f"Bulk {action} of {count} workspace(s) started"
+    }), 202
+
+@app.route("/api/jobs")
+def api_jobs():
+    """List recent background jobs"""
+    return jsonify({"jobs": jobs.list()})
+
+@app.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    """Get a background job with its progress events"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job": job.to_dict()})
+
+stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONNECTIONS)
+
+def event_stream(events):
+    """Server-sent events response within the per-worker stream limits"""
+    if not stream_slots.acquire(blocking=False):
+        events.close()
+        return jsonify({"error": "Too many open event streams, retry shortly"}), 503, {"Retry-After": "5"}
+    
+    def bounded():
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            for chunk in events:
+                yield chunk
+                if time.monotonic() >= deadline:
+                    return
+        finally:
+            events.close()
+    
+    response = Response(
+        stream_with_context(bounded()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs when the server finishes with the response, even if the client left before the first
+    # chunk, when closing the never-started generator would skip its cleanup
+    response.call_on_close(events.close)
+    response.call_on_close(stream_slots.release)
+    return response
+
+@app.route("/api/jobs/<job_id>/events")
+def api_job_events(job_id):
+    """Stream a job's progress as server-sent events"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    # EventSource resends the last id it saw when it reconnects
+    after_seq = request.headers.get("Last-Event-ID", request.args.get("after", "0"))
+    after_seq = int(after_seq) if str(after_seq).isdigit() else 0
+    
+    return event_stream(jobs.stream(job, after_seq))
 
 @app.route("/api/workspace/<workspace_name>/delete", methods=["POST"])
 def api_delete_workspace(workspace_name):
@@ -472,37 +1407,148 @@ def api_delete_workspace(workspace_name):
     else:
         return jsonify(result), 400
 
-@app.route("/api/workspace/<workspace_name>/logs")
-def api_workspace_logs(workspace_name):
-    """Get workspace container logs"""
-    try:
-        client = get_docker_client()
+@app.route("/api/workspace/<workspace_name>/suspend", methods=["POST"])
+def api_suspend_workspace(workspace_name):
+    """Pause or stop a workspace now (body: {"action": "pause" | "stop"})"""
+    data = request.get_json(silent=True) or {}
+    result = idle_reaper.suspend(workspace_name, data.get("action", IDLE_ACTION))
+    
+    if result["success"]:
+        return jsonify(result), 200
+    return jsonify(result), 404 if result["error"] == "Workspace not found" else 400
+
+@app.route("/api/workspace/<workspace_name>/resume", methods=["POST"])
+def api_resume_workspace(workspace_name):
+    """Unpause or restart a suspended workspace"""
+    result = idle_reaper.resume(workspace_name)
+    
+    if result["success"]:
+        return jsonify(result), 200
+    return jsonify(result), 404 if result["error"] == "Workspace not found" else 400
+
+@app.route("/api/reaper")
+def api_reaper():
+    """Idle policies, the last sweep and suspend/resume counters"""
+    return jsonify(idle_reaper.status())
+
+@app.route("/api/workspace/<workspace_name>/ready")
+def api_workspace_ready(workspace_name):
+    """Run one readiness probe attempt for a workspace that was slow to start"""
+    ws_data = workspace_store.get(workspace_name)
+    if ws_data is None:
+        return jsonify({"error": "Workspace not found"}), 404
+    
+    spec = service_catalog.get(ws_data.get("service"))
+    probe = service_probe(spec)
+    node = node_registry.owner(ws_data)
+    host, host_port = node.host, ws_data.get("web_port")
+    container = None
+    if probe["type"] == "log" or probe["port"] != 3000 or host_port is None:
+        client = node.client()
         if not client:
             return jsonify({"error": "Docker not available"}), 500
-        
-        # Get container by name
         try:
             container = client.containers.get(workspace_name)
         except docker.errors.NotFound:
-            return jsonify({"error": "Container not found"}), 404
-        
-        logs = container.logs(tail=100).decode()
-        return jsonify({"logs": logs})
+            return jsonify({"ready": False, "detail": "container not found"})
+        if host_port is None:
+            # Proxy-routed workspaces are probed on the workspace network, under their route
+            host, host_port = container_address(container, WORKSPACE_NETWORK), probe["port"]
+            probe = service_probe(spec, container.labels.get(ROUTE_LABEL, workspace_name))
+        elif probe["port"] != 3000:
+            host_port = next(iter(published_ports(container, probe["port"])), None)
+    
+    ok, detail = check_once(probe, host_port, container, host)
+    if ok and not ws_data.get("ready"):
+        workspace_store.update(workspace_name, ready=True)
+    return jsonify({"ready": ok, "detail": detail})
+
+@app.route("/api/readiness")
+def api_readiness():
+    """Per-service time-to-ready statistics"""
+    return jsonify({"services": readiness.status()})
+
+def log_query_args():
+    """Parse tail/after/before/grep query parameters shared by the log endpoints"""
+    args = request.args
+    tail = args.get("tail", "100")
+    query = {"tail": "all" if tail == "all" else max(int(tail), 0)}
+    for key in ("after", "before"):
+        query[key] = container_logs.parse_cursor(args[key]) if args.get(key) else None
+    query["grep"] = container_logs.compile_grep(args.get("grep"), args.get("ignore_case") in ("1", "true"))
+    return query
+
+def workspace_container(workspace_name):
+    """(container, None) or (None, error response) for the log endpoints"""
+    client = workspace_client(workspace_name)
+    if not client:
+        return None, (jsonify({"error": "Docker not available"}), 500)
+    try:
+        return client.containers.get(workspace_name), None
+    except docker.errors.NotFound:
+        return None, (jsonify({"error": "Container not found"}), 404)
+
+@app.route("/api/workspace/<workspace_name>/logs")
+def api_workspace_logs(workspace_name):
+    """A page of container logs (?tail=, ?after=/?before= cursor or time, ?grep=, ?limit=)"""
+    try:
+        query = log_query_args()
+        limit = min(request.args.get("limit", LOG_PAGE_LIMIT, type=int), LOG_PAGE_LIMIT)
+    except (ValueError, re.error) as e:
+        return jsonify({"error": f"Invalid log query: {e}"}), 400
+    
+    try:
+        container, error = workspace_container(workspace_name)
+        if error:
+            return error
+        return jsonify(container_logs.read_page(container, limit=max(limit, 1), **query))
     
     except Exception as e:
+        workspace_node(workspace_name).clients.report_error(e)
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/workspace/<workspace_name>/logs/stream")
+def api_workspace_logs_stream(workspace_name):
+    """Follow container logs as server-sent events (?tail=, ?after=, ?grep=)"""
+    try:
+        query = log_query_args()
+        # EventSource resends the cursor of the last line it saw when it reconnects
+        if request.headers.get("Last-Event-ID"):
+            query["after"] = container_logs.parse_cursor(request.headers["Last-Event-ID"])
+    except (ValueError, re.error) as e:
+        return jsonify({"error": f"Invalid log query: {e}"}), 400
+    query.pop("before")
+    
+    try:
+        container, error = workspace_container(workspace_name)
+        if error:
+            return error
+        events = container_logs.follow(container, **query)
+    except Exception as e:
+        workspace_node(workspace_name).clients.report_error(e)
+        return jsonify({"error": str(e)}), 500
+    
+    return event_stream(events)
+
 @app.route("/workspace/<workspace_name>")
 def workspace_view(workspace_name):
     """Workspace view with embedded VNC"""
-    workspaces = load_workspaces()
+    ws_data = workspace_store.get(workspace_name)
     
-    if workspace_name not in workspaces:
+    if ws_data is None:
         return "Workspace not found", 404
     
-    ws_data = workspaces[workspace_name]
     status = get_workspace_status(workspace_name)
     
+    # Opening a parked workspace brings it back
+    if status.get("status") in ("paused", "exited", "created"):
+        result = idle_reaper.resume(workspace_name)
+        if result["success"]:
+            ws_data = workspace_store.get(workspace_name)
+            status = {"status": result["status"]}
+    
+    workspace_store.touch(workspace_name)
+    
     return render_template(
         "workspace.html",
         workspace=ws_data,
@@ -513,12 +1559,277 @@ def workspace_view(workspace_name):
 @app.route("/api/health")
 def health():
     """Health check"""
-    docker_available = get_docker_client() is not None
+    docker_available = docker_clients.check()
+    nodes = node_registry.status()
+    return jsonify({
+        "status": "healthy" if docker_available and nodes["healthy"] == len(nodes["nodes"]) else "degraded",
+        "docker": docker_available,
+        "docker_client": docker_clients.metrics(),
+        "state_cache": container_states.status(),
+        "ports": port_allocator.status(),
+        "capacity": capacity.status(),
+        "metrics": workspace_metrics.status(),
+        "bulk": bulk.status(),
+        "nodes": {entry["name"]: entry["healthy"] for entry in nodes["nodes"]},
+        "evidence": evidence_store.status(),
+        "routing": WORKSPACE_ROUTING,
+        "worker": {"pid": os.getpid(), "gevent": running_on_gevent(), "background_services": services_lock is not None}
+    })
+
+@app.route("/api/workspace/<workspace_name>/metrics")
+def api_workspace_metrics(workspace_name):
+    """CPU, memory, network and block-IO samples for a workspace, oldest first"""
+    if workspace_store.get(workspace_name) is None:
+        return jsonify({"error": "Workspace not found"}), 404
+    limit = request.args.get("limit", type=int)
+    series = workspace_metrics.series(workspace_name, limit=limit)
     return jsonify({
-        "status": "healthy" if docker_available else "degraded",
-        "docker": docker_available
+        "workspace": workspace_name,
+        "interval": workspace_metrics.interval,
+        "latest": series[-1] if series else None,
+        "series": series
     })
 
+@app.route("/metrics")
+def prometheus_metrics():
+    """Workspace resource usage and request latency in Prometheus text format"""
+    body = workspace_metrics.render() + request_latency.render()
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/evidence")
+def api_evidence_search():
+    """Search captured files by hash, workspace, case, file name or ingest time"""
+    args = request.args
+    result = evidence_store.search(
+        digest=args.get("hash"),
+        workspace=args.get("workspace"),
+        case=args.get("case"),
+        name=args.get("name"),
+        since=args.get("since"),
+        until=args.get("until"),
+        include_removed=args.get("removed") in ("1", "true"),
+        limit=min(args.get("limit", 100, type=int), 1000),
+        offset=args.get("offset", 0, type=int)
+    )
+    return jsonify(result)
+
+@app.route("/api/evidence/status")
+def api_evidence_status():
+    """Evidence index size, dedup savings and watcher state"""
+    return jsonify(evidence_store.status())
+
+@app.route("/api/evidence/scan", methods=["POST"])
+def api_evidence_scan():
+    """Rescan the data directories (all, or one workspace) in the background"""
+    workspace_name = (request.get_json(silent=True) or {}).get("workspace")
+    try:
+        job = jobs.submit("evidence-scan", evidence_store.scan, workspace_name, target=workspace_name or "data")
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": f"Too many jobs in progress ({e}), try again shortly"}), 429
+    return jsonify({"success": True, "job_id": job.id, "job": job.to_dict()}), 202
+
+@app.route("/api/evidence/<digest>")
+def api_evidence_blob(digest):
+    """A stored blob and every workspace file that had its content"""
+    if len(digest) != 64 or not all(c in "0123456789abcdefABCDEF" for c in digest):
+        return jsonify({"error": "Expected a SHA-256 hex digest"}), 400
+    blob = evidence_store.blob(digest)
+    if blob is None:
+        return jsonify({"error": "Unknown hash"}), 404
+    return jsonify(blob)
+
+@app.route("/api/evidence/<digest>/download")
+def api_evidence_download(digest):
+    """Download a blob under the name it was first captured with"""
+    if len(digest) != 64 or not all(c in "0123456789abcdefABCDEF" for c in digest):
+        return jsonify({"error": "Expected a SHA-256 hex digest"}), 400
+    blob = evidence_store.blob(digest)
+    if blob is None or not blob["available"]:
+        return jsonify({"error": "Blob not stored"}), 404
+    name = blob["files"][0]["name"] if blob["files"] else blob["hash"]
+    return send_file(evidence_store.blob_path(blob["hash"]), as_attachment=True, download_name=name)
+
+@app.route("/api/capacity")
+def api_capacity():
+    """Host CPU/memory committed to workspaces and placement counters"""
+    return jsonify(capacity.status())
+
+@app.route("/api/nodes")
+def api_nodes():
+    """Docker nodes with their health, capacity and placement counters"""
+    return jsonify(node_registry.status())
+
+@app.route("/api/nodes/<node_name>/drain", methods=["POST"])
+def api_drain_node(node_name):
+    """Stop placing new workspaces on a node (body: {"drain": false} to resume)"""
+    draining = (request.get_json(silent=True) or {}).get("drain", True) is not False
+    if not node_registry.drain(node_name, draining):
+        return jsonify({"success": False, "error": "Node not found"}), 404
+    return jsonify({"success": True, "node": node_name, "draining": draining})
+
+@app.route("/api/routes")
+def api_routes():
+    """Reverse-proxy routes for running workspaces ("proxy" routing)"""
+    return jsonify({"routing": WORKSPACE_ROUTING, **route_table.status(), "routes": route_table.routes()})
+
+@app.route("/api/pool")
+def api_pool():
+    """Warm pool fill levels and hit/miss counters"""
+    return jsonify(warm_pool.status())
+
+@app.route("/api/images")
+def api_images():
+    """Image cache counters, last refresh and per-node disk use by image"""
+    return jsonify(image_cache.status())
+
+@app.route("/api/images/refresh", methods=["POST"])
+def api_images_refresh():
+    """Re-pull every service image and prune now instead of at the next scheduled refresh"""
+    image_cache.wake()
+    return jsonify({"success": True, "message": "Image refresh scheduled"}), 202
+
+@app.route("/api/images/prune", methods=["POST"])
+def api_images_prune():
+    """Prune unused workspace images on every node (?dry_run=1 only lists them)"""
+    dry_run = request.args.get("dry_run", "0").lower() in ("1", "true", "yes")
+    removed, errors = {}, {}
+    for node in node_registry.nodes():
+        client = node.client()
+        if not client:
+            errors[node.name] = "Docker node not reachable"
+            continue
+        try:
+            removed[node.name] = image_cache.prune(node.name, client, dry_run=dry_run)
+        except Exception as e:
+            node.clients.report_error(e)
+            errors[node.name] = str(e)
+    return jsonify({"success": not errors, "dry_run": dry_run, "removed": removed, "errors": errors})
+
+def prepare_worker():
+    """Sync routes and capacity with Docker, follow its events and configure the warm pool (every worker process)"""
+    if WORKSPACE_ROUTING == "proxy":
+        print(f"\n[*] Setting up workspace routes on network '{WORKSPACE_NETWORK}'...")
+        try:
+            route_table.ensure_network()
+            route_table.refresh()
+            print(f"[SUCCESS] Workspaces served at {WORKSPACE_PUBLIC_URL}/w/<workspace>/")
+        except Exception as e:
+            print(f"[WARNING] Could not set up workspace routes: {e}")
+    
+    print("\n[*] Measuring host capacity...")
+    try:
+        capacity.refresh_host()
+        capacity.rebuild(get_docker_client())
+        status = capacity.status()
+        print(f"[SUCCESS] {status['cpus']} CPU(s), {status['memory'] / (1 << 30):.1f} GiB; "
+              f"{status['cpu_committed']} CPU / {status['memory_committed'] / (1 << 30):.1f} GiB committed")
+    except Exception as e:
+        print(f"[WARNING] Could not measure host capacity: {e}")
+    
+    print("\n[*] Subscribing to Docker container events...")
+    container_states.start()
+    
+    print("\n[*] Configuring warm pool...")
+    try:
+        # Every worker claims from the shared idle list, so every worker knows the targets
+        targets = warm_pool_targets(service_catalog.services())
+        warm_pool.configure(targets)
+        # Pick up x-warm-pool changes whenever the compose file is re-parsed
+        service_catalog.add_listener(lambda services: warm_pool.configure(warm_pool_targets(services)))
+        print(f"[SUCCESS] Warm pool configured for {len(targets)} service profile(s)")
+    except Exception as e:
+        print(f"[WARNING] Could not configure warm pool: {e}")
+    
+    remote_nodes = [node for node in node_registry.nodes() if not node.local]
+    if remote_nodes:
+        print(f"\n[*] Connecting to {len(remote_nodes)} remote Docker node(s)...")
+        if WORKSPACE_ROUTING != "ports":
+            print("[WARNING] Proxy routing only places workspaces on this host; remote nodes need WORKSPACE_ROUTING=ports")
+        for node in remote_nodes:
+            try:
+                if node.start():
+                    status = node.capacity.status()
+                    print(f"[SUCCESS] Node '{node.name}' ({node.url}): {status['cpus']} CPU(s), "
+                          f"{status['memory'] / (1 << 30):.1f} GiB, {status['containers']} workspace container(s)")
+            except Exception as e:
+                print(f"[WARNING] Could not start Docker node '{node.name}': {e}")
+
+def start_background_services():
+    """Port reconcile, image cache, warm pool, metrics, evidence indexer and idle reaper - run by one process per host"""
+    print("\n[*] Reconciling port leases with Docker...")
+    try:
+        # A lease may belong to a create in another worker that has no container yet
+        port_allocator.reconcile(get_docker_client(), grace=CREATE_GRACE)
+    except Exception as e:
+        print(f"[WARNING] Could not reconcile port leases: {e}")
+    
+    print("\n[*] Starting image prefetch...")
+    image_cache.start()
+    # New or changed service images are pulled as soon as the compose file is re-parsed
+    service_catalog.add_listener(lambda services: image_cache.wake())
+    print(f"[SUCCESS] Prefetching service images, {IMAGE_PULL_CONCURRENCY} at a time")
+    
+    print("\n[*] Starting warm pool...")
+    try:
+        warm_pool.start()
+        print(f"[SUCCESS] Warm pool refilling {len(warm_pool.status()['pools'])} service profile(s)")
+    except Exception as e:
+        print(f"[WARNING] Could not start warm pool: {e}")
+    
+    print("\n[*] Starting metrics collector...")
+    workspace_metrics.start()
+    if METRICS_INTERVAL > 0:
+        print(f"[SUCCESS] Sampling workspace metrics every {METRICS_INTERVAL}s")
+    else:
+        print("[INFO] Workspace metrics disabled (METRICS_INTERVAL=0)")
+    
+    print("\n[*] Starting evidence indexer...")
+    evidence_store.start()
+    print(f"[SUCCESS] Indexing {DATA_DIR} (dedup: {EVIDENCE_DEDUP})")
+    
+    print("\n[*] Starting idle reaper...")
+    try:
+        idle_reaper.configure(idle_policies(service_catalog.services()))
+        service_catalog.add_listener(lambda services: idle_reaper.configure(idle_policies(services)))
+        idle_reaper.start()
+        print(f"[SUCCESS] Idle reaper checking every {IDLE_CHECK_INTERVAL}s")
+    except Exception as e:
+        print(f"[WARNING] Could not start idle reaper: {e}")
+
+# Held open by the process running the background services; the kernel drops the lock when it exits
+services_lock = None
+
+def claim_background_services(wait=False):
+    """Take the per-host services lock and start the background services; with wait=True, keep
+    retrying in a thread so a worker takes over when the one holding it exits"""
+    global services_lock
+    SERVICES_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(SERVICES_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        if not wait:
+            return False
+        print(f"[INFO] Worker {os.getpid()}: background services run in another worker")
+        def retry():
+            while not claim_background_services():
+                time.sleep(SERVICES_LOCK_RETRY)
+        threading.Thread(target=retry, daemon=True, name="services-lock").start()
+        return False
+    services_lock = fd
+    print(f"[INFO] Worker {os.getpid()}: running background services")
+    start_background_services()
+    return True
+
+def start_worker():
+    """Start an app server worker process (gunicorn post_worker_init hook)"""
+    if not verify_docker_connection():
+        print(f"[WARNING] Worker {os.getpid()} starting without Docker; it reconnects when the daemon is back")
+    prepare_worker()
+    claim_background_services(wait=True)
+    print(f"[SUCCESS] Worker {os.getpid()} ready")
+
 if __name__ == "__main__":
     print("\n" + "="*60)
     print("🚀 Starting Workspaces Application")
@@ -535,25 +1846,29 @@ if __name__ == "__main__":
     print("\n[*] Initializing Flask application...")
     print("[*] Loading workspaces metadata...")
     try:
-        workspaces = load_workspaces()
-        print(f"[SUCCESS] Loaded {len(workspaces)} workspace(s)")
+        print(f"[SUCCESS] Loaded {workspace_store.count()} workspace(s)")
     except Exception as e:
         print(f"[WARNING] Could not load workspaces: {e}")
     
     print("\n[*] Loading Docker Compose configuration...")
     try:
-        compose = load_docker_compose()
-        services = compose.get("services", {})
+        services = service_catalog.services()
         print(f"[SUCCESS] Found {len(services)} service(s): {', '.join(services.keys())}")
     except Exception as e:
         print(f"[WARNING] Could not load Docker Compose: {e}")
     
+    prepare_worker()
+    
+    if not claim_background_services():
+        print(f"[WARNING] Another process holds {SERVICES_LOCK_FILE}; background services not started here")
+    
     print(f"\n{'='*60}")
     print("✅ Application Ready!")
     print(f"{'='*60}")
     print("📍 Web Interface: http://localhost:5000")
     print("📊 API Health Check: http://localhost:5000/api/health")
     print("🔧 Press Ctrl+C to shutdown")
+    print("⚠  Development server - use 'gunicorn -c gunicorn.conf.py' in production")
     print(f"{'='*60}\n")
     
     try:
@@ -0,0 +1,205 @@
+"""
+Workspace Routes
+Keeps an nginx map of /w/<workspace>/ routes to container addresses on the internal
+workspace network, regenerated whenever workspace containers start, stop or go away
+"""
+
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+ROUTE_LABEL = "route"
+ROUTE_PREFIX = "/w/"
+
+# Container events that can change which workspaces are reachable, or where
+ROUTE_EVENTS = ("start", "restart", "unpause", "pause", "die", "stop", "kill", "destroy", "rename", "connect", "disconnect")
+
+ROUTES_HEADER = """# Generated by workspace_app - do not edit, changes are overwritten.
+# Maps /w/<workspace>/ (see proxy-confs/workspaces.subfolder.conf) to workspace containers.
+
+# Keep upstream connections open for plain requests, upgrade them for the VNC websocket
+map $http_upgrade $workspace_connection {
+    default upgrade;
+    '' '';
+}
+"""
+
+
+def route_prefix(name):
+    """URL path a workspace is served under"""
+    return f"{ROUTE_PREFIX}{name}/"
+
+
+def container_address(container, network):
+    """IP address of a container on network, from sparse or inspected attrs"""
+    networks = (container.attrs.get("NetworkSettings") or {}).get("Networks") or {}
+    return (networks.get(network) or {}).get("IPAddress") or None
+
+
+def upstream_name(name):
+    return "workspace_" + re.sub(r"[^A-Za-z0-9_]", "_", name)
+
+
+def render_routes(routes, keepalive=16):
+    """nginx http-level config for {name: {"address", "port", "prefix", "aliases"}}"""
+    upstream_map = []
+    prefix_map = []
+    upstreams = []
+    for name, route in sorted(routes.items()):
+        upstream = upstream_name(name)
+        for key in [name, *route["aliases"]]:
+            upstream_map.append(f'    "{key}" {upstream};')
+            prefix_map.append(f'    "{key}" "{route["prefix"]}";')
+        upstreams.append(
+            f"upstream {upstream} {{\n"
+            f"    server {route['address']}:{route['port']};\n"
+            f"    keepalive {keepalive};\n"
+            f"}}\n"
+        )
+
+    lines = [ROUTES_HEADER]
+    lines.append("map $workspace $workspace_upstream {\n    default \"\";\n" + "".join(l + "\n" for l in upstream_map) + "}\n")
+    # Warm pool containers keep the path they were started with after being renamed
+    lines.append("map $workspace $workspace_prefix {\n    default \"\";\n" + "".join(l + "\n" for l in prefix_map) + "}\n")
+    lines.extend(upstreams)
+    return "\n".join(lines)
+
+
+class RouteTable:
+    """Running workspace containers on the internal network, written out as nginx routes"""
+
+    def __init__(self, client_factory, network, routes_file, proxy_container=None,
+                 label="created_by=workspace_app", container_port=3000, keepalive=16, debounce=0.5):
+        self._client_factory = client_factory
+        self.network = network
+        self.routes_file = Path(routes_file)
+        self.proxy_container = proxy_container
+        self._label = label
+        self._container_port = container_port
+        self._keepalive = keepalive
+        self._debounce = debounce
+        self._lock = threading.Lock()
+        self._timer = None
+        self._routes = {}
+        self._rendered = None
+        self.updated = None
+        self.stats = {"refreshes": 0, "writes": 0, "reloads": 0, "errors": 0}
+
+    def ensure_network(self):
+        """Create the workspace network if needed and attach the reverse proxy to it"""
+        client = self._client_factory()
+        if not client:
+            raise RuntimeError("Cannot connect to Docker daemon")
+        existing = client.networks.list(names=[self.network])
+        network = next((n for n in existing if n.name == self.network), None)
+        if network is None:
+            key, _, value = self._label.partition("=")
+            network = client.networks.create(self.network, driver="bridge", labels={key: value})
+            print(f"[INFO] Created Docker network '{self.network}'")
+
+        if self.proxy_container:
+            try:
+                proxy = client.containers.get(self.proxy_container)
+                if self.network not in (proxy.attrs.get("NetworkSettings", {}).get("Networks") or {}):
+                    network.connect(proxy)
+                    print(f"[INFO] Connected '{self.proxy_container}' to network '{self.network}'")
+            except Exception as e:
+                print(f"[WARNING] Could not attach proxy container '{self.proxy_container}': {e}")
+        return network
+
+    def on_container_event(self, action, entry):
+        """Container state cache listener"""
+        if action in ROUTE_EVENTS:
+            self.schedule()
+
+    def schedule(self):
+        """Refresh shortly, coalescing bursts of events into one rewrite"""
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self._debounce, self._scheduled_refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def refresh(self):
+        """Rebuild routes from one container list; rewrites and reloads only on change"""
+        client = self._client_factory()
+        if not client:
+            return False
+        containers = client.containers.list(
+            sparse=True,
+            filters={"label": self._label, "network": self.network, "status": "running"}
+        )
+        routes = {}
+        for container in containers:
+            names = [n.lstrip("/") for n in container.attrs.get("Names") or []]
+            address = container_address(container, self.network)
+            if not names or not address:
+                continue
+            name = names[0]
+            route = (container.attrs.get("Labels") or {}).get(ROUTE_LABEL) or name
+            routes[name] = {
+                "address": address,
+                "port": self._container_port,
+                "prefix": route_prefix(route),
+                "aliases": [route] if route != name else [],
+            }
+
+        rendered = render_routes(routes, self._keepalive)
+        with self._lock:
+            self.stats["refreshes"] += 1
+            self._routes = routes
+            if rendered == self._rendered:
+                return False
+            self._rendered = rendered
+
+        self.routes_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.routes_file.with_name(f".{self.routes_file.name}.tmp")
+        tmp_path.write_text(rendered)
+        os.replace(tmp_path, self.routes_file)
+        with self._lock:
+            self.stats["writes"] += 1
+            self.updated = datetime.now().isoformat()
+        print(f"[INFO] Workspace routes updated ({len(routes)} route(s))")
+        self._reload(client)
+        return True
+
+    def routes(self):
+        with self._lock:
+            return {name: dict(route) for name, route in self._routes.items()}
+
+    def status(self):
+        with self._lock:
+            return {
+                "network": self.network,
+                "routes_file": str(self.routes_file),
+                "routes": len(self._routes),
+                "updated": self.updated,
+                **self.stats,
+            }
+
+    def _scheduled_refresh(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.refresh()
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"[WARNING] Could not refresh workspace routes: {e}")
+
+    def _reload(self, client):
+        if not self.proxy_container:
+            return
+        try:
+            result = client.containers.get(self.proxy_container).exec_run(["nginx", "-s", "reload"])
+            if result.exit_code != 0:
+                raise RuntimeError(result.output.decode(errors="replace").strip())
+            with self._lock:
+                self.stats["reloads"] += 1
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"[WARNING] Could not reload '{self.proxy_container}': {e}")
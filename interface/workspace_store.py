@@ -0,0 +1,254 @@
+"""
+Workspace Store
+SQLite (WAL mode) metadata store for workspaces with atomic per-workspace updates
+and coalesced last_accessed writes
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    name TEXT PRIMARY KEY,
+    id TEXT,
+    service TEXT,
+    status TEXT,
+    created TEXT,
+    last_accessed TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_workspaces_service ON workspaces(service);
+CREATE INDEX IF NOT EXISTS idx_workspaces_status ON workspaces(status);
+CREATE INDEX IF NOT EXISTS idx_workspaces_last_accessed ON workspaces(last_accessed);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns mirrored out of the JSON blob so they can be indexed and queried
+INDEXED_FIELDS = ("id", "service", "status", "created", "last_accessed")
+
+
+class WorkspaceStore:
+    """Workspace metadata keyed by name, one SQLite connection per thread"""
+
+    def __init__(self, db_path, flush_interval=30):
+        self.db_path = Path(db_path)
+        self._flush_interval = flush_interval
+        self._local = threading.local()
+        self._touch_lock = threading.Lock()
+        self._pending_touches = {}
+        self._flusher = None
+        self._stopped = threading.Event()
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        atexit.register(self.flush)
+
+    def import_json(self, json_path):
+        """One-time import of a legacy workspaces.json; returns the number of rows imported"""
+        json_path = Path(json_path)
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return 0
+            imported = 0
+            if json_path.exists():
+                with open(json_path, "r") as f:
+                    legacy = json.load(f)
+                for name, data in legacy.items():
+                    self._upsert(conn, name, data, replace=False)
+                    imported += 1
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                (datetime.now().isoformat(),)
+            )
+        if imported:
+            print(f"[INFO] Imported {imported} workspace(s) from {json_path.name}")
+        return imported
+
+    def get(self, name):
+        """Metadata for one workspace, or None"""
+        row = self.connection().execute("SELECT data FROM workspaces WHERE name = ?", (name,)).fetchone()
+        return self._with_touch(name, json.loads(row[0])) if row else None
+
+    def exists(self, name):
+        return self.connection().execute("SELECT 1 FROM workspaces WHERE name = ?", (name,)).fetchone() is not None
+
+    def all(self):
+        """All workspaces keyed by name, oldest first"""
+        rows = self.connection().execute("SELECT name, data FROM workspaces ORDER BY created").fetchall()
+        return {name: self._with_touch(name, json.loads(data)) for name, data in rows}
+
+    def find(self, service=None, status=None, accessed_before=None):
+        """Indexed lookup by service, status and/or last_accessed cutoff (ISO string)"""
+        self.flush()
+        clauses, params = [], []
+        if service is not None:
+            clauses.append("service = ?")
+            params.append(service)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if accessed_before is not None:
+            clauses.append("last_accessed < ?")
+            params.append(accessed_before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection().execute(
+            f"SELECT name, data FROM workspaces {where} ORDER BY created", params
+        ).fetchall()
+        return {name: json.loads(data) for name, data in rows}
+
+    def insert(self, name, data):
+        """Add a workspace; returns False if the name is already taken"""
+        try:
+            with self.transaction() as conn:
+                self._upsert(conn, name, data, replace=False)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def put(self, name, data):
+        """Insert or replace a workspace's metadata"""
+        with self.transaction() as conn:
+            self._upsert(conn, name, data, replace=True)
+
+    def update(self, name, **fields):
+        """Atomically merge fields into one workspace; returns the new metadata or None"""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT data FROM workspaces WHERE name = ?", (name,)).fetchone()
+            if not row:
+                return None
+            data = {**json.loads(row[0]), **fields}
+            self._upsert(conn, name, data, replace=True)
+        return data
+
+    def put_many(self, workspaces):
+        """Insert or replace several workspaces ({name: data}) in one transaction"""
+        with self.transaction() as conn:
+            for name, data in workspaces.items():
+                self._upsert(conn, name, data, replace=True)
+        return len(workspaces)
+
+    def update_many(self, updates):
+        """Merge fields into several workspaces ({name: fields}) in one transaction; returns how many existed"""
+        updated = 0
+        with self.transaction() as conn:
+            for name, fields in updates.items():
+                row = conn.execute("SELECT data FROM workspaces WHERE name = ?", (name,)).fetchone()
+                if row:
+                    self._upsert(conn, name, {**json.loads(row[0]), **fields}, replace=True)
+                    updated += 1
+        return updated
+
+    def delete_many(self, names):
+        """Remove several workspaces in one transaction; returns how many existed"""
+        names = list(names)
+        with self._touch_lock:
+            for name in names:
+                self._pending_touches.pop(name, None)
+        with self.transaction() as conn:
+            return sum(conn.execute("DELETE FROM workspaces WHERE name = ?", (name,)).rowcount for name in names)
+
+    def delete(self, name):
+        """Remove a workspace; returns True if it existed"""
+        with self._touch_lock:
+            self._pending_touches.pop(name, None)
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM workspaces WHERE name = ?", (name,)).rowcount > 0
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM workspaces").fetchone()[0]
+
+    def touch(self, name, when=None):
+        """Record an access; written to disk in batches by the flusher thread"""
+        with self._touch_lock:
+            self._pending_touches[name] = when or datetime.now().isoformat()
+        self._ensure_flusher()
+
+    def flush(self):
+        """Write pending last_accessed updates in one transaction"""
+        with self._touch_lock:
+            pending, self._pending_touches = self._pending_touches, {}
+        if not pending:
+            return 0
+        with self.transaction() as conn:
+            for name, when in pending.items():
+                conn.execute(
+                    "UPDATE workspaces SET last_accessed = ?, data = json_set(data, '$.last_accessed', ?) "
+                    "WHERE name = ? AND (last_accessed IS NULL OR last_accessed < ?)",
+                    (when, when, name, when)
+                )
+        return len(pending)
+
+    def close(self):
+        """Flush and stop the background writer"""
+        self._stopped.set()
+        self.flush()
+
+    def _with_touch(self, name, data):
+        with self._touch_lock:
+            when = self._pending_touches.get(name)
+        if when:
+            data["last_accessed"] = when
+        return data
+
+    def _ensure_flusher(self):
+        if self._flusher and self._flusher.is_alive():
+            return
+        with self._touch_lock:
+            if self._flusher and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="workspace-store-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[WARNING] Could not flush last_accessed updates: {e}")
+
+    def _upsert(self, conn, name, data, replace):
+        data = {**data, "name": name}
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        conn.execute(
+            f"{verb} INTO workspaces (name, id, service, status, created, last_accessed, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, *(data.get(field) for field in INDEXED_FIELDS), json.dumps(data))
+        )
+
+    def connection(self):
+        """This thread's SQLite connection (autocommit; use transaction() for writes)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        """Context manager wrapping BEGIN IMMEDIATE ... COMMIT on this thread's connection"""
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False